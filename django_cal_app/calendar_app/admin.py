@@ -1,3 +1,207 @@
-from django.contrib import admin
+from datetime import datetime, timedelta
 
-# Register your models here.
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.paginator import Paginator
+from django.db import models
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .audit import log_event
+from .availability import people
+from .bulk import reassign_events, remove_events
+from .models import AuditEntry, Event, OccupancyDay, RecurrenceOverride, RecurrenceRule
+
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(admin.ModelAdmin):
+    list_display = ('timestamp', 'actor', 'action', 'event_id')
+    list_filter = ('action',)
+    # exact matches, so the lookups use the actor and event indexes
+    search_fields = ('=actor', '=event_id')
+    ordering = ('-timestamp', '-id')
+    readonly_fields = ('timestamp', 'actor', 'action', 'event_id', 'details')
+    show_full_result_count = False
+
+    # the trail is append-only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class RecurrenceOverrideInline(admin.TabularInline):
+    model = RecurrenceOverride
+    extra = 0
+
+
+@admin.register(RecurrenceRule)
+class RecurrenceRuleAdmin(admin.ModelAdmin):
+    list_display = ('name_person', 'place', 'start', 'rrule', 'until')
+    list_filter = ('place', 'freq')
+    search_fields = ('name_person',)
+    readonly_fields = ('created_by', 'updated_at')
+    inlines = [RecurrenceOverrideInline]
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+
+
+class LimitedCountPaginator(Paginator):
+    """Counts at most `limit` rows, so a page costs the same however large the table is.
+
+    Beyond that only the first `limit` rows are paged; the list is narrowed with the date hierarchy,
+    the filters or the search.
+    """
+    limit = 10000
+    capped = False
+
+    @cached_property
+    def count(self):
+        count = self.object_list[:self.limit + 1].count()
+        self.capped = count > self.limit
+        return min(count, self.limit)
+
+
+class DrilldownQuerySet(models.QuerySet):
+    """The changelist queryset, with the date hierarchy answered from the (start, end) index.
+
+    Django truncates the date of every matching row and keeps the distinct values; here each
+    value is one seek, to the first event after the previous one (a loose index scan).
+    """
+
+    def aggregate(self, *args, **kwargs):
+        # the hierarchy's first and last dates: a seek to each end of the index instead of a scan
+        if args or not kwargs or not all(isinstance(value, (models.Min, models.Max)) and value.filter is None
+                                         and isinstance(value.get_source_expressions()[0], models.F)
+                                         for value in kwargs.values()):
+            return super().aggregate(*args, **kwargs)
+        result = {}
+        for name, value in kwargs.items():
+            field_name = value.get_source_expressions()[0].name
+            direction = '-' if isinstance(value, models.Max) else ''
+            result[name] = self.order_by(direction + field_name).values_list(field_name, flat=True).first()
+        return result
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day'):
+            return super().datetimes(field_name, kind, order, tzinfo)
+        tz = tzinfo or timezone.get_current_timezone()
+        ordered = self.order_by(field_name).values_list(field_name, flat=True)
+        values = []
+        current = ordered.first()
+        while current is not None:
+            local = timezone.localtime(current, tz)
+            if kind == 'year':
+                bucket, following = datetime(local.year, 1, 1), datetime(local.year + 1, 1, 1)
+            elif kind == 'month':
+                bucket = datetime(local.year, local.month, 1)
+                following = datetime(local.year + local.month // 12, local.month % 12 + 1, 1)
+            else:
+                bucket = datetime(local.year, local.month, local.day)
+                following = bucket + timedelta(days=1)
+            values.append(timezone.make_aware(bucket, tz))
+            current = ordered.filter(**{f'{field_name}__gte': timezone.make_aware(following, tz)}).first()
+        return values if order == 'ASC' else values[::-1]
+
+
+class PlaceFilter(admin.SimpleListFilter):
+    title = 'place'
+    parameter_name = 'place'
+
+    def lookups(self, request, model_admin):
+        # from the small occupancy table rather than a DISTINCT over every event
+        places = OccupancyDay.objects.values_list('place', flat=True).distinct().order_by('place')
+        return [(place, place) for place in places]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(place=self.value())
+
+
+class PersonFilter(admin.SimpleListFilter):
+    title = 'person'
+    parameter_name = 'name_person'
+
+    def lookups(self, request, model_admin):
+        # from the availability bitmaps, one row per person, place and year
+        return [(name, name) for name in people()]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(name_person=self.value())
+
+
+class EventActionForm(ActionForm):
+    to_person = forms.CharField(required=False, label='Person')
+    to_place = forms.CharField(required=False, label='Place')
+
+
+@admin.register(Event)
+class EventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name_person', 'place', 'start', 'end', 'all_day', 'created_by', 'updated_at')
+    list_select_related = ('created_by',)
+    list_filter = (PlaceFilter, PersonFilter)
+    date_hierarchy = 'start'
+    # case-insensitive prefix search, answered by event_person_nocase_idx
+    search_fields = ('^name_person',)
+    # the reverse of the (start, end) index, row id included, so no sort is needed
+    ordering = ('-start', '-end', '-id')
+    # set by the app, like created_by of events added from the calendar, which may be empty
+    readonly_fields = ('created_by', 'deleted_by', 'updated_at', 'deleted_at', 'legacy_id')
+    show_full_result_count = False
+    paginator = LimitedCountPaginator
+    action_form = EventActionForm
+    actions = ['remove_selected', 'reassign_selected']
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return DrilldownQuerySet(self.model, query=queryset.query, using=queryset.db)
+
+    # changes made here are audited like those made from the calendar
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+        log_event('edited' if change else 'added', request.user, obj)
+
+    def delete_model(self, request, obj):
+        # keep a tombstone, as remove_event does, so clients syncing through /events/changes/ learn about it
+        obj.deleted_at = timezone.now()
+        obj.deleted_by = request.user
+        obj.save()
+        log_event('deleted', request.user, obj)
+
+    def get_actions(self, request):
+        # delete_selected would hard-delete one event at a time, each refreshing the derived tables
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Delete selected events', permissions=['delete'])
+    def remove_selected(self, request, queryset):
+        result = remove_events({}, user=request.user, events=queryset)
+        self.message_user(request, f"{result.matched} events deleted.", messages.SUCCESS)
+
+    @admin.action(description='Reassign selected events to the person and/or place given', permissions=['change'])
+    def reassign_selected(self, request, queryset):
+        try:
+            result = reassign_events({}, to_person=request.POST.get('to_person', '').strip(),
+                                     to_place=request.POST.get('to_place', '').strip(),
+                                     user=request.user, events=queryset)
+        except ValueError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            return
+        if result.conflicts:
+            earlier, later = result.conflicts[0]
+            self.message_user(request, f"Nothing reassigned: {len(result.conflicts)} events would overlap, "
+                                       f"e.g. #{earlier} and #{later}.", messages.ERROR)
+            return
+        self.message_user(request, f"{result.matched} events reassigned.", messages.SUCCESS)
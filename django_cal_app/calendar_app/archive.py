@@ -0,0 +1,56 @@
+"""Past events kept in ArchivedEvent instead of the live table, read only when a window reaches them."""
+import threading
+from collections import OrderedDict
+
+from django.db.models import Max
+
+from .models import ArchivedEvent, CalendarVersion
+from .versions import ARCHIVE_KEY
+
+# archived rows of recent windows, per worker; archived events never change, so entries
+# only go stale when archive_events runs again and advances the version
+CACHE_SIZE = 64
+_cache = OrderedDict()
+_horizons = {}
+_lock = threading.Lock()
+
+
+def horizon():
+    """(archive version, latest archived end): windows ending after that never need the archive."""
+    version = CalendarVersion.objects.filter(key=ARCHIVE_KEY).values_list('version', flat=True).first()
+    if version is None:
+        return 0, None
+    if version not in _horizons:
+        _horizons.clear()
+        _horizons[version] = ArchivedEvent.objects.aggregate(end=Max('end'))['end']
+    return version, _horizons[version]
+
+
+def reaching(start=None, end=None):
+    """Archived events overlapping [start, end), or none when the window starts after the archive."""
+    _, until = horizon()
+    if until is None or (start is not None and start >= until):
+        return ArchivedEvent.objects.none()
+    archived = ArchivedEvent.objects.all()
+    if start is not None and end is not None:
+        archived = archived.filter(start__lt=end, end__gt=start)
+    return archived
+
+
+def window_rows(start, end, fields):
+    """values_list rows of the archived events overlapping [start, end), sorted by start; cached."""
+    version, until = horizon()
+    if until is None or start >= until:
+        return []
+    key = (version, start, end, fields)
+    with _lock:
+        rows = _cache.get(key)
+        if rows is not None:
+            _cache.move_to_end(key)
+            return rows
+    rows = list(reaching(start, end).order_by('start', 'id').values_list(*fields))
+    with _lock:
+        _cache[key] = rows
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return rows
@@ -0,0 +1,109 @@
+"""Async versions of the read endpoints, routed instead of the sync ones in ASGI mode.
+
+Under uvicorn workers a slow client only holds a coroutine while its response is
+streamed, so a few slow connections can no longer occupy every worker.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+
+from .feed import aiter_feed, all_extra, event_detail, feed_bootstrap, parse_window, sync_token, window_events, window_extra
+from .feed_cache import cache_key, cached_entry, feed_etag, feed_last_modified, store
+from .models import ArchivedEvent, Event
+from .versions import current_version, event_etag, event_last_modified
+
+
+def async_condition(etag_func, last_modified_func):
+    """django.views.decorators.http.condition for async views: the (sync, ORM based)
+    ETag and Last-Modified functions run in one sync_to_async hop."""
+    def decorator(view):
+        def evaluate(request, *args, **kwargs):
+            last_modified = last_modified_func(request, *args, **kwargs)
+            if last_modified is not None and not timezone.is_aware(last_modified):
+                last_modified = timezone.make_aware(last_modified)
+            last_modified = int(last_modified.timestamp()) if last_modified is not None else None
+            etag = etag_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            return etag, last_modified
+
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag, last_modified = await sync_to_async(evaluate)(request, *args, **kwargs)
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
+
+
+async def calendar_view(request):
+    bootstrap = await sync_to_async(feed_bootstrap)()
+    context = {"bootstrap": mark_safe(bootstrap), "live_updates": settings.LIVE_UPDATES}
+    # rendering reads the session and user through the context processors
+    return await sync_to_async(render)(request, 'calendar.html', context)
+
+
+async def _store_after(request, chunks):
+    parts = []
+    async for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    await sync_to_async(store)(request, b''.join(parts))
+
+
+# Clients revalidate on every fetch and get a 304 while nothing has changed
+@cache_control(no_cache=True)
+@async_condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
+async def all_events(request):
+    # already looked up (and memoized on the request) by async_condition
+    entry = await sync_to_async(cached_entry)(request)
+    if entry is not None:
+        response = HttpResponse(entry.body, content_type='application/json')
+        response['X-Sync-Token'] = sync_token(entry.created_at)
+        return response
+    # read before the query so a write racing with it keeps the body out of the cache
+    await sync_to_async(current_version)(request)
+    issued = timezone.now()
+
+    # FullCalendar sends the visible range as start/end; the whole history is only returned on explicit request
+    if request.GET.get('all') == '1':
+        events = Event.objects.all()
+        extra = await sync_to_async(all_extra)()
+    else:
+        try:
+            start, end = parse_window(request.GET)
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        events = window_events(start, end)
+        extra = await sync_to_async(window_extra)(start, end)
+
+    chunks = aiter_feed(events, extra=extra)
+    if cache_key(request) is not None:
+        chunks = _store_after(request, chunks)
+    response = StreamingHttpResponse(chunks, content_type='application/json')
+    # starting point for /events/changes/
+    response['X-Sync-Token'] = sync_token(issued)
+    return response
+
+
+@cache_control(no_cache=True)
+@async_condition(etag_func=event_etag, last_modified_func=event_last_modified)
+async def event_details(request, event_id):
+    event = await Event.objects.filter(id=event_id).afirst() or await ArchivedEvent.objects.filter(id=event_id).afirst()
+    if event is None:
+        raise Http404("No Event matches the given query.")
+    return JsonResponse(event_detail(event))
@@ -0,0 +1,87 @@
+import logging
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import AuditEntry
+
+logger = logging.getLogger('calendar_app')
+
+EVENT_MESSAGE = 'Event %s by %s: Event ID: %s, Name: %s, Start: %s, End: %s, All day: %s, Place: %s, Notes: %s'
+
+
+def event_fields(event):
+    return {
+        'id': event.id,
+        'name_person': event.name_person,
+        'start': event.start,
+        'end': event.end,
+        'all_day': event.all_day,
+        'place': event.place,
+        'notes': event.notes,
+    }
+
+
+def record(action, user, event_id=None, details=None):
+    """Store an AuditEntry; call it inside the transaction of the change it describes."""
+    return AuditEntry.objects.create(actor=str(user) if user is not None else '', action=action,
+                                     event_id=event_id, details=details or {})
+
+
+def log_event(action, user, event):
+    """Audit an added/edited/deleted event: an AuditEntry in the current transaction, and a log record
+    once it commits. The message is formatted lazily by the log writer thread."""
+    fields = event_fields(event)
+    user = str(user)
+    record(action, user, event.id, fields)
+    transaction.on_commit(lambda: logger.info(
+        EVENT_MESSAGE, action, user, *fields.values(),
+        extra={'audit': {'action': action, 'user': user, 'event': fields}}))
+
+
+def entry_cursor(entry):
+    return f'{int(entry.timestamp.timestamp() * 1_000_000)}-{entry.id}'
+
+
+def parse_cursor(cursor):
+    try:
+        moment, entry_id = cursor.split('-')
+        return datetime.fromtimestamp(int(moment) / 1_000_000, tz=dt_timezone.utc), int(entry_id)
+    except (AttributeError, ValueError, OverflowError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def search(actor=None, event_id=None, action=None, since=None, until=None, cursor=None, limit=50):
+    """(entries, next cursor) for one page, newest first.
+
+    Keyset pagination: a page continues below the (timestamp, id) of the previous one,
+    so deep pages cost the same index range scan as the first.
+    """
+    entries = AuditEntry.objects.order_by('-timestamp', '-id')
+    if actor:
+        entries = entries.filter(actor=actor)
+    if event_id is not None:
+        entries = entries.filter(event_id=event_id)
+    if action:
+        entries = entries.filter(action=action)
+    if since is not None:
+        entries = entries.filter(timestamp__gte=since)
+    if until is not None:
+        entries = entries.filter(timestamp__lt=until)
+    if cursor:
+        moment, entry_id = parse_cursor(cursor)
+        entries = entries.filter(Q(timestamp__lt=moment) | Q(timestamp=moment, id__lt=entry_id))
+    page = list(entries[:limit + 1])
+    return page[:limit], entry_cursor(page[limit - 1]) if len(page) > limit else None
+
+
+def entry_data(entry):
+    return {
+        'id': entry.id,
+        'timestamp': entry.timestamp.isoformat(),
+        'actor': entry.actor,
+        'action': entry.action,
+        'event_id': entry.event_id,
+        'details': entry.details,
+    }
@@ -0,0 +1,201 @@
+"""Free/busy queries over per-person, per-place day bitmaps.
+
+A bitmap is a Python int with one bit per day. The stored AvailabilityYear rows are
+combined into bitmaps spanning the requested range, so AND, OR and at-least-N over
+people are a few big-integer operations however many days the range covers.
+"""
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import date, timedelta
+from functools import reduce
+from itertools import chain
+from operator import and_, or_
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import archive, recurrence
+from .models import AvailabilityYear, Event, RecurrenceRule
+from .occupancy import _local, _midnight, event_days
+from .versions import current_version
+
+DAY_BYTES = 46  # 366 bits
+
+# stored bitmaps of recent ranges, per worker, keyed by (global version, first, last)
+CACHE_SIZE = 32
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def span_bits(first, last, base):
+    """Bits of the days [first, last), counted from base; days before base are dropped."""
+    lo = max((first - base).days, 0)
+    hi = (last - base).days
+    if hi <= lo:
+        return 0
+    return ((1 << (hi - lo)) - 1) << lo
+
+
+def _year_bits(rows, first_year, last_year):
+    """{(name_person, place, year): bits} for the years [first_year, last_year] from
+    (name_person, place, start, end, all_day) rows."""
+    base = date(first_year, 1, 1)
+    spans = defaultdict(int)
+    tz = timezone.get_current_timezone()
+    for name_person, place, start, end, all_day in rows:
+        spans[(name_person, place)] |= span_bits(*event_days(start, end, all_day, tz), base)
+    result = {}
+    for (name_person, place), bits in spans.items():
+        for year in range(first_year, last_year + 1):
+            offset = (date(year, 1, 1) - base).days
+            days = (date(year + 1, 1, 1) - date(year, 1, 1)).days
+            year_bits = (bits >> offset) & ((1 << days) - 1)
+            if year_bits:
+                result[(name_person, place, year)] = year_bits
+    return result
+
+
+def refresh(ranges, people=None):
+    """Recompute the bitmaps of the years touched by the (start, end) ranges, for the given people or everyone.
+
+    A day stays set while any other entry still covers it, so removals are recomputed from
+    the events instead of clearing bits.
+    """
+    ranges = [(start, end) for start, end in ranges if start is not None and end is not None]
+    if not ranges:
+        return 0
+    first_year = min(_local(start).year for start, _ in ranges)
+    last_year = max(_local(end).year for _, end in ranges)
+    first, last = _midnight(date(first_year, 1, 1)), _midnight(date(last_year + 1, 1, 1))
+    events = Event.objects.filter(start__lt=last, end__gt=first)
+    archived = archive.reaching(first, last)
+    rows = AvailabilityYear.objects.filter(year__gte=first_year, year__lte=last_year)
+    if people is not None:
+        people = {name for name in people if name}
+        # a range scan per person on event_person_start_end_idx
+        lookback = first - timedelta(days=settings.MAX_EVENT_DAYS)
+        events = events.filter(name_person__in=people, start__gte=lookback)
+        archived = archived.filter(name_person__in=people)
+        rows = rows.filter(name_person__in=people)
+    bits = _year_bits(chain(*(table.values_list('name_person', 'place', 'start', 'end', 'all_day').iterator(chunk_size=5000)
+                              for table in (events, archived))),
+                      first_year, last_year)
+    with transaction.atomic():
+        rows.delete()
+        AvailabilityYear.objects.bulk_create(
+            (AvailabilityYear(name_person=name_person, place=place, year=year, days=value.to_bytes(DAY_BYTES, 'little'))
+             for (name_person, place, year), value in bits.items()),
+            batch_size=5000)
+    return len(bits)
+
+
+def rebuild():
+    """Recompute every bitmap from the events, archived ones included."""
+    tables = (Event.objects.all(), archive.reaching())
+    starts = [start for start in (table.order_by('start').values_list('start', flat=True).first() for table in tables) if start]
+    ends = [end for end in (table.order_by('-end').values_list('end', flat=True).first() for table in tables) if end]
+    if not starts:
+        AvailabilityYear.objects.all().delete()
+        return 0
+    first, last = min(starts), max(ends)
+    AvailabilityYear.objects.exclude(year__gte=_local(first).year, year__lte=_local(last).year).delete()
+    return refresh([(first, last)])
+
+
+def _stored(first, last):
+    """{(name_person, place): bits} over [first, last) from the stored rows; cached per global version."""
+    key = (current_version()[0], first, last)
+    with _lock:
+        maps = _cache.get(key)
+        if maps is not None:
+            _cache.move_to_end(key)
+            return maps
+    size = (last - first).days
+    mask = (1 << size) - 1
+    maps = defaultdict(int)
+    rows = AvailabilityYear.objects.filter(year__gte=first.year, year__lte=(last - timedelta(days=1)).year)
+    for name_person, place, year, days in rows.values_list('name_person', 'place', 'year', 'days').iterator():
+        offset = (date(year, 1, 1) - first).days
+        value = int.from_bytes(days, 'little')
+        value = value << offset if offset >= 0 else value >> -offset
+        if value & mask:
+            maps[(name_person, place)] |= value & mask
+    maps = dict(maps)
+    with _lock:
+        _cache[key] = maps
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return maps
+
+
+def bitmaps(first, last):
+    """{(name_person, place): bits} for the days [first, last), bit 0 being first, rule occurrences included."""
+    maps = dict(_stored(first, last))
+    mask = (1 << (last - first).days) - 1
+    for _, name_person, start, end, all_day, place, _ in recurrence.occurrences(_midnight(first), _midnight(last)):
+        maps[(name_person, place)] = maps.get((name_person, place), 0) | (span_bits(*event_days(start, end, all_day), first) & mask)
+    return maps
+
+
+def people():
+    """Everyone with an entry, past or future, or a recurring one."""
+    names = set(AvailabilityYear.objects.values_list('name_person', flat=True).distinct())
+    names.update(RecurrenceRule.objects.values_list('name_person', flat=True).distinct())
+    return sorted(names)
+
+
+def _per_person(maps, places=None):
+    """{name_person: bits of the days with an entry at any of the places (or anywhere)}."""
+    result = defaultdict(int)
+    for (name_person, place), bits in maps.items():
+        if places is None or place in places:
+            result[name_person] |= bits
+    return result
+
+
+def at_least(bitmaps, count):
+    """Bits set in at least count of the bitmaps.
+
+    reached[j] holds the days seen in at least j bitmaps so far; each bitmap moves
+    days up one level, so this takes len(bitmaps) * count integer operations.
+    """
+    if count <= 0:
+        return -1  # every day
+    reached = [-1] + [0] * count
+    for bits in bitmaps:
+        for j in range(count, 0, -1):
+            reached[j] |= reached[j - 1] & bits
+    return reached[count]
+
+
+def days_of(bits, first, size, limit=None):
+    """The dates of the set bits below size, in order."""
+    bits &= (1 << size) - 1
+    days = []
+    while bits and (limit is None or len(days) < limit):
+        lowest = bits & -bits
+        days.append(first + timedelta(days=lowest.bit_length() - 1))
+        bits ^= lowest
+    return days
+
+
+def free_people(first, last, names=None, places=None):
+    """People without any entry (at the places, or anywhere) on every day of [first, last)."""
+    busy = _per_person(bitmaps(first, last), places)
+    return [name for name in (names or people()) if not busy.get(name)]
+
+
+def matching_days(first, last, names=None, places=None, minimum=1, limit=None):
+    """Days of [first, last) on which at least `minimum` of the people (or all of them, with minimum=None)
+    have an entry at the places (or anywhere)."""
+    busy = _per_person(bitmaps(first, last), places)
+    names = names or sorted(busy)
+    sets = [busy.get(name, 0) for name in names]
+    if minimum is None:
+        bits = reduce(and_, sets, -1) if sets else 0
+    elif minimum == 1:
+        bits = reduce(or_, sets, 0)
+    else:
+        bits = at_least(sets, minimum)
+    return days_of(bits, first, (last - first).days, limit)
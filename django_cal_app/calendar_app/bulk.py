@@ -0,0 +1,118 @@
+"""Remove or reassign every event matching a filter at once, e.g. a cancelled campaign or a place closed for maintenance.
+
+Each operation is one queryset-level UPDATE in one transaction, with one audit entry and one
+refresh of the version, feed cache, occupancy and availability instead of one per event.
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .audit import record
+from .models import Event
+from .overlaps import sweep
+from .signals import bulk_changed
+from .transactions import atomic_with_retry
+
+logger = logging.getLogger('calendar_app')
+
+
+@dataclass
+class BulkResult:
+    matched: int = 0
+    ids: list = field(default_factory=list)
+    conflicts: list = field(default_factory=list)  # (reassigned event id, clashing event id)
+    dry_run: bool = False
+
+
+def matching_events(ids=None, people=None, places=None, start=None, end=None):
+    """Live events matching every given criterion; the date range selects the events overlapping [start, end).
+
+    At least one criterion is required, so an empty filter never selects the whole table.
+    """
+    if (start is None) != (end is None):
+        raise ValueError("Both start and end are required")
+    if start is not None and end <= start:
+        raise ValueError("end must be after start")
+    if not (ids or people or places or start):
+        raise ValueError("Give event ids, a person, a place or a date range")
+    events = Event.objects.all()
+    if ids:
+        events = events.filter(id__in=ids)
+    if people:
+        events = events.filter(name_person__in=people)
+    if places:
+        events = events.filter(place__in=places)
+    if start is not None:
+        events = events.filter(start__lt=end, end__gt=start)
+    return events
+
+
+def _span(rows):
+    # one range for the whole batch, so the feed cache and occupancy are refreshed with a single query each
+    return [(min(row[2] for row in rows), max(row[3] for row in rows))]
+
+
+def _conflicts(rows, to_person):
+    """(moved id, clashing id) pairs of the events to_person would then have, among the moved events and
+    against those to_person already has; pairs that existed before the move are left out."""
+    moved = {row[0] for row in rows if row[1] != to_person}
+    first, last = _span(rows)[0]
+    lookback = first - timedelta(days=settings.MAX_EVENT_DAYS)
+    existing = Event.objects.filter(name_person=to_person, start__gte=lookback, start__lt=last, end__gt=first)
+    ids = {row[0] for row in rows}
+    combined = [row for row in existing.values_list('id', 'name_person', 'start', 'end') if row[0] not in ids]
+    combined += [(event_id, to_person, start, end) for event_id, _, start, end in rows]
+    combined.sort(key=lambda row: (row[2], row[3]))
+    return [(later, earlier) if later in moved and earlier not in moved else (earlier, later)
+            for earlier, later in sweep(combined) if earlier in moved or later in moved]
+
+
+def _apply(action, criteria, user, dry_run, change, details=None, to_person=None, selected=None):
+    result = BulkResult(dry_run=dry_run)
+
+    def run():
+        events = matching_events(**criteria) if selected is None else selected
+        rows = list(events.order_by('start', 'id').values_list('id', 'name_person', 'start', 'end'))
+        result.matched = len(rows)
+        result.ids = [row[0] for row in rows]
+        result.conflicts = _conflicts(rows, to_person) if rows and to_person else []
+        if dry_run or not rows or result.conflicts:
+            return
+        # a queryset update sends no signals, so the derived tables are refreshed once below
+        changed = events.update(updated_at=timezone.now(), **change)
+        given = {key: value for key, value in criteria.items() if value}
+        record(action, user, details={'criteria': given, 'count': changed, 'ids': result.ids, **(details or {})})
+        bulk_changed(_span(rows), people={row[1] for row in rows} | {to_person})
+        actor = str(user)
+        transaction.on_commit(lambda: logger.info('Events %s by %s: %d events matching %s',
+                                                  action, actor, changed, given))
+
+    atomic_with_retry(run)
+    return result
+
+
+def remove_events(criteria, user=None, dry_run=False, events=None):
+    """Delete the matching events, keeping tombstones for /events/changes/ as remove_event does.
+
+    events, an Event queryset such as an admin selection, replaces the criteria.
+    """
+    now = timezone.now()
+    return _apply('bulk_deleted', criteria, user, dry_run,
+                  {'deleted_at': now, 'deleted_by': user if getattr(user, 'pk', None) else None}, selected=events)
+
+
+def reassign_events(criteria, to_person=None, to_place=None, user=None, dry_run=False, events=None):
+    """Move the matching events to another person and/or place.
+
+    Nothing changes when the events would then overlap one another or an entry to_person already has;
+    the clashing pairs are returned in result.conflicts.
+    """
+    change = {key: value for key, value in (('name_person', to_person), ('place', to_place)) if value}
+    if not change:
+        raise ValueError("Give the person or the place to reassign the events to")
+    return _apply('bulk_reassigned', criteria, user, dry_run, change, details={'to': change}, to_person=to_person,
+                  selected=events)
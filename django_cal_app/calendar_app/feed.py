@@ -0,0 +1,234 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+import heapq
+from itertools import chain, islice
+from operator import itemgetter
+from json.encoder import encode_basestring_ascii as encode_string
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import archive, recurrence
+from .models import CalendarVersion, Event
+from .versions import RECURRENCE_KEY
+
+
+# color map for places
+color_map = {
+    'Calp': '#002642',
+    'ORM': '#840032',
+    'Remote': '#e59500',
+    'Mirca': '#008000'
+}
+
+
+def parse_bound(value):
+    """Parse a FullCalendar range bound (ISO datetime or plain date) into an aware datetime."""
+    if not value:
+        return None
+    # an unencoded '+' in the UTC offset arrives as a space
+    value = value.strip().replace(' ', '+')
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date: {value}")
+        parsed = datetime.combine(day, time.min)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_window(params):
+    """Return the (start, end) window requested by FullCalendar's start/end query params."""
+    start = parse_bound(params.get('start'))
+    end = parse_bound(params.get('end'))
+    if start is None or end is None:
+        raise ValueError("Both start and end are required")
+    if end <= start:
+        raise ValueError("end must be after start")
+    return start, end
+
+
+def window_events(start, end):
+    """Events overlapping [start, end), answered by the (start, end) index."""
+    return Event.objects.filter(start__lt=end, end__gt=start).order_by('start', 'id')
+
+
+FEED_FIELDS = ('id', 'name_person', 'start', 'end', 'all_day', 'place', 'notes')
+
+# Same layout and separators JsonResponse produced for the list of event dicts
+FEED_ROW = ('{"id": %s, "title": %s, "name_person": %s, "start": "%s", "end": "%s", '
+            '"allDay": %s, "place": %s, "notes": %s, "color": %s}')
+
+
+class FeedEncoder:
+    """Formats feed rows, encoding (title, name_person, place, color) once per person and place."""
+
+    def __init__(self):
+        self.encoded = {}
+        self.items = []
+        self.separator = ''
+
+    def add(self, row):
+        event_id, name_person, start, end, all_day, place, notes = row
+        strings = self.encoded.get((name_person, place))
+        if strings is None:
+            strings = self.encoded[(name_person, place)] = (
+                encode_string(f"{name_person} - {place}"),
+                encode_string(name_person),
+                encode_string(place),
+                encode_string(color_map.get(place, '#000000')),  # Default to black if place not found
+            )
+        title, name_json, place_json, color = strings
+        self.items.append(FEED_ROW % (
+            # rule occurrences have string ids
+            event_id if isinstance(event_id, int) else encode_string(event_id), title, name_json, start.isoformat(), end.isoformat(),
+            'true' if all_day else 'false', place_json,
+            'null' if notes is None else encode_string(notes), color,
+        ))
+
+    def flush(self):
+        chunk = (self.separator + ', '.join(self.items)).encode()
+        self.separator = ', '
+        self.items = []
+        return chunk
+
+
+def window_extra(start, end):
+    """Feed rows of a window kept outside the live table, sorted by start: archived events
+    (only if the window reaches back that far) and rule occurrences."""
+    archived = archive.window_rows(start, end, FEED_FIELDS)
+    occurrences = recurrence.occurrences(start, end)
+    return list(heapq.merge(archived, occurrences, key=itemgetter(2))) if archived else occurrences
+
+
+def all_extra():
+    """Rows added to the ?all=1 feed: every archived event and the rule occurrences."""
+    return chain(archive.reaching().values_list(*FEED_FIELDS).iterator(), recurrence.all_occurrences())
+
+
+def _rows(events, extra, chunk_size):
+    rows = events.values_list(*FEED_FIELDS).iterator(chunk_size=chunk_size)
+    if not extra:
+        return rows
+    # both are sorted by start
+    return heapq.merge(rows, extra, key=itemgetter(2))
+
+
+def iter_feed(events, chunk_size=2000, extra=()):
+    """Yield the FullCalendar JSON for a queryset, and optionally extra rows such as window_extra(),
+    as byte chunks, without building model instances."""
+    encoder = FeedEncoder()
+    yield b'['
+    for row in _rows(events, extra, chunk_size):
+        encoder.add(row)
+        if len(encoder.items) >= chunk_size:
+            yield encoder.flush()
+    if encoder.items:
+        yield encoder.flush()
+    yield b']'
+
+
+async def aiter_feed(events, chunk_size=2000, extra=()):
+    """Async twin of iter_feed, for ASGI responses that must not buffer the whole body."""
+    # QuerySet.aiterator() runs the values_list() query in the async context on Django 5.0,
+    # so fetch slices of the (lazy) sync iterator in a thread, as aiterator does for other querysets
+    rows = _rows(events, extra, chunk_size)
+    next_slice = sync_to_async(lambda: list(islice(rows, chunk_size)))
+    encoder = FeedEncoder()
+    yield b'['
+    while True:
+        chunk = await next_slice()
+        for row in chunk:
+            encoder.add(row)
+        if encoder.items:
+            yield encoder.flush()
+        if len(chunk) < chunk_size:
+            break
+    yield b']'
+
+
+def event_detail(event):
+    """Fields of the details modal, from an Event or an ArchivedEvent."""
+    date_format = "%Y-%m-%d" if event.all_day else "%Y-%m-%d %H:%M"
+    return {
+        'title': event.name_person,
+        'start': event.start.strftime(date_format),
+        'end': event.end.strftime(date_format),
+        'place': event.place,
+        'notes': event.notes,
+        'all_day': event.all_day,
+    }
+
+
+def initial_window(today=None):
+    """The month FullCalendar shows first, padded by a day on each side since the browser's time zone is unknown here."""
+    today = today or timezone.localdate()
+    first = today.replace(day=1)
+    following = (first + timedelta(days=32)).replace(day=1)
+    start = timezone.make_aware(datetime.combine(first - timedelta(days=1), time.min))
+    end = timezone.make_aware(datetime.combine(following + timedelta(days=1), time.min))
+    return start, end
+
+
+def feed_bootstrap():
+    """Events of the initial window as JSON safe to embed in a <script> block, so the page needs no first feed request."""
+    issued = timezone.now()
+    start, end = initial_window()
+    body = b''.join((
+        f'{{"start": "{start.isoformat()}", "end": "{end.isoformat()}", "token": "{sync_token(issued)}", "events": '.encode(),
+        *iter_feed(window_events(start, end), extra=window_extra(start, end)),
+        b'}',
+    ))
+    # <, > and & only occur inside JSON strings, where the escapes mean the same
+    return body.replace(b'<', b'\\u003C').replace(b'>', b'\\u003E').replace(b'&', b'\\u0026').decode()
+
+
+# Changes are re-sent from a little before the token, to cover writes that committed
+# after a sync read them; applying an event twice on the client is harmless
+SYNC_OVERLAP = timedelta(seconds=5)
+
+
+class SyncTokenExpired(Exception):
+    pass
+
+
+def sync_token(moment):
+    return str(int(moment.timestamp() * 1_000_000))
+
+
+def parse_sync_token(token):
+    """Return the moment a sync token stands for; raises SyncTokenExpired once its tombstones may be purged."""
+    try:
+        moment = datetime.fromtimestamp(int(token) / 1_000_000, tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Invalid sync token: {token}")
+    retention = timedelta(days=getattr(settings, 'TOMBSTONE_RETENTION_DAYS', 30))
+    if moment < timezone.now() - retention:
+        raise SyncTokenExpired(token)
+    return moment
+
+
+def changed_events(since, start=None, end=None):
+    """(live events, deleted ids) touched since the given moment, optionally limited to a window.
+
+    With a window, events edited so that they left it are reported as deleted, so the client drops them.
+    """
+    changes = Event.all_objects.filter(updated_at__gte=since - SYNC_OVERLAP)
+    live = changes.filter(deleted_at__isnull=True)
+    removed = Q(deleted_at__isnull=False)
+    if start is not None and end is not None:
+        in_window = Q(start__lt=end, end__gt=start)
+        live = live.filter(in_window)
+        removed |= ~in_window
+    deleted = list(changes.filter(removed).values_list('id', flat=True))
+    return live.order_by('start', 'id'), deleted
+
+
+def rules_changed(since):
+    """Whether a recurrence rule or override changed since the moment; delta sync cannot express those."""
+    return CalendarVersion.objects.filter(key=RECURRENCE_KEY, updated_at__gte=since - SYNC_OVERLAP).exists()
@@ -0,0 +1,175 @@
+import hashlib
+import time
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .feed import parse_window
+from .models import CacheCounter, FeedCacheEntry
+from .versions import current_version, visibility
+
+# Overridable through settings.FEED_CACHE
+DEFAULTS = {
+    'ENABLED': True,
+    'TTL': 3600,  # seconds an entry stays valid even without writes
+    'MAX_ENTRIES': 500,  # least recently used entries beyond this are evicted
+    'TOUCH_INTERVAL': 60,  # only refresh last_used once per interval to keep hits read-only
+    'COUNTER_FLUSH': 30,  # seconds between hit/miss counter flushes
+}
+
+# hit/miss counts of this worker, not yet written to CacheCounter
+_pending = {'hits': 0, 'misses': 0}
+_last_flush = time.monotonic()
+
+
+def option(name):
+    return getattr(settings, 'FEED_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def _count(name):
+    global _last_flush
+    _pending[name] += 1
+    if time.monotonic() - _last_flush >= option('COUNTER_FLUSH'):
+        flush_counters()
+
+
+def flush_counters():
+    global _last_flush
+    _last_flush = time.monotonic()
+    for name, value in _pending.items():
+        if not value:
+            continue
+        try:
+            if not CacheCounter.objects.filter(name=name).update(value=F('value') + value):
+                try:
+                    CacheCounter.objects.create(name=name, value=value)
+                except IntegrityError:
+                    CacheCounter.objects.filter(name=name).update(value=F('value') + value)
+        except DatabaseError:
+            # keep the counts for the next flush rather than failing the request
+            continue
+        _pending[name] = 0
+
+
+def stats():
+    counters = dict(CacheCounter.objects.values_list('name', 'value'))
+    return {
+        'hits': counters.get('hits', 0) + _pending['hits'],
+        'misses': counters.get('misses', 0) + _pending['misses'],
+        'entries': FeedCacheEntry.objects.count(),
+    }
+
+
+def cache_key(request):
+    """(window_start, window_end, visibility) for a cacheable feed request, else None."""
+    if not option('ENABLED') or request.GET.get('all') == '1':
+        return None
+    try:
+        start, end = parse_window(request.GET)
+    except ValueError:
+        return None
+    return start, end, visibility(request)
+
+
+def cached_entry(request):
+    """Fresh cache entry for this request's window, memoized on the request; counts the hit or miss."""
+    if hasattr(request, '_feed_cache_entry'):
+        return request._feed_cache_entry
+    entry = None
+    key = cache_key(request)
+    if key is not None:
+        start, end, vis = key
+        now = timezone.now()
+        entry = (FeedCacheEntry.objects
+                 .filter(window_start=start, window_end=end, visibility=vis,
+                         created_at__gt=now - timedelta(seconds=option('TTL')))
+                 .first())
+        if entry is None:
+            _count('misses')
+        else:
+            _count('hits')
+            if entry.last_used < now - timedelta(seconds=option('TOUCH_INTERVAL')):
+                try:
+                    FeedCacheEntry.objects.filter(pk=entry.pk).update(last_used=now)
+                except DatabaseError:
+                    pass
+    request._feed_cache_entry = entry
+    return entry
+
+
+def store_after(request, chunks):
+    """Pass streamed chunks through and cache the complete body once the last one is sent."""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    store(request, b''.join(parts))
+
+
+def store(request, body):
+    """Cache a freshly built body unless a write happened while it was being built."""
+    key = cache_key(request)
+    if key is None:
+        return None
+    version, _ = current_version(request)
+    # current_version was read before the events query; a newer version means the body may be stale
+    if current_version()[0] != version:
+        return None
+    start, end, vis = key
+    now = timezone.now()
+    try:
+        entry, _ = FeedCacheEntry.objects.update_or_create(
+            window_start=start, window_end=end, visibility=vis,
+            defaults={'body': body, 'version': version, 'created_at': now, 'last_used': now},
+        )
+        evict()
+    except DatabaseError:
+        # another worker stored the same window or holds the write lock; the cache is best effort
+        return None
+    return entry
+
+
+def evict():
+    stale = FeedCacheEntry.objects.order_by('-last_used').values_list('pk', flat=True)[option('MAX_ENTRIES'):]
+    stale_ids = list(stale)
+    if stale_ids:
+        FeedCacheEntry.objects.filter(pk__in=stale_ids).delete()
+
+
+def invalidate(ranges):
+    """Drop only the cached windows overlapping any of the given (start, end) ranges."""
+    ranges = [(start, end) for start, end in ranges if start is not None and end is not None]
+    if not ranges:
+        return 0
+    overlap = reduce(or_, (Q(window_start__lt=end, window_end__gt=start) for start, end in ranges))
+    deleted, _ = FeedCacheEntry.objects.filter(overlap).delete()
+    return deleted
+
+
+def clear():
+    deleted, _ = FeedCacheEntry.objects.all().delete()
+    return deleted
+
+
+def feed_etag(request):
+    # Built from the global version the body was serialized at, so it can be sent before a
+    # streamed body is complete and stays stable for a cached window until a write drops it
+    if request.GET.get('all') != '1':
+        try:
+            parse_window(request.GET)
+        except ValueError:
+            return None
+    entry = cached_entry(request)
+    version = entry.version if entry is not None else current_version(request)[0]
+    window = hashlib.md5(f"{request.GET.get('start')}|{request.GET.get('end')}|{request.GET.get('all')}".encode()).hexdigest()[:12]
+    return f"feed-{version}-{visibility(request)}-{window}"
+
+
+def feed_last_modified(request):
+    entry = cached_entry(request)
+    return entry.created_at if entry is not None else None
@@ -1,6 +1,10 @@
+from datetime import timedelta
+
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from .models import Event
+from .overlaps import overlapping
 
 
 class EventForm(forms.ModelForm):
@@ -8,6 +12,11 @@ class EventForm(forms.ModelForm):
         model = Event
         fields = ['name_person', 'start', 'end', 'place', 'notes', 'all_day']
 
+    def __init__(self, *args, check_overlap=False, **kwargs):
+        # reject events overlapping another event of the same person
+        self.check_overlap = check_overlap
+        super().__init__(*args, **kwargs)
+
     def clean(self):
         cleaned_data = super().clean()
         start = cleaned_data.get('start')
@@ -19,4 +28,19 @@ class EventForm(forms.ModelForm):
             if start.date() == end.date() and start.time() > end.time():
                 raise ValidationError("End time cannot be before start time on the same day.")
 
+        if start and end and end - start > timedelta(days=settings.MAX_EVENT_DAYS):
+            raise ValidationError(f"An event cannot be longer than {settings.MAX_EVENT_DAYS} days.")
+
+        name_person = cleaned_data.get('name_person')
+        if self.check_overlap and name_person and start and end:
+            other = overlapping(name_person, start, end, exclude_id=self.instance.pk).first()
+            if other is not None:
+                when = other.start.strftime('%Y-%m-%d' if other.all_day else '%Y-%m-%d %H:%M')
+                raise ValidationError(f"{name_person} is already at {other.place} from {when}.")
+
         return cleaned_data
+
+    def error_message(self):
+        """The validation errors on one line, for JSON responses and reports."""
+        return '; '.join(f"{name}: {' '.join(errors)}" if name != '__all__' else ' '.join(errors)
+                         for name, errors in self.errors.items())
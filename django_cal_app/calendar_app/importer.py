@@ -0,0 +1,205 @@
+import csv
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from django.db import transaction
+
+from .audit import record
+from .forms import EventForm
+from .models import Event
+from .overlaps import batch_conflicts
+from .signals import bulk_changed, suspended
+
+logger = logging.getLogger('calendar_app')
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    errors: list = field(default_factory=list)  # (row number, message)
+    batches: int = 0
+
+
+def _parse_day_or_time(value):
+    """Return (datetime or date, has_time) for 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM'."""
+    value = value.strip().replace('T', ' ')
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'):
+        try:
+            return datetime.strptime(value, fmt), True
+        except ValueError:
+            pass
+    return datetime.strptime(value, '%Y-%m-%d').date(), False
+
+
+def row_to_form_data(row):
+    """Map a CSV row to EventForm data, with the same conventions as the add entry modal:
+    all-day rows use dates and an inclusive end date, timed rows default the end to the start."""
+    start, start_has_time = _parse_day_or_time(row.get('start') or '')
+    end_value = (row.get('end') or '').strip()
+    all_day_value = (row.get('all_day') or '').strip().lower()
+    all_day = all_day_value in TRUE_VALUES if all_day_value else not start_has_time
+
+    if all_day:
+        start = start.date() if isinstance(start, datetime) else start
+        end = _parse_day_or_time(end_value)[0] if end_value else start
+        end = (end.date() if isinstance(end, datetime) else end) + timedelta(days=1)  # Full calendar has exclusive end date
+    else:
+        end = _parse_day_or_time(end_value)[0] if end_value else start
+    return {
+        'name_person': (row.get('name_person') or '').strip(),
+        'start': start.isoformat(sep=' ') if isinstance(start, datetime) else start.isoformat(),
+        'end': end.isoformat(sep=' ') if isinstance(end, datetime) else end.isoformat(),
+        'all_day': all_day,
+        'place': (row.get('place') or '').strip(),
+        'notes': row.get('notes') or '',
+    }
+
+
+def read_csv(lines):
+    """Yield (row number, form data or exception) for a CSV with a
+    name_person,start,end,place[,notes][,all_day] header."""
+    for number, row in enumerate(csv.DictReader(lines), start=2):
+        try:
+            yield number, row_to_form_data(row)
+        except ValueError as e:
+            yield number, e
+
+
+def _unfold(lines):
+    """Join iCalendar continuation lines (RFC 5545 section 3.1)."""
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current is not None:
+        yield current
+
+
+def _ics_text(value):
+    return value.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+
+def _ics_datetime(params, value):
+    if 'VALUE=DATE' in params.upper() or len(value) == 8:
+        return datetime.strptime(value, '%Y%m%d').date()
+    # UTC ("Z") and floating times are both taken as UTC, the project's TIME_ZONE
+    return datetime.strptime(value.rstrip('Z')[:15], '%Y%m%dT%H%M%S')
+
+
+def read_ics(lines):
+    """Yield (VEVENT number, form data or exception) from an iCalendar file. SUMMARY is the
+    person (a trailing ' - <place>' as exported by the calendar is stripped), LOCATION the place."""
+    event = None
+    number = 0
+    for line in _unfold(lines):
+        if line == 'BEGIN:VEVENT':
+            number += 1
+            event = {}
+            continue
+        if event is None:
+            continue
+        if line == 'END:VEVENT':
+            yield number, _ics_form_data(event)
+            event = None
+            continue
+        name, _, value = line.partition(':')
+        name, _, params = name.partition(';')
+        event[name.upper()] = (params, value)
+
+
+def _ics_form_data(event):
+    try:
+        summary = _ics_text(event.get('SUMMARY', ('', ''))[1])
+        place = _ics_text(event.get('LOCATION', ('', ''))[1])
+        if not place and ' - ' in summary:
+            summary, place = summary.rsplit(' - ', 1)
+        elif place and summary.endswith(f' - {place}'):
+            summary = summary[:-len(place) - 3]
+        start = _ics_datetime(*event['DTSTART'])
+        all_day = not isinstance(start, datetime)
+        if 'DTEND' in event:
+            end = _ics_datetime(*event['DTEND'])
+        else:
+            end = start + timedelta(days=1) if all_day else start
+    except (KeyError, ValueError) as e:
+        return ValueError(f"Invalid VEVENT: {e}")
+    return {
+        'name_person': summary.strip(),
+        # iCalendar all-day DTEND is already exclusive, as stored by add_event
+        'start': start.isoformat(sep=' ') if isinstance(start, datetime) else start.isoformat(),
+        'end': end.isoformat(sep=' ') if isinstance(end, datetime) else end.isoformat(),
+        'all_day': all_day,
+        'place': place.strip(),
+        'notes': _ics_text(event.get('DESCRIPTION', ('', ''))[1]),
+    }
+
+
+def import_events(rows, user=None, batch_size=500, dry_run=False, source=''):
+    """Validate rows with EventForm and insert the valid ones with bulk_create, one transaction per batch.
+
+    rows yields (row number, form data or exception); source names the file in the audit trail.
+    Rows overlapping an event of the same person, or an earlier row, are reported as errors.
+    The feed version, cache and occupancy are refreshed once at the end instead of once per event,
+    also after an interruption, for the batches already committed.
+    """
+    result = ImportResult()
+    batch = []
+    numbers = []
+    first, last = None, None
+
+    def flush():
+        nonlocal first, last
+        conflicts = batch_conflicts([(number, e.name_person, e.start, e.end) for number, e in zip(numbers, batch)])
+        result.errors.extend(conflicts.items())
+        batch[:] = [e for number, e in zip(numbers, batch) if number not in conflicts]
+        numbers.clear()
+        if not batch:
+            return
+        start, end = _batch_span(batch)
+        if not dry_run:
+            with transaction.atomic(), suspended():
+                Event.objects.bulk_create(batch)
+                record('imported', user, details={'source': source, 'events': len(batch),
+                                                  'first_id': batch[0].id, 'last_id': batch[-1].id,
+                                                  'start': start, 'end': end})
+            logger.info('Events imported by %s: batch %d, %d events, %s to %s',
+                        user, result.batches + 1, len(batch), start, end)
+            first = start if first is None or start < first else first
+            last = end if last is None or end > last else last
+        result.created += len(batch)
+        result.batches += 1
+        batch.clear()
+
+    try:
+        for number, data in rows:
+            if isinstance(data, Exception):
+                result.errors.append((number, str(data)))
+                continue
+            form = EventForm(data)
+            if not form.is_valid():
+                result.errors.append((number, form.error_message()))
+                continue
+            event = form.save(commit=False)
+            event.created_by = user
+            batch.append(event)
+            numbers.append(number)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+        result.errors.sort()
+    finally:
+        if first is not None:
+            bulk_changed([(first, last)])
+    return result
+
+
+def _batch_span(batch):
+    return min(e.start for e in batch), max(e.end for e in batch)
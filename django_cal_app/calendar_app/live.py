@@ -0,0 +1,85 @@
+import asyncio
+import json
+
+from django.conf import settings
+
+from .models import CalendarVersion
+from .versions import GLOBAL_KEY
+
+
+class ChangeBroadcaster:
+    """Fans out calendar changes to the SSE connections of one worker process.
+
+    Workers do not share memory, so every worker polls the global CalendarVersion row
+    (one small query per interval, however many browsers are connected) and wakes all
+    of its waiting streams when the version moves.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.version = None
+        self.listeners = 0
+        self._changed = None
+        self._task = None
+
+    async def _read_version(self):
+        return await CalendarVersion.objects.filter(key=GLOBAL_KEY).values_list('version', flat=True).afirst() or 0
+
+    async def _poll(self):
+        while self.listeners:
+            try:
+                version = await self._read_version()
+            except Exception:
+                # a locked or unreachable database only delays the next notification
+                version = self.version
+            if version != self.version:
+                self.version = version
+                changed, self._changed = self._changed, asyncio.Event()
+                changed.set()
+            await asyncio.sleep(self.interval)
+        self._task = None
+        self.version = None
+
+    async def subscribe(self):
+        self.listeners += 1
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        if self.version is None:
+            self.version = await self._read_version()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._poll())
+
+    def unsubscribe(self):
+        self.listeners -= 1
+
+    async def wait(self, timeout):
+        """Wait for the next change; returns the new version, or None on timeout."""
+        changed = self._changed
+        try:
+            await asyncio.wait_for(changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self.version
+
+
+broadcaster = ChangeBroadcaster(getattr(settings, 'LIVE_UPDATES_POLL_INTERVAL', 1.0))
+
+
+def _message(version):
+    return f"id: {version}\nevent: change\ndata: {json.dumps({'version': version})}\n\n"
+
+
+async def change_stream(last_seen=None):
+    """Server-Sent Events: a 'change' message whenever the calendar is modified, comments as keep-alives."""
+    await broadcaster.subscribe()
+    try:
+        yield "retry: 5000\n\n"
+        # a reconnecting browser sends the last id it saw; tell it if it missed something
+        if last_seen is not None and str(broadcaster.version) != last_seen:
+            yield _message(broadcaster.version)
+        heartbeat = getattr(settings, 'LIVE_UPDATES_HEARTBEAT', 15)
+        while True:
+            version = await broadcaster.wait(heartbeat)
+            yield ": keep-alive\n\n" if version is None else _message(version)
+    finally:
+        broadcaster.unsubscribe()
@@ -0,0 +1,109 @@
+import fcntl
+import json
+import logging
+import os
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+
+class MultiprocessTimedRotatingFileHandler(TimedRotatingFileHandler):
+    """TimedRotatingFileHandler for a file written by several processes (the gunicorn workers).
+
+    The rollover runs under an exclusive lock on '<file>.lock'. A process that finds the file
+    already rotated by another one only reopens it, instead of rotating (and overwriting) again.
+    """
+
+    def _rotated_elsewhere(self):
+        if self.stream is None:
+            return False
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def _reopen(self):
+        self.stream.close()
+        self.stream = self._open()
+        self.rolloverAt = self.computeRollover(int(time.time()))
+
+    def shouldRollover(self, record):
+        if self._rotated_elsewhere():
+            self._reopen()
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        with open(f'{self.baseFilename}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if self._rotated_elsewhere():
+                    self._reopen()
+                else:
+                    super().doRollover()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class QueuedRotatingFileHandler(QueueHandler):
+    """Queue records in memory and write them from a background thread, so requests never wait on the disk.
+
+    Takes the arguments of TimedRotatingFileHandler. Messages are formatted by the writer thread,
+    so log arguments must not change after the call (pass values, not model instances).
+    The queue is drained when logging shuts down at process exit.
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(queue.SimpleQueue())
+        self.target = MultiprocessTimedRotatingFileHandler(filename, delay=True, **kwargs)
+        self.listener = None
+        self.pid = None
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def _start(self):
+        # records queued before a fork stay with the parent, which writes them
+        self.queue = queue.SimpleQueue()
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        self.pid = os.getpid()
+
+    def prepare(self, record):
+        # only tracebacks are rendered here, while their frames still exist
+        if record.exc_info:
+            record.exc_text = (self.formatter or logging.Formatter()).formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        # called with the handler lock held
+        if self.pid != os.getpid():
+            self._start()
+        super().emit(record)
+
+    def close(self):
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+        self.target.close()
+        super().close()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the structured fields passed as extra={'audit': {...}}."""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if hasattr(record, 'audit'):
+            data.update(record.audit)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
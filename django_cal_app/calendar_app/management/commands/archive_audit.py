@@ -0,0 +1,45 @@
+import gzip
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from calendar_app.audit import entry_data
+from calendar_app.models import AuditEntry
+
+
+class Command(BaseCommand):
+    help = ("Move audit entries older than --days to a gzipped JSON-lines file and delete them from the table, "
+            "keeping the searchable trail compact")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=730, help="Keep entries younger than this in the table")
+        parser.add_argument('--output', help="Archive file, default audit-<cutoff date>.jsonl.gz")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help="Only count the entries that would be archived")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        old = AuditEntry.objects.filter(timestamp__lt=cutoff)
+        if options['dry_run']:
+            self.stdout.write(f"{old.count()} entries older than {cutoff:%Y-%m-%d} would be archived")
+            return
+
+        output = options['output'] or f'audit-{cutoff:%Y-%m-%d}.jsonl.gz'
+        archived = 0
+        last_id = 0
+        # append, so a rerun after an interruption adds to the same archive
+        with gzip.open(output, 'at', encoding='utf-8') as f:
+            while True:
+                batch = list(old.filter(id__gt=last_id).order_by('id')[:options['batch_size']])
+                if not batch:
+                    break
+                for entry in batch:
+                    f.write(json.dumps(entry_data(entry)) + '\n')
+                # written out before the rows go, so an interruption can only duplicate lines, never lose them
+                f.flush()
+                last_id = batch[-1].id
+                AuditEntry.objects.filter(id__in=[entry.id for entry in batch]).delete()
+                archived += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} entries older than {cutoff:%Y-%m-%d} to {output}"))
@@ -0,0 +1,48 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from calendar_app.audit import record
+from calendar_app.models import ArchivedEvent, Event
+from calendar_app.signals import suspended
+from calendar_app.versions import ARCHIVE_KEY, bump_version
+
+# copied as they are; the id is kept so links, audit entries and sync ids still match
+COPIED_FIELDS = ['id', 'name_person', 'start', 'end', 'all_day', 'place', 'notes', 'created_by_id', 'updated_at', 'legacy_id']
+
+
+class Command(BaseCommand):
+    help = ("Move events that ended more than --days ago from the live table to ArchivedEvent. "
+            "The feed, event details and counts still show them, reading the archive only for windows that reach it")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--dry-run', action='store_true', help="Only count the events that would be archived")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.make_aware(datetime.combine(timezone.localdate() - timedelta(days=options['days']), time.min))
+        old = Event.objects.filter(end__lte=cutoff)
+        if options['dry_run']:
+            self.stdout.write(f"{old.count()} events ending before {cutoff:%Y-%m-%d} would be archived")
+            return
+
+        archived = 0
+        while True:
+            # occupancy, availability and the feeds read both tables, so moving rows changes
+            # nothing derived from them and the per-event signals are skipped
+            with transaction.atomic(), suspended():
+                batch = list(old.order_by('id').values(*COPIED_FIELDS)[:options['batch_size']])
+                if not batch:
+                    break
+                ArchivedEvent.objects.bulk_create([ArchivedEvent(**fields) for fields in batch])
+                Event.all_objects.filter(id__in=[fields['id'] for fields in batch]).delete()
+            archived += len(batch)
+        if archived:
+            with transaction.atomic():
+                bump_version(ARCHIVE_KEY)
+                record('archived', '', details={'events': archived, 'before': cutoff})
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} events ending before {cutoff:%Y-%m-%d}"))
@@ -0,0 +1,205 @@
+import json
+import multiprocessing
+import platform
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.utils import timezone
+
+from calendar_app import availability, feed_cache, occupancy
+from calendar_app.models import Event
+from calendar_app.signals import suspended
+from calendar_app.synthetic import generate
+from calendar_app.versions import bump_version
+
+ENDPOINTS = ['all_events', 'all_events_uncached', 'event_details', 'add_event', 'remove_event']
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples):
+    """samples: list of (seconds, queries or None, bytes, ok)."""
+    latencies = sorted(s[0] * 1000 for s in samples)
+    queries = [s[1] for s in samples if s[1] is not None]
+    sizes = [s[2] for s in samples]
+    return {
+        'requests': len(samples),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'queries_mean': round(statistics.fmean(queries), 2) if queries else None,
+        'queries_max': max(queries) if queries else None,
+        'bytes_mean': round(statistics.fmean(sizes)),
+        'bytes_max': max(sizes),
+        'errors': sum(1 for s in samples if not s[3]),
+    }
+
+
+class Driver:
+    """Issues requests against one endpoint through the Django test client."""
+
+    def __init__(self, user_id, event_ids, months, seed):
+        self.client = Client()
+        self.client.force_login(User.objects.get(pk=user_id))
+        self.event_ids = event_ids
+        self.months = months
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.added = 0
+
+    def request(self, endpoint, with_body=False):
+        if endpoint in ('all_events', 'all_events_uncached'):
+            first = self.rng.choice(self.months)
+            params = {'start': first.isoformat(), 'end': (first + timedelta(days=42)).isoformat()}
+            if endpoint == 'all_events_uncached':
+                feed_cache.clear()
+            response = self.client.get('/all_events/', params)
+        elif endpoint == 'event_details':
+            response = self.client.get(f'/event/{self.rng.choice(self.event_ids)}/')
+        elif endpoint == 'add_event':
+            day = self.rng.choice(self.months) + timedelta(days=self.rng.randint(0, 27))
+            # a person of its own per request, as an entry overlapping one of the same person is rejected
+            self.added += 1
+            response = self.client.post('/add_event/', {
+                'name_person': f'Benchmark {self.seed}-{self.added}', 'full_day': 'on', 'place': 'ORM',
+                'start_date': day.isoformat(), 'end_date': (day + timedelta(days=2)).isoformat(),
+            })
+        else:
+            # each id is handed out once, so deletions never collide
+            response = self.client.post('/remove_event/', {'id': self.event_ids.pop()})
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        # add/remove report failures (e.g. "database is locked") in the JSON body with a 200
+        ok = response.status_code < 400 and b'"status": "error"' not in body
+        return (len(body), ok, body) if with_body else (len(body), ok)
+
+    def measure(self, endpoint, count, count_queries):
+        samples = []
+        for _ in range(count):
+            if count_queries:
+                with CaptureQueriesContext(connection) as queries:
+                    began = time.perf_counter()
+                    size, ok = self.request(endpoint)
+                    elapsed = time.perf_counter() - began
+                samples.append((elapsed, len(queries), size, ok))
+            else:
+                began = time.perf_counter()
+                size, ok = self.request(endpoint)
+                samples.append((time.perf_counter() - began, None, size, ok))
+        return samples
+
+
+def _worker(args):
+    user_id, event_ids, months, seed, endpoint, count = args
+    return Driver(user_id, event_ids, months, seed).measure(endpoint, count, count_queries=False)
+
+
+class Command(BaseCommand):
+    help = ("Benchmark all_events, event_details, add_event and remove_event on a throwaway database "
+            "filled with synthetic schedules, and save latency/query/size percentiles as JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200],
+                            help="Number of synthetic people per run (each generates --years of events)")
+        parser.add_argument('--years', type=int, default=3)
+        parser.add_argument('--requests', type=int, default=100, help="Requests per endpoint and run")
+        parser.add_argument('--processes', type=int, default=4, help="Concurrent client processes for the load pass")
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS)
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument('--compare', help="Earlier results file to print p50/p95 changes against")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        # a file-backed test database so the forked load processes share it
+        workdir = tempfile.TemporaryDirectory()
+        connection.settings_dict['TEST']['NAME'] = f'{workdir.name}/benchmark.sqlite3'
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            results = [self.run_size(people, options) for people in options['sizes']]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            workdir.cleanup()
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'options': {k: options[k] for k in ('sizes', 'years', 'requests', 'processes', 'endpoints')},
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if options['compare']:
+            with open(options['compare']) as f:
+                self.compare(json.load(f), report)
+
+    def compare(self, baseline, report):
+        previous = {(r['people'], name): stats for r in baseline['results'] for name, stats in r['endpoints'].items()}
+        for result in report['results']:
+            for name, stats in result['endpoints'].items():
+                old = previous.get((result['people'], name))
+                if old is None:
+                    continue
+                for pass_name in ('sequential', 'concurrent'):
+                    for key in ('p50_ms', 'p95_ms'):
+                        before, after = old[pass_name][key], stats[pass_name][key]
+                        change = (after - before) / before if before else 0
+                        self.stdout.write(f"{result['people']:>5} people  {name:<20} {pass_name:<10} {key}: "
+                                          f"{before:.2f} -> {after:.2f} ({change:+.0%})")
+
+    def run_size(self, people, options):
+        with transaction.atomic(), suspended():
+            Event.all_objects.all().delete()
+            created = generate(people, options['years'])
+            bump_version()
+            feed_cache.clear()
+            occupancy.rebuild()
+            availability.rebuild()
+        user, _ = User.objects.get_or_create(username='benchmark')
+        event_ids = list(Event.objects.values_list('id', flat=True))
+        random.Random(people).shuffle(event_ids)
+        first_year = date.today().year - options['years'] + 1
+        months = [date(year, month, 1) for year in range(first_year, first_year + options['years']) for month in range(1, 13)]
+        self.stdout.write(f"{people} people: {created} events")
+
+        result = {'people': people, 'events': created, 'endpoints': {}}
+        processes = options['processes']
+        count = options['requests']
+        # disjoint id pools: sequential pass, then one per load process
+        pool_size = max(1, len(event_ids) // (processes + 1))
+        pools = [event_ids[i * pool_size:(i + 1) * pool_size] for i in range(processes + 1)]
+        for endpoint in options['endpoints']:
+            sequential = Driver(user.pk, list(pools[0]), months, 0).measure(endpoint, count, count_queries=True)
+
+            connections.close_all()
+            per_process = max(1, count // processes)
+            jobs = [(user.pk, list(pools[i + 1]), months, i + 1, endpoint, per_process) for i in range(processes)]
+            began = time.perf_counter()
+            with multiprocessing.get_context('fork').Pool(processes) as pool:
+                concurrent = [sample for samples in pool.map(_worker, jobs) for sample in samples]
+            wall = time.perf_counter() - began
+
+            result['endpoints'][endpoint] = {
+                'sequential': summarize(sequential),
+                'concurrent': dict(summarize(concurrent), processes=processes,
+                                   throughput_rps=round(len(concurrent) / wall, 1)),
+            }
+            self.stdout.write(f"  {endpoint}: p50 {result['endpoints'][endpoint]['sequential']['p50_ms']} ms, "
+                              f"{result['endpoints'][endpoint]['concurrent']['throughput_rps']} req/s with {processes} processes")
+        return result
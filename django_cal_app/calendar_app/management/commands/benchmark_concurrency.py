@@ -0,0 +1,122 @@
+import asyncio
+import json
+import socket
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from .benchmark import summarize
+
+
+async def _open(host, port, receive_buffer=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    if receive_buffer:
+        # a small window makes the server block on writes like a client on a slow link
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+    sock.setblocking(False)
+    await asyncio.get_running_loop().sock_connect(sock, (host, port))
+    return await asyncio.open_connection(sock=sock)
+
+
+def _request_lines(host, path):
+    return [f"GET {path} HTTP/1.1\r\n", f"Host: {host}\r\n", "User-Agent: benchmark_concurrency\r\n",
+            "Accept: application/json\r\n", "Connection: close\r\n", "\r\n"]
+
+
+async def slow_reader(host, port, path, delay, stop):
+    """Trickle the request headers, then read the response 1 KB at a time, until stop is set."""
+    while not stop.is_set():
+        try:
+            reader, writer = await _open(host, port, receive_buffer=4096)
+            for line in _request_lines(host, path):
+                writer.write(line.encode())
+                await writer.drain()
+                await asyncio.sleep(delay)
+            while not stop.is_set() and await reader.read(1024):
+                await asyncio.sleep(delay)
+            writer.close()
+        except OSError:
+            await asyncio.sleep(delay)
+
+
+async def fast_request(host, port, path, timeout):
+    began = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(_open(host, port), timeout)
+        writer.write(''.join(_request_lines(host, path)).encode())
+        response = await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+    except (OSError, asyncio.TimeoutError):
+        return time.perf_counter() - began, None, 0, False
+    head, _, body = response.partition(b'\r\n\r\n')
+    ok = head.startswith(b'HTTP/1.1 2') or head.startswith(b'HTTP/1.1 304')
+    return time.perf_counter() - began, None, len(body), ok
+
+
+async def fast_client(host, port, path, timeout, stop, samples):
+    while not stop.is_set():
+        samples.append(await fast_request(host, port, path, timeout))
+
+
+class Command(BaseCommand):
+    help = ("Measure read throughput and latency of a running server while slow clients hold connections open, "
+            "e.g. to compare DJANGO_SERVER_MODE=wsgi and asgi")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help="Base URL of the running server")
+        parser.add_argument('--path', default='/all_events/?start=2024-01-01&end=2024-02-12',
+                            help="Endpoint requested by the fast clients")
+        parser.add_argument('--slow-path', default='/all_events/?all=1', help="Endpoint requested by the slow clients")
+        parser.add_argument('--slow-clients', type=int, nargs='+', default=[0, 5, 20])
+        parser.add_argument('--fast-clients', type=int, default=4)
+        parser.add_argument('--slow-delay', type=float, default=0.5,
+                            help="Seconds between each header line / 1 KB read of a slow client")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds per run")
+        parser.add_argument('--timeout', type=float, default=10, help="Fast request timeout, counted as an error")
+        parser.add_argument('--output', default='benchmark_concurrency.json')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError("--url must be a plain http:// URL")
+        host, port = url.hostname, url.port or 80
+
+        results = []
+        for slow in options['slow_clients']:
+            samples, wall = asyncio.run(self.run(host, port, slow, options))
+            stats = dict(summarize(samples), slow_clients=slow, fast_clients=options['fast_clients'],
+                         throughput_rps=round(len(samples) / wall, 1)) if samples else \
+                {'slow_clients': slow, 'requests': 0}
+            results.append(stats)
+            self.stdout.write(f"{slow:>4} slow clients: {stats.get('throughput_rps', 0)} req/s, "
+                              f"p50 {stats.get('p50_ms')} ms, p99 {stats.get('p99_ms')} ms, {stats.get('errors', 0)} errors")
+
+        report = {
+            'created': timezone.now().isoformat(),
+            'options': {k: options[k] for k in ('url', 'path', 'slow_path', 'fast_clients', 'slow_delay', 'duration')},
+            'results': results,
+        }
+        with open(options['output'], 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    async def run(self, host, port, slow, options):
+        stop = asyncio.Event()
+        samples = []
+        slow_tasks = [asyncio.create_task(slow_reader(host, port, options['slow_path'], options['slow_delay'], stop))
+                      for _ in range(slow)]
+        # let the slow clients take their connections first
+        await asyncio.sleep(min(options['slow_delay'] * 2, options['duration'] / 4) if slow else 0)
+        began = time.perf_counter()
+        fast_tasks = [asyncio.create_task(fast_client(host, port, options['path'], options['timeout'], stop, samples))
+                      for _ in range(options['fast_clients'])]
+        await asyncio.sleep(options['duration'])
+        stop.set()
+        await asyncio.gather(*fast_tasks)
+        wall = time.perf_counter() - began
+        for task in slow_tasks:
+            task.cancel()
+        await asyncio.gather(*slow_tasks, return_exceptions=True)
+        return samples, wall
@@ -0,0 +1,47 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from calendar_app.bulk import reassign_events, remove_events
+from calendar_app.feed import parse_bound
+
+
+class Command(BaseCommand):
+    help = "Remove or reassign every event matching a filter in one transaction, e.g. a cancelled campaign"
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['remove', 'reassign'])
+        parser.add_argument('--id', type=int, action='append', dest='ids', help="Event id (repeatable)")
+        parser.add_argument('--person', action='append', dest='people', help="Repeatable")
+        parser.add_argument('--place', action='append', dest='places', help="Repeatable")
+        parser.add_argument('--start', help="With --end: events overlapping the range (date or ISO datetime)")
+        parser.add_argument('--end')
+        parser.add_argument('--to-person', help="reassign: new person")
+        parser.add_argument('--to-place', help="reassign: new place")
+        parser.add_argument('--user', help="Username recorded in the audit trail")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the matching events")
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user {options['user']}")
+        try:
+            criteria = {key: options[key] for key in ('ids', 'people', 'places')}
+            criteria.update(start=parse_bound(options['start']), end=parse_bound(options['end']))
+            if options['action'] == 'remove':
+                result = remove_events(criteria, user=user, dry_run=options['dry_run'])
+            else:
+                result = reassign_events(criteria, to_person=options['to_person'], to_place=options['to_place'],
+                                         user=user, dry_run=options['dry_run'])
+        except ValueError as e:
+            raise CommandError(e)
+
+        for earlier, later in result.conflicts:
+            self.stderr.write(f"#{earlier} would overlap #{later}")
+        if result.conflicts:
+            raise CommandError(f"Nothing reassigned: {len(result.conflicts)} overlapping pairs")
+        verb = {'remove': 'deleted', 'reassign': 'reassigned'}[options['action']]
+        prefix = "Would have " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(f"{prefix}{verb} {result.matched} events"))
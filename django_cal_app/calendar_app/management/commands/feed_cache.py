@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from calendar_app import feed_cache
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of the /all_events/ response cache, or clear it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clear', action='store_true', help="Drop every cached window")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            deleted = feed_cache.clear()
+            self.stdout.write(self.style.SUCCESS(f"Removed {deleted} cached windows"))
+            return
+        stats = feed_cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / lookups if lookups else 0
+        self.stdout.write(f"hits: {stats['hits']}\nmisses: {stats['misses']}\nhit ratio: {ratio:.1%}\nentries: {stats['entries']}")
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from calendar_app.models import Event
+from calendar_app.overlaps import find_conflicts
+
+
+class Command(BaseCommand):
+    help = "List the events of the same person that overlap in time (e.g. booked at Calp and ORM on the same night)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--person', help="Only check this person")
+        parser.add_argument('--limit', type=int, default=100, help="Conflicts listed in full (0 for all)")
+
+    def handle(self, *args, **options):
+        queryset = Event.objects.all()
+        if options['person']:
+            queryset = queryset.filter(name_person=options['person'])
+        began = time.perf_counter()
+        pairs = list(find_conflicts(queryset))
+        elapsed = time.perf_counter() - began
+
+        shown = pairs[:options['limit']] if options['limit'] else pairs
+        events = Event.objects.in_bulk({event_id for pair in shown for event_id in pair})
+        for first, second in shown:
+            first, second = events[first], events[second]
+            self.stdout.write(f"{first.name_person}: #{first.id} {first.place} {first.start:%Y-%m-%d %H:%M} - "
+                              f"{first.end:%Y-%m-%d %H:%M} overlaps #{second.id} {second.place} "
+                              f"{second.start:%Y-%m-%d %H:%M} - {second.end:%Y-%m-%d %H:%M}")
+        if len(shown) < len(pairs):
+            self.stdout.write(f"... and {len(pairs) - len(shown)} more")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(pairs)} conflicts among {queryset.count()} events, found in {elapsed:.3f} s"))
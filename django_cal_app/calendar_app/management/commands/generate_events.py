@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from calendar_app import availability, feed_cache, occupancy, reports
+from calendar_app.models import Event
+from calendar_app.signals import suspended
+from calendar_app.synthetic import generate
+from calendar_app.versions import bump_version
+
+
+class Command(BaseCommand):
+    help = "Fill the calendar with synthetic schedules for N people over M years (for load tests)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--people', type=int, default=20)
+        parser.add_argument('--years', type=int, default=2)
+        parser.add_argument('--start-year', type=int, help="First year to generate (default: so that the last one is the current year)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--clear', action='store_true', help="Delete all existing events first")
+
+    def handle(self, *args, **options):
+        with transaction.atomic(), suspended():
+            if options['clear']:
+                Event.all_objects.all().delete()
+            created = generate(options['people'], options['years'], options['start_year'], options['seed'])
+            # one version bump and cache flush for the whole batch instead of per-event signals
+            bump_version()
+            feed_cache.clear()
+            reports.clear()
+            occupancy.rebuild()
+            availability.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Created {created} events"))
@@ -0,0 +1,35 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from calendar_app.importer import import_events, read_csv, read_ics
+
+
+class Command(BaseCommand):
+    help = "Import a roster from a CSV (name_person,start,end,place,notes,all_day) or iCalendar file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ics'], help="Default: from the file extension")
+        parser.add_argument('--user', help="Username recorded as creator of the imported events")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Only validate the rows")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('ics' if path.lower().endswith('.ics') else 'csv')
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user {options['user']}")
+
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            rows = read_ics(f) if file_format == 'ics' else read_csv(f)
+            result = import_events(rows, user=user, batch_size=options['batch_size'], dry_run=options['dry_run'],
+                                   source=path)
+
+        for number, message in result.errors:
+            self.stderr.write(f"{'Event' if file_format == 'ics' else 'Row'} {number}: {message}")
+        verb = "Validated" if options['dry_run'] else "Imported"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {result.created} events in {result.batches} batches, {len(result.errors)} rejected"))
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from calendar_app.models import Event
+from calendar_app.signals import suspended
+
+
+class Command(BaseCommand):
+    help = "Permanently delete events that were removed longer ago than TOMBSTONE_RETENTION_DAYS"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'TOMBSTONE_RETENTION_DAYS', 30))
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        # tombstones are invisible to the feed, so no version bump or cache invalidation is needed
+        with suspended():
+            deleted, _ = Event.all_objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} tombstones older than {options['days']} days"))
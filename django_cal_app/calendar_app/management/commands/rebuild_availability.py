@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from calendar_app import availability, reports
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-person, per-place day bitmaps behind /availability/ from the events"
+
+    def handle(self, *args, **options):
+        rows = availability.rebuild()
+        # the cached report months are counted from the bitmaps
+        reports.clear()
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} availability rows"))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from calendar_app import occupancy
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-day, per-place occupancy table from the events (e.g. after a backfill)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=parse_date, help="First day (default: first event)")
+        parser.add_argument('--end', type=parse_date, help="Day after the last one (default: after the last event)")
+
+    def handle(self, *args, **options):
+        rows = occupancy.rebuild(options['start'], options['end'])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} occupancy rows"))
@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from calendar_app.reports import csv_lines, person_days, write_xlsx
+
+
+class Command(BaseCommand):
+    help = "Person-days per month and per person and place (or per place) over a period, as CSV or XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', required=True, help="First day, YYYY-MM-DD")
+        parser.add_argument('--end', required=True, help="Day after the last one, YYYY-MM-DD")
+        parser.add_argument('--by', choices=['person', 'place'], default='person')
+        parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--output', help="File to write; CSV goes to stdout by default")
+
+    def handle(self, *args, **options):
+        try:
+            first, last = date.fromisoformat(options['start']), date.fromisoformat(options['end'])
+        except ValueError as e:
+            raise CommandError(e)
+        if last <= first:
+            raise CommandError("end must be after start")
+        rows = person_days(first, last, options['by'])
+
+        if options['format'] == 'xlsx':
+            if not options['output']:
+                raise CommandError("XLSX reports need --output")
+            try:
+                write_xlsx(rows, options['output'])
+            except ImportError:
+                raise CommandError("XLSX reports need openpyxl: pip install openpyxl")
+            return
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+                f.writelines(csv_lines(rows))
+        else:
+            for line in csv_lines(rows):
+                self.stdout.write(line, ending='')
@@ -0,0 +1,123 @@
+import json
+import multiprocessing
+import random
+import tempfile
+import time
+import warnings
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.test.utils import setup_test_environment
+from django.utils import timezone
+
+from calendar_app import availability, feed_cache, occupancy
+from calendar_app.models import Event
+from calendar_app.signals import suspended
+from calendar_app.synthetic import generate
+from calendar_app.versions import bump_version
+
+from .benchmark import Driver, summarize
+
+# what the tuned profile is compared with: the stock backend as configured before
+BASELINE = {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}, 'CONN_MAX_AGE': 0}
+
+
+def _worker(args):
+    user_id, event_ids, months, seed, duration, write_ratio = args
+    driver = Driver(user_id, event_ids, months, seed)
+    rng = random.Random(seed)
+    samples = {'read': [], 'write': []}
+    locked = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        if rng.random() < write_ratio:
+            kind = 'write'
+            endpoint = 'remove_event' if driver.event_ids and rng.random() < 0.5 else 'add_event'
+        else:
+            kind = 'read'
+            endpoint = rng.choice(['all_events_uncached', 'event_details'])
+        began = time.perf_counter()
+        try:
+            size, ok, body = driver.request(endpoint, with_body=True)
+            locked += b'locked' in body
+        except Exception as e:
+            size, ok = 0, False
+            locked += 'locked' in str(e)
+        samples[kind].append((time.perf_counter() - began, None, size, ok))
+    return samples, locked
+
+
+class Command(BaseCommand):
+    help = ("Hammer a throwaway copy of the database with concurrent reads and writes from several processes, "
+            "with the stock SQLite settings and with the tuned profile, and report lock errors and throughput")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=6)
+        parser.add_argument('--duration', type=float, default=10, help="Seconds per profile")
+        parser.add_argument('--write-ratio', type=float, default=0.3, help="Share of add/remove requests")
+        parser.add_argument('--people', type=int, default=30)
+        parser.add_argument('--years', type=int, default=2)
+        parser.add_argument('--profiles', nargs='+', choices=['baseline', 'tuned'], default=['baseline', 'tuned'])
+        parser.add_argument('--output', default='stress_db.json')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        warnings.filterwarnings('ignore', message=r'.*received a naive datetime', category=RuntimeWarning)
+        tuned = {key: connections.settings['default'][key] for key in BASELINE}
+        results = []
+        for profile in options['profiles']:
+            connections['default'].close()
+            connections.settings['default'].update(BASELINE if profile == 'baseline' else tuned)
+            # rebuild the connection object so the engine change applies
+            del connections['default']
+            results.append(self.run_profile(profile, options))
+
+        with open(options['output'], 'w') as f:
+            json.dump({'created': timezone.now().isoformat(), 'options': options, 'results': results},
+                      f, indent=2, default=str)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def run_profile(self, profile, options):
+        workdir = tempfile.TemporaryDirectory()
+        connection.settings_dict['TEST']['NAME'] = f'{workdir.name}/stress.sqlite3'
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            with transaction.atomic(), suspended():
+                generate(options['people'], options['years'])
+                bump_version()
+                feed_cache.clear()
+                occupancy.rebuild()
+                availability.rebuild()
+            user, _ = User.objects.get_or_create(username='stress')
+            event_ids = list(Event.objects.values_list('id', flat=True))
+            random.Random(0).shuffle(event_ids)
+            first_year = date.today().year - options['years'] + 1
+            months = [date(year, month, 1) for year in range(first_year, first_year + options['years'])
+                      for month in range(1, 13)]
+
+            processes = options['processes']
+            pool_size = len(event_ids) // processes
+            jobs = [(user.pk, event_ids[i * pool_size:(i + 1) * pool_size], months, i, options['duration'],
+                     options['write_ratio']) for i in range(processes)]
+            connections.close_all()
+            began = time.perf_counter()
+            with multiprocessing.get_context('fork').Pool(processes) as pool:
+                outcomes = pool.map(_worker, jobs)
+            wall = time.perf_counter() - began
+        finally:
+            connections.close_all()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            workdir.cleanup()
+
+        result = {'profile': profile, 'processes': processes, 'lock_errors': sum(locked for _, locked in outcomes)}
+        for kind in ('read', 'write'):
+            samples = [sample for outcome, _ in outcomes for sample in outcome[kind]]
+            result[kind] = dict(summarize(samples), throughput_rps=round(len(samples) / wall, 1)) if samples else {}
+        self.stdout.write(
+            f"{profile:<9} reads {result['read'].get('throughput_rps', 0)} req/s (p99 {result['read'].get('p99_ms')} ms), "
+            f"writes {result['write'].get('throughput_rps', 0)} req/s (p99 {result['write'].get('p99_ms')} ms), "
+            f"{result['write'].get('errors', 0) + result['read'].get('errors', 0)} errors, {result['lock_errors']} lock errors")
+        return result
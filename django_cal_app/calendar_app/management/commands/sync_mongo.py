@@ -0,0 +1,52 @@
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from calendar_app.mongo_sync import sync_collection
+
+
+class Command(BaseCommand):
+    help = ("Copy the Dash app's MongoDB availability collection into the calendar. Safe to rerun: "
+            "documents are upserted by their _id, and each run continues from the saved checkpoint")
+
+    def add_arguments(self, parser):
+        # same variables as dash_app/.env
+        parser.add_argument('--host', default=os.environ.get('DB_HOST', 'localhost'))
+        parser.add_argument('--port', type=int, default=int(os.environ.get('DB_PORT') or 27017))
+        parser.add_argument('--db', default=os.environ.get('DB_NAME'))
+        parser.add_argument('--collection', default=os.environ.get('DB_COLL'))
+        parser.add_argument('--since-field',
+                            help="Document field holding its last change time; resyncs documents changed since the last run")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--full', action='store_true', help="Ignore the checkpoint and upsert every document")
+        parser.add_argument('--user', help="Username recorded as creator of new events")
+
+    def handle(self, *args, **options):
+        try:
+            from pymongo import MongoClient
+        except ImportError:
+            raise CommandError("sync_mongo needs pymongo: pip install pymongo")
+        if not options['db'] or not options['collection']:
+            raise CommandError("Set --db and --collection, or DB_NAME and DB_COLL")
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"Unknown user {options['user']}")
+
+        client = MongoClient(options['host'], options['port'])
+        try:
+            collection = client[options['db']][options['collection']]
+            result = sync_collection(collection, f"mongo:{options['db']}.{options['collection']}",
+                                     since_field=options['since_field'], batch_size=options['batch_size'],
+                                     full=options['full'], user=user)
+        finally:
+            client.close()
+
+        for document_id, message in result.errors:
+            self.stderr.write(f"Document {document_id}: {message}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Synced {result.synced} events in {result.batches} batches, {result.rejected} rejected, "
+            f"checkpoint {result.last_id or 'unchanged'}"))
@@ -0,0 +1,67 @@
+import base64
+import hashlib
+import os
+import re
+import urllib.request
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+# (source, path under calendar_app/static/vendor/, sha384 SRI hash where upstream publishes one)
+ASSETS = [
+    ('https://cdn.jsdelivr.net/npm/jquery@3.7.1/dist/jquery.min.js', 'jquery/jquery.min.js', None),
+    ('https://cdn.jsdelivr.net/npm/moment@2.30.1/min/moment.min.js', 'moment/moment.min.js', None),
+    ('https://cdn.jsdelivr.net/npm/bootstrap@5.3.2/dist/js/bootstrap.min.js', 'bootstrap/bootstrap.min.js',
+     'sha384-BBtl+eGJRgqQAUMxJ7pMwbEyER4l1g+O15P+16Ep7Q9Q+zqX6gSbd85u4mG4QzX+'),
+    ('https://cdn.jsdelivr.net/npm/fullcalendar@6.1.14/index.global.min.js', 'fullcalendar/index.global.min.js', None),
+    ('https://cdn.jsdelivr.net/npm/bootswatch@5.3.2/dist/lux/bootstrap.min.css', 'bootswatch/lux/bootstrap.min.css', None),
+    ('https://cdn.jsdelivr.net/npm/bootstrap-icons@1.9.0/font/bootstrap-icons.min.css',
+     'bootstrap-icons/bootstrap-icons.min.css', None),
+    ('https://cdn.jsdelivr.net/npm/bootstrap-icons@1.9.0/font/fonts/bootstrap-icons.woff2',
+     'bootstrap-icons/fonts/bootstrap-icons.woff2', None),
+    ('https://cdn.jsdelivr.net/npm/bootstrap-icons@1.9.0/font/fonts/bootstrap-icons.woff',
+     'bootstrap-icons/fonts/bootstrap-icons.woff', None),
+]
+
+# The Lux theme imports its web font from Google; the font stack falls back to the system sans-serif
+REMOTE_IMPORT = re.compile(rb'@import url\((["\']?)https?://[^)]*\1\);?')
+
+
+class Command(BaseCommand):
+    help = ("Download the pinned frontend libraries into calendar_app/static/vendor, "
+            "so pages load without any CDN request. Files already present are kept.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Download again even if the file exists")
+        parser.add_argument('--check', action='store_true',
+                            help="Download nothing and fail if a file is missing, e.g. when the container starts")
+
+    def handle(self, *args, **options):
+        vendor_dir = os.path.join(apps.get_app_config('calendar_app').path, 'static', 'vendor')
+        if options['check']:
+            # {% static %} raises for a file missing from the manifest, so every page would fail
+            missing = [path for _, path, _ in ASSETS if not os.path.exists(os.path.join(vendor_dir, path))]
+            if missing:
+                raise CommandError(f"Missing vendored assets: {', '.join(missing)}; "
+                                   "run 'python manage.py vendor_assets' where the CDN is reachable")
+            return
+        for url, path, integrity in ASSETS:
+            target = os.path.join(vendor_dir, path)
+            if os.path.exists(target) and not options['force']:
+                continue
+            try:
+                with urllib.request.urlopen(url, timeout=30) as response:
+                    content = response.read()
+            except OSError as e:
+                raise CommandError(f"Could not download {url}: {e}")
+            if integrity:
+                digest = 'sha384-' + base64.b64encode(hashlib.sha384(content).digest()).decode()
+                if digest != integrity:
+                    raise CommandError(f"Integrity check failed for {url}")
+            if path.endswith('.css'):
+                content = REMOTE_IMPORT.sub(b'', content)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(content)
+            self.stdout.write(f"{path}: {len(content)} bytes")
+        self.stdout.write(self.style.SUCCESS(f"Vendored assets are in {vendor_dir}"))
@@ -0,0 +1,199 @@
+"""Per-view request metrics, aggregated across the gunicorn workers.
+
+Each worker keeps its totals in memory and writes them every FLUSH_INTERVAL seconds to
+its own JSON file in DIR; /metrics adds up all the files. It deletes the files of workers
+that exited, and those not written for FILE_TTL seconds, which Prometheus sees as a counter
+reset; an idle worker still running writes its totals again at its next flush.
+"""
+import atexit
+import glob
+import json
+import os
+import tempfile
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+
+# Overridable through settings.METRICS
+DEFAULTS = {
+    'ENABLED': True,
+    'DIR': os.path.join(tempfile.gettempdir(), 'calendar_metrics'),
+    'FLUSH_INTERVAL': 10,  # seconds between writes of this worker's totals
+    'FILE_TTL': 24 * 3600,  # seconds after which a worker file that was not rewritten is deleted
+    'TOKEN': None,  # bearer token accepted by /metrics besides a staff session
+    'SLOW_REQUEST_SECONDS': None,  # log the SQL of requests slower than this
+}
+
+BUCKETS = {
+    'calendar_request_duration_seconds': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    'calendar_request_queries': (1, 2, 5, 10, 20, 50, 100, 200),
+    'calendar_response_size_bytes': (1_000, 10_000, 100_000, 1_000_000, 10_000_000),
+}
+
+HELP = {
+    'calendar_requests_total': ('counter', "Requests by view, method and status"),
+    'calendar_db_queries_total': ('counter', "SQL queries run by each view"),
+    'calendar_db_query_seconds_total': ('counter', "Time spent in SQL queries by each view"),
+    'calendar_request_duration_seconds': ('histogram', "Request latency, including streaming the body"),
+    'calendar_request_queries': ('histogram', "SQL queries per request"),
+    'calendar_response_size_bytes': ('histogram', "Response body size"),
+}
+
+# this worker's totals: counters[name][labels] and histograms[name][labels] = [bucket counts, sum, count]
+_counters = defaultdict(lambda: defaultdict(float))
+_histograms = defaultdict(dict)
+_process = (os.getpid(), time.time_ns())
+_last_flush = time.monotonic()
+
+
+def option(name):
+    return getattr(settings, 'METRICS', {}).get(name, DEFAULTS[name])
+
+
+def _labels(**labels):
+    return tuple(sorted(labels.items()))
+
+
+def _observe(name, labels, value):
+    histogram = _histograms[name].get(labels)
+    if histogram is None:
+        histogram = _histograms[name][labels] = [[0] * (len(BUCKETS[name]) + 1), 0, 0]
+    histogram[0][bisect_left(BUCKETS[name], value)] += 1
+    histogram[1] += value
+    histogram[2] += 1
+
+
+def record(view, method, status, duration, queries, query_time, size):
+    _reset_after_fork()
+    by_view = _labels(view=view)
+    _counters['calendar_requests_total'][_labels(view=view, method=method, status=str(status))] += 1
+    _counters['calendar_db_queries_total'][by_view] += queries
+    _counters['calendar_db_query_seconds_total'][by_view] += query_time
+    _observe('calendar_request_duration_seconds', by_view, duration)
+    _observe('calendar_request_queries', by_view, queries)
+    if size is not None:
+        _observe('calendar_response_size_bytes', by_view, size)
+    if time.monotonic() - _last_flush >= option('FLUSH_INTERVAL'):
+        flush()
+
+
+def _reset_after_fork():
+    global _process
+    if _process[0] != os.getpid():
+        _counters.clear()
+        _histograms.clear()
+        _process = (os.getpid(), time.time_ns())
+
+
+def flush():
+    """Write this worker's totals to its file, atomically."""
+    global _last_flush
+    _last_flush = time.monotonic()
+    if _process[0] != os.getpid() or not (_counters or _histograms):
+        return
+    data = {
+        'counters': [[name, labels, value] for name, series in _counters.items() for labels, value in series.items()],
+        'histograms': [[name, labels, *histogram] for name, series in _histograms.items()
+                       for labels, histogram in series.items()],
+    }
+    directory = option('DIR')
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.tmp', delete=False) as f:
+            json.dump(data, f)
+        os.replace(f.name, os.path.join(directory, '%d-%d.json' % _process))
+    except OSError:
+        # metrics are best effort; the totals are written again at the next flush
+        pass
+
+
+atexit.register(flush)
+
+
+def _running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OverflowError):
+        pass
+    return True
+
+
+def _stale(path, now):
+    """Whether a worker file belongs to an exited worker or was not written for FILE_TTL seconds."""
+    try:
+        pid = int(os.path.basename(path).split('-')[0])
+        return now - os.path.getmtime(path) > option('FILE_TTL') or not _running(pid)
+    except (OSError, ValueError):
+        return False
+
+
+def collect():
+    """Totals of all workers: ({name: {labels: value}}, {name: {labels: [buckets, sum, count]}}).
+
+    Stale worker files are deleted instead of counted.
+    """
+    counters = defaultdict(lambda: defaultdict(float))
+    histograms = defaultdict(dict)
+    now = time.time()
+    for path in glob.glob(os.path.join(option('DIR'), '*.json')):
+        if _stale(path, now):
+            try:
+                os.remove(path)
+            except OSError:
+                # another worker pruned it first
+                pass
+            continue
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data['counters']:
+            counters[name][tuple(map(tuple, labels))] += value
+        for name, labels, buckets, total, count in data['histograms']:
+            labels = tuple(map(tuple, labels))
+            current = histograms[name].setdefault(labels, [[0] * len(buckets), 0, 0])
+            current[0] = [a + b for a, b in zip(current[0], buckets)]
+            current[1] += total
+            current[2] += count
+    return counters, histograms
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return repr(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render():
+    """All workers' totals in the Prometheus text exposition format."""
+    flush()
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, text) in HELP.items():
+        series = counters.get(name) if kind == 'counter' else histograms.get(name)
+        if not series:
+            continue
+        lines += [f'# HELP {name} {text}', f'# TYPE {name} {kind}']
+        for labels in sorted(series):
+            if kind == 'counter':
+                lines.append(f'{name}{_format_labels(labels)} {_number(series[labels])}')
+                continue
+            buckets, total, count = series[labels]
+            cumulative = 0
+            for bound, value in zip(BUCKETS[name] + ('+Inf',), buckets):
+                cumulative += value
+                lines.append(f'{name}_bucket{_format_labels(labels, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_number(total)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
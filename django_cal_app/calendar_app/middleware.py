@@ -0,0 +1,132 @@
+import logging
+import time
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+
+from . import metrics
+
+slow_logger = logging.getLogger('calendar_app.slow_requests')
+
+MAX_LOGGED_QUERIES = 200
+
+
+class QueryRecorder:
+    """connection.execute_wrapper counting the queries of a request, and keeping their SQL if asked to."""
+
+    def __init__(self, keep_sql):
+        self.count = 0
+        self.time = 0.0
+        self.statements = [] if keep_sql else None
+
+    def __call__(self, execute, sql, params, many, context):
+        began = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - began
+            self.count += 1
+            self.time += elapsed
+            if self.statements is not None and len(self.statements) < MAX_LOGGED_QUERIES:
+                self.statements.append((elapsed, sql, params))
+
+    def __str__(self):
+        # only rendered by the log writer thread
+        return ''.join(f'\n  {elapsed * 1000:.1f} ms  {sql}  {params!r}' for elapsed, sql, params in self.statements)
+
+
+class MetricsMiddleware:
+    """Records latency, SQL queries and response size per view, served by /metrics.
+
+    Runs natively in both modes, so ASGI requests are not handed to a thread here. Streamed bodies
+    are measured once fully sent. Queries run while an async body is streamed (ASGI mode) happen
+    in another thread and are not counted.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not metrics.option('ENABLED'):
+            return self.get_response(request)
+        queries, began, slow = self.start()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            self.stop(queries)
+            raise
+        return self.measure(request, response, began, queries, slow)
+
+    async def __acall__(self, request):
+        if not metrics.option('ENABLED'):
+            return await self.get_response(request)
+        # the wrapper is context-local like the connection, so it also sees the queries of sync_to_async calls
+        queries, began, slow = self.start()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            self.stop(queries)
+            raise
+        return self.measure(request, response, began, queries, slow)
+
+    @staticmethod
+    def start():
+        slow = metrics.option('SLOW_REQUEST_SECONDS')
+        queries = QueryRecorder(keep_sql=slow is not None)
+        connection.execute_wrappers.append(queries)
+        return queries, time.perf_counter(), slow
+
+    def measure(self, request, response, began, queries, slow):
+        finish = partial(self.finish, request, response, began, queries, slow)
+        if not response.streaming:
+            finish(len(response.content))
+        elif response.is_async:
+            self.stop(queries)
+            response.streaming_content = self.aiter_measured(response.streaming_content, finish)
+        else:
+            response.streaming_content = self.iter_measured(response.streaming_content, finish)
+        return response
+
+    @staticmethod
+    def stop(queries):
+        try:
+            connection.execute_wrappers.remove(queries)
+        except ValueError:
+            pass
+
+    def finish(self, request, response, began, queries, slow, size):
+        self.stop(queries)
+        duration = time.perf_counter() - began
+        view = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        metrics.record(view, request.method, response.status_code, duration, queries.count, queries.time, size)
+        if slow is not None and duration >= slow:
+            slow_logger.warning('Slow request %s %s: %.3f s, %d queries in %.3f s%s', request.method,
+                                request.get_full_path(), duration, queries.count, queries.time, queries)
+
+    @staticmethod
+    def iter_measured(chunks, finish):
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            finish(size)
+
+    @staticmethod
+    async def aiter_measured(chunks, finish):
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                yield chunk
+        finally:
+            finish(size)
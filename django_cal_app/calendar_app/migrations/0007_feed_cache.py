@@ -0,0 +1,41 @@
+# Generated by Django 5.0.6 on 2026-10-17 14:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0006_event_updated_at_calendarversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FeedCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window_start', models.DateTimeField()),
+                ('window_end', models.DateTimeField()),
+                ('visibility', models.CharField(max_length=10)),
+                ('body', models.BinaryField()),
+                ('version', models.PositiveBigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['last_used'], name='feed_cache_last_used_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='feedcacheentry',
+            constraint=models.UniqueConstraint(fields=('window_start', 'window_end', 'visibility'), name='feed_cache_window_unique'),
+        ),
+    ]
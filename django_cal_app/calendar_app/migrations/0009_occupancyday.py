@@ -0,0 +1,49 @@
+# Generated by Django 5.0.6 on 2026-10-17 14:19
+
+from datetime import timedelta
+
+from django.db import migrations, models
+
+
+def fill_occupancy(apps, schema_editor):
+    from calendar_app.occupancy import event_days, sweep
+    Event = apps.get_model('calendar_app', 'Event')
+    OccupancyDay = apps.get_model('calendar_app', 'OccupancyDay')
+    rows = list(Event.objects.filter(deleted_at__isnull=True).values_list('start', 'end', 'all_day', 'place'))
+    if not rows:
+        return
+    spans = [event_days(*row[:3]) for row in rows]
+    first = min(span[0] for span in spans)
+    last = max(span[1] for span in spans)
+    counts = sweep(rows, first, last)
+    OccupancyDay.objects.bulk_create(
+        (OccupancyDay(day=first + timedelta(days=i), place=place, count=count)
+         for place, daily in counts.items() for i, count in enumerate(daily) if count),
+        batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0008_event_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('place', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='occupancy_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='occupancyday',
+            constraint=models.UniqueConstraint(fields=('place', 'day'), name='occupancy_place_day_unique'),
+        ),
+        migrations.RunPython(fill_occupancy, migrations.RunPython.noop),
+    ]
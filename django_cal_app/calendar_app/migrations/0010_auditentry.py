@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-17 14:28
+
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0009_occupancyday'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.CharField(max_length=150)),
+                ('action', models.CharField(max_length=20)),
+                ('event_id', models.BigIntegerField(blank=True, null=True)),
+                ('details', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+            ],
+            options={
+                'verbose_name_plural': 'audit entries',
+                'indexes': [models.Index(fields=['timestamp', 'id'], name='audit_timestamp_idx'), models.Index(fields=['actor', 'timestamp'], name='audit_actor_idx'), models.Index(fields=['event_id', 'timestamp'], name='audit_event_idx')],
+            },
+        ),
+    ]
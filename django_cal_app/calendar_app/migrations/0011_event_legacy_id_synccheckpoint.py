@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-17 14:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0010_auditentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('last_id', models.CharField(blank=True, max_length=64, null=True)),
+                ('pass_started', models.DateTimeField(blank=True, null=True)),
+                ('synced_until', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='legacy_id',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+    ]
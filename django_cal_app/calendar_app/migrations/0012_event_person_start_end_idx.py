@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-17 14:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0011_event_legacy_id_synccheckpoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['name_person', 'start', 'end'], name='event_person_start_end_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.6 on 2026-10-17 14:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0012_event_person_start_end_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurrenceRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name_person', models.CharField(max_length=100)),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('all_day', models.BooleanField(default=False)),
+                ('place', models.CharField(max_length=100)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('freq', models.CharField(choices=[('DAILY', 'Daily'), ('WEEKLY', 'Weekly')], default='WEEKLY', max_length=6)),
+                ('interval', models.PositiveSmallIntegerField(default=1)),
+                ('byweekday', models.CharField(blank=True, help_text='Weekly rules: e.g. MO,FR (default: the weekday of start)', max_length=20)),
+                ('until', models.DateField(blank=True, help_text='Last day an occurrence can start on', null=True)),
+                ('count', models.PositiveIntegerField(blank=True, help_text='Number of occurrences', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_rules', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecurrenceOverride',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_start', models.DateTimeField()),
+                ('cancelled', models.BooleanField(default=False)),
+                ('start', models.DateTimeField(blank=True, null=True)),
+                ('end', models.DateTimeField(blank=True, null=True)),
+                ('place', models.CharField(blank=True, max_length=100)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overrides', to='calendar_app.recurrencerule')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recurrencerule',
+            index=models.Index(fields=['start', 'until'], name='rule_start_until_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recurrenceoverride',
+            constraint=models.UniqueConstraint(fields=('rule', 'original_start'), name='rule_override_unique'),
+        ),
+    ]
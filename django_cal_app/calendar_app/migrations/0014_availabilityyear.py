@@ -0,0 +1,46 @@
+# Generated by Django 5.0.6 on 2026-10-17 14:46
+
+from django.db import migrations, models
+
+
+def fill_availability(apps, schema_editor):
+    from calendar_app.availability import DAY_BYTES, _year_bits
+    Event = apps.get_model('calendar_app', 'Event')
+    AvailabilityYear = apps.get_model('calendar_app', 'AvailabilityYear')
+    rows = list(Event.objects.filter(deleted_at__isnull=True).values_list('name_person', 'place', 'start', 'end', 'all_day'))
+    if not rows:
+        return
+    first_year = min(row[2] for row in rows).year
+    last_year = max(row[3] for row in rows).year
+    AvailabilityYear.objects.bulk_create(
+        (AvailabilityYear(name_person=name_person, place=place, year=year, days=value.to_bytes(DAY_BYTES, 'little'))
+         for (name_person, place, year), value in _year_bits(rows, first_year, last_year).items()),
+        batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0013_recurrencerule_recurrenceoverride'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityYear',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name_person', models.CharField(max_length=100)),
+                ('place', models.CharField(max_length=100)),
+                ('year', models.PositiveSmallIntegerField()),
+                ('days', models.BinaryField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['year'], name='availability_year_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='availabilityyear',
+            constraint=models.UniqueConstraint(fields=('name_person', 'place', 'year'), name='availability_person_year_unique'),
+        ),
+        migrations.RunPython(fill_availability, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-17 14:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0014_availabilityyear'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEvent',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('name_person', models.CharField(max_length=100)),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('all_day', models.BooleanField(default=False)),
+                ('place', models.CharField(max_length=100)),
+                ('notes', models.TextField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField()),
+                ('legacy_id', models.CharField(blank=True, max_length=64, null=True, unique=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start', 'end'], name='archived_event_start_end_idx'), models.Index(fields=['end'], name='archived_event_end_idx')],
+            },
+        ),
+    ]
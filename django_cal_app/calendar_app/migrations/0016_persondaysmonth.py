@@ -0,0 +1,23 @@
+# Generated by Django 5.0.6 on 2026-10-17 15:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0015_archivedevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonDaysMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('days', models.JSONField(default=list)),
+                ('version', models.PositiveBigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
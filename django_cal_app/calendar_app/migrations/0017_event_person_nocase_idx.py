@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-17 15:14
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0016_persondaysmonth'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(django.db.models.functions.comparison.Collate('name_person', 'nocase'), name='event_person_nocase_idx'),
+        ),
+    ]
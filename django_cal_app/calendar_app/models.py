@@ -1,5 +1,19 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models.functions import Collate
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+class LiveEventManager(models.Manager):
+    """Hides deleted events, which are kept as tombstones for the delta-sync API."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class Event(models.Model):
@@ -11,6 +25,297 @@ class Event(models.Model):
     notes = models.TextField(null=True, blank=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_events')
     deleted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='deleted_events')
+    updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    # _id of the document in the Dash app's MongoDB collection, for events copied by sync_mongo
+    legacy_id = models.CharField(max_length=64, null=True, blank=True, unique=True)
+
+    objects = LiveEventManager()
+    all_objects = models.Manager()  # including tombstones
+
+    class Meta:
+        indexes = [
+            # delta sync: changes and tombstones since a token
+            models.Index(fields=['updated_at'], name='event_updated_at_idx'),
+            # window queries: start < window_end AND end > window_start
+            models.Index(fields=['start', 'end'], name='event_start_end_idx'),
+            models.Index(fields=['place', 'start'], name='event_place_start_idx'),
+            # per-person overlap checks: name_person = X AND start in a bounded range
+            models.Index(fields=['name_person', 'start', 'end'], name='event_person_start_end_idx'),
+            # the admin's case-insensitive prefix search: SQLite only uses an index for LIKE 'x%' with NOCASE
+            models.Index(Collate('name_person', 'nocase'), name='event_person_nocase_idx'),
+        ]
 
     def __str__(self):
         return self.name_person
+
+
+class ArchivedEvent(models.Model):
+    """An event moved out of the live table by archive_events, with its id kept; read only.
+
+    Reads fall through to this table only for windows that reach back before the archive horizon.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    name_person = models.CharField(max_length=100)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    all_day = models.BooleanField(default=False)
+    place = models.CharField(max_length=100)
+    notes = models.TextField(null=True, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    updated_at = models.DateTimeField()
+    legacy_id = models.CharField(max_length=64, null=True, blank=True, unique=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start', 'end'], name='archived_event_start_end_idx'),
+            # the archive horizon is the latest end
+            models.Index(fields=['end'], name='archived_event_end_idx'),
+        ]
+
+    def __str__(self):
+        return self.name_person
+
+
+class RecurrenceRule(models.Model):
+    """A regular entry such as "remote every Friday", stored once and expanded per requested window.
+
+    Follows RRULE semantics for FREQ, INTERVAL, BYDAY, UNTIL and COUNT: start/end are the
+    first occurrence, and every occurrence has the same duration.
+    """
+    FREQUENCIES = [('DAILY', 'Daily'), ('WEEKLY', 'Weekly')]
+    WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+
+    name_person = models.CharField(max_length=100)
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    all_day = models.BooleanField(default=False)
+    place = models.CharField(max_length=100)
+    notes = models.TextField(null=True, blank=True)
+    freq = models.CharField(max_length=6, choices=FREQUENCIES, default='WEEKLY')
+    interval = models.PositiveSmallIntegerField(default=1)
+    byweekday = models.CharField(max_length=20, blank=True, help_text="Weekly rules: e.g. MO,FR (default: the weekday of start)")
+    until = models.DateField(null=True, blank=True, help_text="Last day an occurrence can start on")
+    count = models.PositiveIntegerField(null=True, blank=True, help_text="Number of occurrences")
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='created_rules')
+    # also touched when an override changes, so it keys the expansion cache
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start', 'until'], name='rule_start_until_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name_person} - {self.place} ({self.rrule})"
+
+    @property
+    def rrule(self):
+        parts = [f"FREQ={self.freq}"]
+        if self.interval > 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.freq == 'WEEKLY' and self.byweekday:
+            parts.append(f"BYDAY={self.byweekday}")
+        if self.until:
+            parts.append(f"UNTIL={self.until:%Y%m%d}")
+        if self.count:
+            parts.append(f"COUNT={self.count}")
+        return ';'.join(parts)
+
+    def weekdays(self):
+        """Weekday numbers (Monday is 0) a weekly rule occurs on."""
+        days = {self.WEEKDAYS.index(day.strip().upper()) for day in self.byweekday.split(',') if day.strip()}
+        return sorted(days) or [timezone.localtime(self.start).weekday()]
+
+    def occurrence_starts(self, window_start, window_end):
+        """Starts of the occurrences overlapping [window_start, window_end), in order.
+
+        Computed from the window rather than by stepping from the first occurrence,
+        so the cost depends on the window and not on how old the rule is.
+        """
+        duration = self.end - self.start
+        # recurrences follow the wall clock, so step in local time
+        first = timezone.localtime(self.start).replace(tzinfo=None)
+        after = timezone.localtime(window_start - duration).replace(tzinfo=None)
+        before = timezone.localtime(window_end).replace(tzinfo=None)
+        if self.freq == 'DAILY':
+            base, offsets = first, [0]
+            period = timedelta(days=self.interval)
+        else:
+            base = first - timedelta(days=first.weekday())
+            offsets = self.weekdays()
+            period = timedelta(weeks=self.interval)
+        # occurrences of the first period that fall before the first one do not count
+        skipped = sum(1 for offset in offsets if base + timedelta(days=offset) < first)
+        period_index = max(0, (after - base) // period)
+        while True:
+            for position, offset in enumerate(offsets):
+                moment = base + period_index * period + timedelta(days=offset)
+                if moment < first:
+                    continue
+                if moment >= before or (self.until and moment.date() > self.until):
+                    return
+                if self.count and period_index * len(offsets) + position - skipped >= self.count:
+                    return
+                if moment > after:
+                    yield timezone.make_aware(moment)
+            period_index += 1
+
+    def clean(self):
+        if self.start and self.end and self.end < self.start:
+            raise ValidationError("The end of the first occurrence cannot be before its start.")
+        if self.start and self.end and self.end - self.start > timedelta(days=settings.MAX_EVENT_DAYS):
+            raise ValidationError(f"An occurrence cannot be longer than {settings.MAX_EVENT_DAYS} days.")
+        if not self.interval:
+            raise ValidationError("The interval must be at least 1.")
+        unknown = [day for day in self.byweekday.split(',') if day.strip() and day.strip().upper() not in self.WEEKDAYS]
+        if unknown:
+            raise ValidationError(f"Unknown weekdays: {', '.join(unknown)}. Use {','.join(self.WEEKDAYS)}.")
+
+
+class RecurrenceOverride(models.Model):
+    """Moves, edits or cancels one occurrence of a rule, identified by the start it would have had."""
+    rule = models.ForeignKey(RecurrenceRule, on_delete=models.CASCADE, related_name='overrides')
+    original_start = models.DateTimeField()
+    cancelled = models.BooleanField(default=False)
+    # left empty to keep the occurrence's own values
+    start = models.DateTimeField(null=True, blank=True)
+    end = models.DateTimeField(null=True, blank=True)
+    place = models.CharField(max_length=100, blank=True)
+    notes = models.TextField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['rule', 'original_start'], name='rule_override_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.rule_id} {self.original_start:%Y-%m-%d %H:%M}{' cancelled' if self.cancelled else ''}"
+
+
+class CalendarVersion(models.Model):
+    """Change counter shared by all workers, used to build ETags for the feed."""
+    key = models.CharField(max_length=50, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.version}"
+
+
+class FeedCacheEntry(models.Model):
+    """Serialized /all_events/ response for one window, shared by all gunicorn workers."""
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    visibility = models.CharField(max_length=10)
+    body = models.BinaryField()
+    version = models.PositiveBigIntegerField()  # global version the body was built from
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['window_start', 'window_end', 'visibility'], name='feed_cache_window_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['last_used'], name='feed_cache_last_used_idx'),
+        ]
+
+
+class CacheCounter(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+class OccupancyDay(models.Model):
+    """Number of live events per place and day, kept up to date on every write."""
+    day = models.DateField()
+    place = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['place', 'day'], name='occupancy_place_day_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['day'], name='occupancy_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.place}: {self.count}"
+
+
+class AvailabilityYear(models.Model):
+    """Days of one year a person has an entry at a place: bit i of days is set for day i (1 January is 0)."""
+    name_person = models.CharField(max_length=100)
+    place = models.CharField(max_length=100)
+    year = models.PositiveSmallIntegerField()
+    days = models.BinaryField()  # 46 bytes, little-endian
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name_person', 'place', 'year'], name='availability_person_year_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['year'], name='availability_year_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name_person} - {self.place} {self.year}"
+
+
+class PersonDaysMonth(models.Model):
+    """Person-days per person and place in one month, cached for reports until an event in the month changes."""
+    month = models.DateField(unique=True)  # first day of the month
+    days = models.JSONField(default=list)  # [[name_person, place, days], ...]
+    version = models.PositiveBigIntegerField()  # global version the counts were computed at
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}"
+
+
+class AuditEntry(models.Model):
+    """Append-only record of who changed what, written in the same transaction as the change.
+
+    actor is the username rather than a foreign key and event_id is a plain integer,
+    so entries outlive deleted users and purged tombstones.
+    """
+    timestamp = models.DateTimeField(default=timezone.now)
+    actor = models.CharField(max_length=150)
+    action = models.CharField(max_length=20)
+    event_id = models.BigIntegerField(null=True, blank=True)
+    details = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        verbose_name_plural = 'audit entries'
+        indexes = [
+            # keyset pagination walks (timestamp, id) backwards
+            models.Index(fields=['timestamp', 'id'], name='audit_timestamp_idx'),
+            models.Index(fields=['actor', 'timestamp'], name='audit_actor_idx'),
+            models.Index(fields=['event_id', 'timestamp'], name='audit_event_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Audit entries cannot be modified")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.timestamp:%Y-%m-%d %H:%M} {self.actor} {self.action} {self.event_id or ''}".rstrip()
+
+
+class SyncCheckpoint(models.Model):
+    """Progress of an external sync (sync_mongo), saved with every batch so a run can resume."""
+    name = models.CharField(max_length=200, unique=True)
+    last_id = models.CharField(max_length=64, null=True, blank=True)  # last document handled in the current pass
+    pass_started = models.DateTimeField(null=True, blank=True)  # start of the current, unfinished pass
+    synced_until = models.DateTimeField(null=True, blank=True)  # start of the last completed pass
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_id or '-'}"
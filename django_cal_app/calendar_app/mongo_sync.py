@@ -0,0 +1,169 @@
+"""Copy the Dash app's MongoDB availability collection into Event, in resumable batches."""
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .audit import record
+from .forms import EventForm
+from .models import ArchivedEvent, Event, SyncCheckpoint
+from .overlaps import batch_conflicts
+from .signals import bulk_changed, suspended
+
+logger = logging.getLogger('calendar_app')
+
+# fields overwritten when a document was copied before; deletions made in Django are kept
+UPDATE_FIELDS = ['name_person', 'start', 'end', 'all_day', 'place', 'notes', 'updated_at']
+
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class SyncResult:
+    synced: int = 0
+    rejected: int = 0
+    errors: list = field(default_factory=list)  # (document id, message), the first MAX_REPORTED_ERRORS
+    batches: int = 0
+    last_id: str = None
+
+
+def _form_value(value):
+    # BSON dates arrive as naive UTC datetimes; strings are passed through for the form to parse
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    return '' if value is None else str(value).strip()
+
+
+def document_to_form_data(document):
+    """Map a Dash availability document to EventForm data.
+
+    The person and place come from name_person/place, or from a FullCalendar 'Person - Place' title.
+    """
+    name_person = _form_value(document.get('name_person') or document.get('title'))
+    place = _form_value(document.get('place') or document.get('location'))
+    if not place and ' - ' in name_person:
+        name_person, place = name_person.rsplit(' - ', 1)
+    elif place and name_person.endswith(f' - {place}'):
+        name_person = name_person[:-len(place) - 3]
+    all_day = document.get('all_day', document.get('allDay'))
+    if all_day is None:
+        all_day = isinstance(document.get('start'), str) and len(document['start']) == 10
+    notes = document.get('notes', document.get('description'))
+    return {
+        'name_person': name_person.strip(),
+        'start': _form_value(document.get('start')),
+        'end': _form_value(document.get('end') or document.get('start')),
+        'all_day': bool(all_day),
+        'place': place.strip(),
+        'notes': '' if notes is None else str(notes),
+    }
+
+
+def _object_id(value):
+    try:
+        from bson import ObjectId
+    except ImportError:
+        return value
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+
+def sync_collection(collection, name, since_field=None, batch_size=1000, full=False, user=None):
+    """Upsert the documents of a pymongo (or mongomock) collection into Event, keyed by legacy_id.
+
+    Documents are read in _id order with a batched cursor, so memory stays bounded. The checkpoint
+    is saved in the transaction of each batch, so an interrupted run resumes after the last batch.
+    By default a run picks up documents added since the previous one. With since_field, it instead
+    picks up documents whose since_field changed since the previous completed run.
+    """
+    checkpoint, _ = SyncCheckpoint.objects.get_or_create(name=name)
+    if full:
+        checkpoint.last_id = checkpoint.synced_until = checkpoint.pass_started = None
+    if checkpoint.pass_started is None:
+        checkpoint.pass_started = timezone.now()
+        checkpoint.save()
+
+    query = {}
+    if since_field and checkpoint.synced_until:
+        query[since_field] = {'$gte': checkpoint.synced_until}
+    if checkpoint.last_id:
+        query['_id'] = {'$gt': _object_id(checkpoint.last_id)}
+
+    result = SyncResult()
+    actor = str(user) if user is not None else ''
+    batch = []
+    last_id = None
+    first, last = None, None
+
+    def reject(document_id, message):
+        result.rejected += 1
+        if len(result.errors) < MAX_REPORTED_ERRORS:
+            result.errors.append((document_id, message))
+        logger.warning('Mongo sync %s: document %s rejected: %s', name, document_id, message)
+
+    def flush():
+        nonlocal first, last
+        if last_id is None:
+            return
+        if batch:
+            # events moved to the archive are not copied back into the live table
+            archived = set(ArchivedEvent.objects.filter(legacy_id__in=[e.legacy_id for e in batch])
+                           .values_list('legacy_id', flat=True))
+            batch[:] = [e for e in batch if e.legacy_id not in archived]
+            # the events the batch overwrites are not clashes
+            conflicts = batch_conflicts([(e.legacy_id, e.name_person, e.start, e.end) for e in batch], label='document',
+                                        exclude=Q(legacy_id__in=[e.legacy_id for e in batch]))
+            for document_id, message in conflicts.items():
+                reject(document_id, message)
+            batch[:] = [e for e in batch if e.legacy_id not in conflicts]
+        spans = [(e.start, e.end) for e in batch]
+        with transaction.atomic(), suspended():
+            if batch:
+                # the days an updated event moves out of need refreshing too
+                spans += Event.all_objects.filter(legacy_id__in=[e.legacy_id for e in batch]).values_list('start', 'end')
+                Event.objects.bulk_create(batch, update_conflicts=True, unique_fields=['legacy_id'],
+                                          update_fields=UPDATE_FIELDS)
+                record('synced', actor, details={'source': name, 'events': len(batch),
+                                                 'first_id': batch[0].legacy_id, 'last_id': batch[-1].legacy_id})
+            checkpoint.last_id = last_id
+            checkpoint.save()
+        result.last_id = last_id
+        if not batch:
+            return
+        start, end = min(start for start, _ in spans), max(end for _, end in spans)
+        first = start if first is None or start < first else first
+        last = end if last is None or end > last else last
+        result.synced += len(batch)
+        result.batches += 1
+        logger.info('Mongo sync %s: batch %d, %d events up to %s', name, result.batches, len(batch), last_id)
+        batch.clear()
+
+    try:
+        for document in collection.find(query, sort=[('_id', 1)], batch_size=batch_size):
+            last_id = str(document['_id'])
+            form = EventForm(document_to_form_data(document))
+            if form.is_valid():
+                event = form.save(commit=False)
+                event.legacy_id = last_id
+                event.created_by = user
+                batch.append(event)
+            else:
+                reject(last_id, form.error_message())
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+        checkpoint.synced_until = checkpoint.pass_started
+        checkpoint.pass_started = None
+        if since_field:
+            # the next pass selects by since_field from the start of the collection
+            checkpoint.last_id = None
+        checkpoint.save()
+    finally:
+        # also after an interruption, for the batches already committed
+        if first is not None:
+            bulk_changed([(first, last)])
+    return result
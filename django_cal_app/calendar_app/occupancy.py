@@ -0,0 +1,128 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import accumulate, chain
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import archive, recurrence
+from .models import Event, OccupancyDay
+
+
+def _local(value, tz=None):
+    if isinstance(value, datetime):
+        return timezone.localtime(value, tz) if timezone.is_aware(value) else value
+    # add_event passes plain dates for all-day events
+    return datetime.combine(value, time.min)
+
+
+def _midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def event_days(start, end, all_day, tz=None):
+    """First day and exclusive last day an event occupies.
+
+    All-day ends are exclusive already (FullCalendar convention); a timed event also
+    counts on its end day unless it ends exactly at midnight. Batch callers pass the
+    current time zone, which is slow to look up per event.
+    """
+    start, end = _local(start, tz), _local(end, tz)
+    first, last = start.date(), end.date()
+    if all_day:
+        return first, max(last, first + timedelta(days=1))
+    if end.time() == time.min and last > first:
+        return first, last
+    return first, last + timedelta(days=1)
+
+
+def _days(first, last):
+    return [first + timedelta(days=i) for i in range((last - first).days)]
+
+
+def apply(place, start, end, all_day, delta):
+    """Add delta (+1/-1) to every day of one event: three queries whatever the event length."""
+    first, last = event_days(start, end, all_day)
+    rows = OccupancyDay.objects.filter(place=place, day__gte=first, day__lt=last)
+    rows.update(count=F('count') + delta)
+    if delta > 0:
+        existing = set(rows.values_list('day', flat=True))
+        OccupancyDay.objects.bulk_create(
+            [OccupancyDay(day=day, place=place, count=delta) for day in _days(first, last) if day not in existing])
+    else:
+        rows.filter(count__lte=0).delete()
+
+
+def sweep(rows, first, last):
+    """Per-place daily counts over [first, last) from (start, end, all_day, place) rows.
+
+    Sweep line: +1 where an event starts, -1 where it ends, then one running sum per place.
+    """
+    size = (last - first).days
+    diffs = defaultdict(lambda: [0] * (size + 1))
+    tz = timezone.get_current_timezone()
+    for start, end, all_day, place in rows:
+        event_first, event_last = event_days(start, end, all_day, tz)
+        lo = max((event_first - first).days, 0)
+        hi = min((event_last - first).days, size)
+        if lo >= hi:
+            continue
+        diff = diffs[place]
+        diff[lo] += 1
+        diff[hi] -= 1
+    return {place: list(accumulate(diff[:size])) for place, diff in diffs.items()}
+
+
+def rebuild(first=None, last=None, batch_size=5000):
+    """Recompute the materialized counts for [first, last), or for all events, archived ones included."""
+    events = Event.objects.all()
+    if first is None or last is None:
+        tables = (events, archive.reaching())
+        starts = [start for start in (table.order_by('start').values_list('start', flat=True).first() for table in tables) if start]
+        ends = [end for end in (table.order_by('-end').values_list('end', flat=True).first() for table in tables) if end]
+        if not starts:
+            OccupancyDay.objects.all().delete()
+            return 0
+        first = first or _local(min(starts)).date()
+        last = last or _local(max(ends)).date() + timedelta(days=1)
+    lo, hi = _midnight(first), _midnight(last)
+    rows = chain(*(table.filter(start__lt=hi, end__gt=lo).values_list('start', 'end', 'all_day', 'place').iterator(chunk_size=batch_size)
+                   for table in (events, archive.reaching(lo, hi))))
+    counts = sweep(rows, first, last)
+    with transaction.atomic():
+        OccupancyDay.objects.filter(day__gte=first, day__lt=last).delete()
+        OccupancyDay.objects.bulk_create(
+            (OccupancyDay(day=first + timedelta(days=i), place=place, count=count)
+             for place, daily in counts.items() for i, count in enumerate(daily) if count),
+            batch_size=batch_size)
+    return sum(1 for daily in counts.values() for count in daily if count)
+
+
+def rebuild_ranges(ranges):
+    """Rebuild the days touched by a batch of changes, given as (start, end) datetimes."""
+    ranges = [(start, end) for start, end in ranges if start is not None and end is not None]
+    if not ranges:
+        return
+    first = min(_local(start).date() for start, _ in ranges)
+    last = max(_local(end).date() for _, end in ranges) + timedelta(days=1)
+    rebuild(first, last)
+
+
+def daily_counts(first, last, place=None):
+    """{place: [count per day]} for [first, last), read with one range scan plus the rule occurrences."""
+    rows = OccupancyDay.objects.filter(day__gte=first, day__lt=last)
+    if place:
+        rows = rows.filter(place=place)
+    size = (last - first).days
+    counts = defaultdict(lambda: [0] * size)
+    for day, row_place, count in rows.values_list('day', 'place', 'count').iterator():
+        counts[row_place][(day - first).days] = count
+    # rule occurrences are not materialized; expand the ones in the range
+    occurrences = recurrence.occurrences(_midnight(first), _midnight(last), place)
+    extra = sweep(((start, end, all_day, row_place) for _, _, start, end, all_day, row_place, _ in occurrences), first, last)
+    for row_place, daily in extra.items():
+        counts[row_place] = [count + added for count, added in zip(counts[row_place], daily)]
+    if place and place not in counts:
+        counts[place] = [0] * size
+    return dict(counts)
@@ -0,0 +1,89 @@
+"""Events of the same person that overlap in time: one lookup for new events, one sweep over the table."""
+import heapq
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Event
+
+
+def overlapping(name_person, start, end, exclude_id=None):
+    """Live events of name_person overlapping [start, end).
+
+    No event is longer than MAX_EVENT_DAYS, so anything overlapping starts in a bounded window
+    before `start`, and the lookup is a range scan of event_person_start_end_idx.
+    """
+    lookback = start - timedelta(days=settings.MAX_EVENT_DAYS)
+    queryset = Event.objects.filter(name_person=name_person, start__gte=lookback, start__lt=end, end__gt=start)
+    if exclude_id is not None:
+        queryset = queryset.exclude(pk=exclude_id)
+    return queryset.order_by('start')
+
+
+def sweep(rows):
+    """Yield the overlapping pairs of rows (id, name_person, start, end) sorted by name_person and start.
+
+    Each row is checked only against the events of the same person still running when it starts,
+    kept in a heap by end.
+    """
+    person = None
+    running = []
+    for event_id, name_person, start, end in rows:
+        if name_person != person:
+            person = name_person
+            running = []
+        while running and running[0][0] <= start:
+            heapq.heappop(running)
+        for _, other_start, other_id in running:
+            # an event of zero length only overlaps events it falls strictly inside
+            if end > start or other_start < start:
+                yield other_id, event_id
+        heapq.heappush(running, (end, start, event_id))
+
+
+def batch_conflicts(rows, label='row', exclude=None):
+    """{key: message} for the new events rows (key, name_person, start, end) that overlap a live event
+    of the same person, or an earlier accepted event of the batch. exclude is a Q of live events to ignore,
+    such as those the batch replaces.
+    """
+    if not rows:
+        return {}
+    first, last = min(row[2] for row in rows), max(row[3] for row in rows)
+    lookback = first - timedelta(days=settings.MAX_EVENT_DAYS)
+    existing = Event.objects.filter(name_person__in={row[1] for row in rows}, start__gte=lookback,
+                                    start__lt=last, end__gt=first)
+    if exclude is not None:
+        existing = existing.exclude(exclude)
+    combined = [(('event', event_id), *rest) for event_id, *rest in existing.values_list('id', 'name_person', 'start', 'end')]
+    combined += [((label, key), *rest) for key, *rest in rows]
+    combined.sort(key=lambda row: (row[1], row[2], row[3]))
+    pairs = list(sweep(combined))
+    conflicts = {}
+    for earlier, later in pairs:
+        if (earlier[0] == 'event') != (later[0] == 'event'):
+            new, other = (earlier, later) if later[0] == 'event' else (later, earlier)
+            conflicts.setdefault(new[1], f"Overlaps event #{other[1]} of the same person")
+    # within the batch the later event is rejected, unless the earlier one already is
+    for earlier, later in pairs:
+        if earlier[0] == later[0] == label and earlier[1] not in conflicts:
+            conflicts.setdefault(later[1], f"Overlaps {label} {earlier[1]} of the same person")
+    return conflicts
+
+
+def _rows(queryset, chunk_size):
+    # read through the cursor: the naive UTC datetimes compare the same, and skipping the
+    # ORM's per-value conversion to aware datetimes makes the pass about three times faster
+    sql, params = queryset.order_by('name_person', 'start', 'end').values_list(
+        'id', 'name_person', 'start', 'end').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(chunk_size):
+            yield from rows
+
+
+def find_conflicts(queryset=None, chunk_size=5000):
+    """Overlapping pairs of event ids among the live events, in one pass over event_person_start_end_idx."""
+    if queryset is None:
+        queryset = Event.objects.all()
+    return sweep(_rows(queryset, chunk_size))
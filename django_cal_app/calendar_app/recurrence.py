@@ -0,0 +1,109 @@
+"""Occurrences of recurrence rules, expanded only for the window a feed asks for."""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .models import RecurrenceOverride, RecurrenceRule
+
+# expansions kept per worker, keyed by (rule, rule.updated_at, window start, window end)
+CACHE_SIZE = 2000
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+# a rule without UNTIL invalidates cached windows up to here
+FAR_FUTURE = datetime(9999, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def occurrence_id(rule_id, original_start):
+    """Feed id of an occurrence, e.g. "r12-1720137600"; event ids are plain integers."""
+    return f"r{rule_id}-{int(original_start.timestamp())}"
+
+
+def parse_occurrence_id(value):
+    """(rule id, original start) from an occurrence id; raises ValueError for anything else."""
+    try:
+        rule_id, moment = value[1:].split('-') if value.startswith('r') else (None, None)
+        return int(rule_id), datetime.fromtimestamp(int(moment), tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"Invalid occurrence id: {value}")
+
+
+def rule_span(start, until):
+    """The (start, end) range a rule's occurrences can fall in, for cache invalidation."""
+    if until is None:
+        return start, FAR_FUTURE
+    return start, timezone.make_aware(datetime.combine(until, datetime.min.time())) + timedelta(days=settings.MAX_EVENT_DAYS + 1)
+
+
+def rules_for(start, end):
+    """Rules that can have occurrences in [start, end)."""
+    lookback = (start - timedelta(days=settings.MAX_EVENT_DAYS)).date()
+    return RecurrenceRule.objects.filter(Q(until__isnull=True) | Q(until__gte=lookback), start__lt=end)
+
+
+def expand(rule, start, end):
+    """Feed rows (id, name_person, start, end, all_day, place, notes) of one rule in [start, end), with overrides applied."""
+    key = (rule.pk, rule.updated_at, start, end)
+    with _lock:
+        rows = _cache.get(key)
+        if rows is not None:
+            _cache.move_to_end(key)
+            return rows
+
+    duration = rule.end - rule.start
+    occurrences = {original: (original, original + duration, rule.place, rule.notes)
+                   for original in rule.occurrence_starts(start, end)}
+    # overrides of occurrences in the window, and of occurrences moved into it (keeping their duration without an end)
+    overrides = rule.overrides.filter(Q(original_start__gt=start - duration, original_start__lt=end)
+                                      | Q(start__lt=end, end__gt=start)
+                                      | Q(start__lt=end, start__gt=start - duration, end__isnull=True))
+    for override in overrides:
+        occurrences.pop(override.original_start, None)
+        if override.cancelled:
+            continue
+        moved_start = override.start or override.original_start
+        moved_end = override.end or moved_start + duration
+        if moved_start < end and moved_end > start:
+            occurrences[override.original_start] = (moved_start, moved_end, override.place or rule.place,
+                                                    rule.notes if override.notes is None else override.notes)
+    rows = sorted(((occurrence_id(rule.pk, original), rule.name_person, occurrence_start, occurrence_end,
+                    rule.all_day, place, notes)
+                   for original, (occurrence_start, occurrence_end, place, notes) in occurrences.items()),
+                  key=lambda row: row[2])
+
+    with _lock:
+        _cache[key] = rows
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return rows
+
+
+def occurrences(start, end, place=None):
+    """Feed rows of every rule occurrence overlapping [start, end), sorted by start like window_events."""
+    rows = [row for rule in rules_for(start, end) for row in expand(rule, start, end)
+            if place is None or row[5] == place]
+    rows.sort(key=lambda row: row[2])
+    return rows
+
+
+def all_occurrences():
+    """Occurrences for ?all=1: from the first rule to a year ahead, since open-ended rules never stop."""
+    first = RecurrenceRule.objects.aggregate(first=Min('start'))['first']
+    if first is None:
+        return []
+    return occurrences(first, timezone.now() + timedelta(days=366))
+
+
+def cancel(rule_id, original_start):
+    """Cancel one occurrence; returns the rule, or raises RecurrenceRule.DoesNotExist."""
+    rule = RecurrenceRule.objects.get(pk=rule_id)
+    instant = timedelta(microseconds=1)
+    if original_start not in rule.occurrence_starts(original_start - instant, original_start + instant):
+        raise RecurrenceRule.DoesNotExist(f"Rule {rule_id} has no occurrence at {original_start}")
+    RecurrenceOverride.objects.update_or_create(rule=rule, original_start=original_start,
+                                                defaults={'cancelled': True})
+    return rule
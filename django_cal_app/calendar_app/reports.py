@@ -0,0 +1,117 @@
+"""Person-days per person, place and month, for management reports.
+
+A person counts once per day at a place, however many entries cover that day. The counts are
+read from the AvailabilityYear day bitmaps, which every write keeps up to date and which include
+archived events; rule occurrences are added by availability.bitmaps. Whole months are cached in
+PersonDaysMonth and dropped when an event in the month changes.
+"""
+import csv
+from collections import defaultdict
+from datetime import date
+from functools import reduce
+from operator import or_
+
+from django.db import DatabaseError
+from django.db.models import Q
+
+from .availability import bitmaps
+from .models import PersonDaysMonth
+from .occupancy import _local
+from .versions import current_version
+
+PERSON_HEADER = ('month', 'name_person', 'place', 'days')
+PLACE_HEADER = ('month', 'place', 'people', 'days')
+
+
+def _next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def month_spans(first, last):
+    """(month, span start, span end) for each month overlapping [first, last), the spans clipped to it."""
+    month = first.replace(day=1)
+    while month < last:
+        following = _next_month(month)
+        yield month, max(month, first), min(following, last)
+        month = following
+
+
+def count_days(first, last):
+    """[name_person, place, days] for [first, last), sorted by person and place."""
+    return sorted([name_person, place, bits.bit_count()]
+                  for (name_person, place), bits in bitmaps(first, last).items() if bits)
+
+
+def month_counts(month):
+    """count_days for a whole month, from the cache when an event of the month has not changed since."""
+    entry = PersonDaysMonth.objects.filter(month=month).first()
+    if entry is not None:
+        return entry.days
+    version = current_version()[0]
+    days = count_days(month, _next_month(month))
+    # a write since the version was read may have changed the month while it was counted
+    if current_version()[0] == version:
+        try:
+            PersonDaysMonth.objects.update_or_create(month=month, defaults={'days': days, 'version': version})
+        except DatabaseError:
+            # another worker stored the month or holds the write lock; the cache is best effort
+            pass
+    return days
+
+
+def invalidate(ranges):
+    """Drop the cached months overlapping any of the given (start, end) ranges."""
+    ranges = [(start, end) for start, end in ranges if start is not None and end is not None]
+    if not ranges:
+        return 0
+    # a timed event also counts on its end day, so the month holding that day is dropped too
+    overlap = reduce(or_, (Q(month__gte=_local(start).date().replace(day=1), month__lte=_local(end).date())
+                           for start, end in ranges))
+    deleted, _ = PersonDaysMonth.objects.filter(overlap).delete()
+    return deleted
+
+
+def clear():
+    deleted, _ = PersonDaysMonth.objects.all().delete()
+    return deleted
+
+
+def person_days(first, last, by='person'):
+    """Header and rows of person-days over [first, last), month by month, per person and place
+    (by='person') or per place with the number of people (by='place'). Only one month is held at a time."""
+    yield PLACE_HEADER if by == 'place' else PERSON_HEADER
+    for month, start, end in month_spans(first, last):
+        counts = month_counts(month) if (start, end) == (month, _next_month(month)) else count_days(start, end)
+        label = f"{month:%Y-%m}"
+        if by == 'place':
+            totals = defaultdict(lambda: [0, 0])
+            for _, place, days in counts:
+                totals[place][0] += 1
+                totals[place][1] += days
+            for place in sorted(totals):
+                yield (label, place, *totals[place])
+        else:
+            for name_person, place, days in counts:
+                yield (label, name_person, place, days)
+
+
+class _Echo:
+    """File-like object handing csv.writer's output back instead of buffering it."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    return (writer.writerow(row) for row in rows)
+
+
+def write_xlsx(rows, file, title='Person-days'):
+    """Write the rows to file as an XLSX sheet; openpyxl's write-only mode keeps them out of memory."""
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(file)
@@ -0,0 +1,120 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import availability, feed_cache, occupancy, reports
+from .models import Event, RecurrenceOverride, RecurrenceRule
+from .recurrence import rule_span
+from .versions import RECURRENCE_KEY, bump_version
+
+_state = threading.local()
+
+
+@contextmanager
+def suspended():
+    """Skip the per-event work below during bulk changes; the caller then calls bulk_changed() once."""
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def is_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+def bulk_changed(ranges, people=None):
+    """Refresh everything derived from events once after a suspended() batch touching the given (start, end) ranges,
+    and the given people's entries if known."""
+    bump_version()
+    feed_cache.invalidate(ranges)
+    reports.invalidate(ranges)
+    occupancy.rebuild_ranges(ranges)
+    availability.refresh(ranges, people=people)
+
+
+@receiver(pre_save, sender=Event)
+def remember_old_state(sender, instance, **kwargs):
+    # an edit must also invalidate the windows and days the event is moved out of
+    instance._old_state = None
+    if is_suspended():
+        return
+    if instance.pk:
+        instance._old_state = (Event.all_objects.filter(pk=instance.pk)
+                               .values('name_person', 'start', 'end', 'all_day', 'place', 'deleted_at').first())
+
+
+# Covers add_event/remove_event as well as edits made through the admin or the shell
+@receiver(post_save, sender=Event)
+def event_saved(sender, instance, **kwargs):
+    if is_suspended():
+        return
+    old = getattr(instance, '_old_state', None)
+    with transaction.atomic():
+        bump_version()
+        ranges = [(instance.start, instance.end), (old['start'], old['end']) if old else (None, None)]
+        feed_cache.invalidate(ranges)
+        reports.invalidate(ranges)
+        if old and old['deleted_at'] is None:
+            occupancy.apply(old['place'], old['start'], old['end'], old['all_day'], -1)
+        if instance.deleted_at is None:
+            occupancy.apply(instance.place, instance.start, instance.end, instance.all_day, 1)
+        availability.refresh(ranges, people={instance.name_person, old['name_person'] if old else None})
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted(sender, instance, **kwargs):
+    if is_suspended():
+        return
+    with transaction.atomic():
+        bump_version()
+        feed_cache.invalidate([(instance.start, instance.end)])
+        reports.invalidate([(instance.start, instance.end)])
+        if instance.deleted_at is None:
+            occupancy.apply(instance.place, instance.start, instance.end, instance.all_day, -1)
+        availability.refresh([(instance.start, instance.end)], people={instance.name_person})
+
+
+def rules_changed(spans):
+    bump_version()
+    bump_version(RECURRENCE_KEY)
+    feed_cache.invalidate(spans)
+    reports.invalidate(spans)
+
+
+@receiver(pre_save, sender=RecurrenceRule)
+def remember_old_rule(sender, instance, **kwargs):
+    instance._old_span = None
+    if instance.pk:
+        old = RecurrenceRule.objects.filter(pk=instance.pk).values_list('start', 'until').first()
+        instance._old_span = rule_span(*old) if old else None
+
+
+# occurrences are not stored, so there is no occupancy to update; daily_counts expands them when read
+@receiver(post_save, sender=RecurrenceRule)
+def rule_saved(sender, instance, **kwargs):
+    with transaction.atomic():
+        rules_changed([rule_span(instance.start, instance.until), getattr(instance, '_old_span', None) or (None, None)])
+
+
+@receiver(post_delete, sender=RecurrenceRule)
+def rule_deleted(sender, instance, **kwargs):
+    with transaction.atomic():
+        rules_changed([rule_span(instance.start, instance.until)])
+
+
+@receiver(post_save, sender=RecurrenceOverride)
+@receiver(post_delete, sender=RecurrenceOverride)
+def override_changed(sender, instance, **kwargs):
+    with transaction.atomic():
+        # a new updated_at retires the rule's cached expansions in every worker
+        rules = RecurrenceRule.objects.filter(pk=instance.rule_id)
+        rules.update(updated_at=timezone.now())
+        span = rules.values_list('start', 'until').first()
+        rules_changed([rule_span(*span) if span else (None, None)])
@@ -0,0 +1,264 @@
+$(document).ready(function() {
+    var calendarEl = document.getElementById('calendar');
+    if (calendarEl) {
+        // page dependent values, set by base.html
+        var config = window.calendarConfig;
+        var syncToken = null;
+        // events of the first month, embedded by calendar_view
+        var initialElement = document.getElementById('calendar-bootstrap');
+        var initialData = initialElement ? JSON.parse(initialElement.textContent) : null;
+        var calendar = new FullCalendar.Calendar(calendarEl, {
+            initialView: 'dayGridMonth',
+            headerToolbar: {
+                start: 'dayGridMonth timeGridWeek',
+                center: 'title',
+                end: 'prev today next'
+            },
+            views: {
+                dayGridMonth: {
+                    showNonCurrentDates: false,
+                    fixedWeekCount: false,
+                    locale: 'en',  // Use locale settings if necessary
+                },
+                timeGridWeek: {
+                    type: 'timeGrid',
+                    slotMinTime: '06:00:00',  // Minimum time on the axis (6 AM)
+                    slotMaxTime: '22:00:00'   // Maximum time on the axis (9 PM)
+                }
+            },
+            firstDay: 1,  // Monday as the first day of the week
+            selectable: true,
+            editable: true,
+            events: function(info, successCallback, failureCallback) {
+                var initial = initialData;
+                initialData = null;
+                if (initial && info.start >= new Date(initial.start) && info.end <= new Date(initial.end)) {
+                    syncToken = initial.token;
+                    successCallback(initial.events);
+                    return;
+                }
+                $.ajax({
+                    url: '/all_events/',
+                    method: 'GET',
+                    data: {start: info.startStr, end: info.endStr},
+                    dataType: 'json',
+                    success: function(data, status, xhr) {
+                        syncToken = xhr.getResponseHeader('X-Sync-Token') || syncToken;
+                        successCallback(data);
+                    },
+                    error: failureCallback
+                });
+            },
+            displayEventTime: false,
+            eventDataTransform: keepWallTimes,
+            eventClick: function(info) {
+                // the feed row has everything the modal shows
+                if ('wallStart' in info.event.extendedProps) {
+                    showDetails(info.event.id, feedDetails(info.event));
+                    return;
+                }
+                // Fetch event details and show the details modal
+                $.ajax({
+                    url: '/event/' + info.event.id + '/',
+                    method: 'GET',
+                    success: function(data) {
+                        showDetails(info.event.id, data);
+                    }
+                });
+            },
+            eventRender: function(info) {
+                info.el.style.backgroundColor = info.event.extendedProps.color;
+            }
+        });
+        calendar.render();
+
+        // FullCalendar turns start/end into the browser's time zone; the modal shows the server's wall times
+        function keepWallTimes(eventData) {
+            eventData.wallStart = eventData.start;
+            eventData.wallEnd = eventData.end;
+            return eventData;
+        }
+
+        // the fields /event/<id>/ returns, formatted the same way
+        function feedDetails(event) {
+            var format = event.allDay ? 'YYYY-MM-DD' : 'YYYY-MM-DD HH:mm';
+            return {
+                title: event.extendedProps.name_person,
+                start: moment.parseZone(event.extendedProps.wallStart).format(format),
+                end: moment.parseZone(event.extendedProps.wallEnd).format(format),
+                place: event.extendedProps.place,
+                notes: event.extendedProps.notes,
+                all_day: event.allDay
+            };
+        }
+
+        function showDetails(eventId, data) {
+            var startDate = moment(data.start).format('DD-MM-YYYY HH:mm');
+            var endDate = moment(data.end).format('DD-MM-YYYY HH:mm');
+            if (data.all_day) {
+                var adjustedEndDate = moment(data.end).subtract(1, 'days').format('DD-MM-YYYY');
+                var adjustedStartDate = moment(data.start).format('DD-MM-YYYY');
+                $('#event-end').text(adjustedEndDate);
+                $('#event-start').text(adjustedStartDate);
+            } else {
+                $('#event-end').text(endDate);
+                $('#event-start').text(startDate);
+            }
+            $('#event-name-person').text(data.title.split(' - ')[0]);
+            $('#event-place').text(data.place);
+            $('#event-notes').text(data.notes);
+            $('#edit-event-id').val(eventId);
+
+            if (config.authenticated) {
+                $('#edit-event-btn').show();
+                $('#delete-event-btn').show();
+            } else {
+                $('#edit-event-btn').hide();
+                $('#delete-event-btn').hide();
+            }
+
+            $('#eventDetailsModal').modal('show');
+        }
+
+        // Apply only what changed since the last fetch instead of reloading the whole feed
+        function syncChanges() {
+            var source = calendar.getEventSources()[0];
+            if (!syncToken || !source) {
+                calendar.refetchEvents();
+                return;
+            }
+            $.ajax({
+                url: '/events/changes/',
+                method: 'GET',
+                data: {
+                    since: syncToken,
+                    start: calendar.view.activeStart.toISOString(),
+                    end: calendar.view.activeEnd.toISOString()
+                },
+                dataType: 'json',
+                success: function(data) {
+                    if (data.refetch) {
+                        // a recurring entry changed
+                        syncToken = null;
+                        calendar.refetchEvents();
+                        return;
+                    }
+                    data.deleted.forEach(function(id) {
+                        var event = calendar.getEventById(id);
+                        if (event) { event.remove(); }
+                    });
+                    data.events.forEach(function(eventData) {
+                        var event = calendar.getEventById(eventData.id);
+                        if (event) { event.remove(); }
+                        calendar.addEvent(keepWallTimes(eventData), source);
+                    });
+                    syncToken = data.token;
+                },
+                error: function() {
+                    // expired token (410) or network error: fall back to a full fetch
+                    syncToken = null;
+                    calendar.refetchEvents();
+                }
+            });
+        }
+
+        function showMessage(status, text) {
+            var alert = $('<div class="alert alert-dismissible fade show" role="alert"></div>')
+                .addClass(status === 'success' ? 'alert-success' : 'alert-danger')
+                .text(text)
+                .append('<button type="button" class="btn-close" data-bs-dismiss="alert" aria-label="Close"></button>');
+            $('.container').first().prepend(alert);
+            setTimeout(function() { alert.remove(); }, 5000);
+        }
+
+        // Changes made by other people arrive as Server-Sent Events
+        if (config.liveUpdates && window.EventSource) {
+            var changeStream = new EventSource(config.urls.eventStream);
+            changeStream.addEventListener('change', function() {
+                syncChanges();
+            });
+        }
+
+        var eventIdToDelete;
+
+        $('#delete-event-btn').on('click', function() {
+            eventIdToDelete = $('#edit-event-id').val();
+            $('#confirmDeleteModal').modal('show');
+        });
+
+        $('#confirmDeleteButton').on('click', function() {
+            $.ajax({
+                type: 'POST',
+                url: '/remove_event/',
+                data: {
+                    id: eventIdToDelete,
+                    csrfmiddlewaretoken: config.csrfToken
+                },
+                dataType: "json",
+                success: function(response) {
+                    $('#eventDetailsModal').modal('hide');
+                    $('#confirmDeleteModal').modal('hide');
+                    showMessage(response.status, response.message);
+                    syncChanges();
+                },
+                error: function(response) {
+                    console.log(response);
+                    location.reload();
+                }
+            });
+        });
+
+        $('#addEventModal').on('hidden.bs.modal', function () {
+            $('#addEventForm').trigger('reset');
+            $('#time_fields input').removeAttr('required');
+        });
+
+        $('#full_day').change(function() {
+            if (this.checked) {
+                $('#time_fields').hide();
+                $('#time_fields input').removeAttr('required');
+            } else {
+                $('#time_fields').show();
+                $('#end_date').attr('required', 'required');
+                $('#start_time').attr('required', 'required');
+                $('#end_time').attr('required', 'required');
+            }
+        });
+
+        $('#addEventForm').on('submit', function(e) {
+            e.preventDefault();
+            $.ajax({
+                type: 'POST',
+                url: config.urls.addEvent,
+                data: $(this).serialize(),
+                dataType: "json",
+                success: function (data) {
+                    $('#addEventModal').modal('hide');
+                    showMessage(data.status, data.message);
+                    syncChanges();
+                },
+                error: function(data) {
+                    console.log(data);
+                    location.reload();
+                }
+            });
+        });
+    }
+});
+
+// Function to remove all messages after a certain duration
+function removeMessages() {
+    var messages = document.querySelectorAll('.alert'); // Target all elements with the class .alert
+    // Loop through each message element
+    messages.forEach(function(message) {
+        // Set timeout to remove the message after 5 seconds
+        setTimeout(function() {
+            message.remove();
+        }, 5000); // 5000 milliseconds = 5 seconds
+    });
+}
+
+// Call the function when the page is ready
+document.addEventListener('DOMContentLoaded', function() {
+    removeMessages(); // Remove messages when the page is loaded
+});
@@ -0,0 +1,62 @@
+import random
+from datetime import date, datetime, time, timedelta
+
+from django.utils import timezone
+
+from .models import Event
+
+PLACES = ['Calp', 'ORM', 'Remote', 'Mirca']
+
+
+def _aware(day, at=time.min):
+    return timezone.make_aware(datetime.combine(day, at))
+
+
+def synthetic_events(people, years, start_year=None, seed=0):
+    """Yield unsaved Events resembling real rosters: ORM shift blocks, Remote days,
+    timed office days in Calp and occasional Mirca visits, for every person and year."""
+    rng = random.Random(seed)
+    start_year = start_year or date.today().year - years + 1
+    for person in range(people):
+        name_person = f"Person {person + 1:03d}"
+        for year in range(start_year, start_year + years):
+            day = date(year, 1, 1) + timedelta(days=rng.randint(0, 20))
+            while day.year == year:
+                roll = rng.random()
+                if roll < 0.35:
+                    # observation shift: a block of nights on site
+                    length = rng.randint(3, 12)
+                    yield Event(name_person=name_person, place='ORM', all_day=True,
+                                start=_aware(day), end=_aware(day + timedelta(days=length)))
+                elif roll < 0.6:
+                    length = rng.randint(1, 5)
+                    yield Event(name_person=name_person, place='Remote', all_day=True,
+                                start=_aware(day), end=_aware(day + timedelta(days=length)),
+                                notes=rng.choice([None, '', 'Shifter support']))
+                elif roll < 0.9:
+                    length = 1
+                    yield Event(name_person=name_person, place='Calp', all_day=False,
+                                start=_aware(day, time(rng.randint(8, 10), rng.choice([0, 30]))),
+                                end=_aware(day, time(rng.randint(16, 19), rng.choice([0, 30]))))
+                else:
+                    length = rng.randint(2, 7)
+                    yield Event(name_person=name_person, place='Mirca', all_day=True,
+                                start=_aware(day), end=_aware(day + timedelta(days=length)),
+                                notes='Visit')
+                day += timedelta(days=length + rng.randint(1, 14))
+
+
+def generate(people, years, start_year=None, seed=0, batch_size=2000):
+    """Insert synthetic events in batches and return how many were created."""
+    created = 0
+    batch = []
+    for event in synthetic_events(people, years, start_year, seed):
+        batch.append(event)
+        if len(batch) >= batch_size:
+            Event.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        Event.objects.bulk_create(batch)
+        created += len(batch)
+    return created
@@ -1,3 +1,1127 @@
-from django.test import TestCase
+import io
+import json
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import closing
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.http import Http404, JsonResponse
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import archive, async_views, availability, feed_cache, live, occupancy, recurrence, views
+from .feed import FEED_FIELDS, color_map, parse_sync_token, sync_token
+from .admin import LimitedCountPaginator
+from .importer import import_events, row_to_form_data
+from .log_handlers import MultiprocessTimedRotatingFileHandler, QueuedRotatingFileHandler
+from .mongo_sync import sync_collection
+from .management.commands.benchmark import ENDPOINTS
+from .models import (ArchivedEvent, AuditEntry, AvailabilityYear, Event, FeedCacheEntry, OccupancyDay, PersonDaysMonth,
+                     RecurrenceOverride, RecurrenceRule, SyncCheckpoint)
+from .overlaps import find_conflicts
+from .synthetic import PLACES, generate
+from .transactions import atomic_with_retry
+from .versions import bump_version, current_version
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=dt_timezone.utc)
+
+
+def make_event(name_person='Ana', start=None, end=None, place='ORM', all_day=False, notes=None):
+    start = start or utc(2024, 7, 1, 9)
+    end = end or utc(2024, 7, 1, 17)
+    return Event.objects.create(name_person=name_person, start=start, end=end, place=place, all_day=all_day, notes=notes)
+
+
+def body(response):
+    return b''.join(response.streaming_content) if response.streaming else response.content
+
+
+def json_response_feed(events):
+    """The body all_events returned before the feed was streamed: a JsonResponse of event dicts."""
+    return JsonResponse([{
+        'id': event.id,
+        'title': f"{event.name_person} - {event.place}",
+        'name_person': event.name_person,
+        'start': event.start.isoformat(),
+        'end': event.end.isoformat(),
+        'allDay': event.all_day,
+        'place': event.place,
+        'notes': event.notes,
+        'color': color_map.get(event.place, '#000000'),
+    } for event in events], safe=False).content
+
+
+class FeedTests(TestCase):
+    window = {'start': '2024-07-01', 'end': '2024-08-01'}
+
+    def setUp(self):
+        self.user = User.objects.create_user('editor', password='secret')
+
+    def test_window_is_byte_identical_to_json_response(self):
+        make_event('Ana "quoted"', notes='é\t"</script>')
+        make_event('Jürgen', utc(2024, 7, 2), utc(2024, 7, 4), place='Calp', all_day=True, notes='')
+        make_event('李', utc(2024, 7, 3, 8, 30, 15, 250), utc(2024, 7, 3, 9), place='Elsewhere')
+        make_event('Outside', utc(2024, 9, 1), utc(2024, 9, 2))
+        expected = json_response_feed(Event.objects.filter(start__lt=utc(2024, 8, 1)).order_by('start', 'id'))
+
+        first = self.client.get('/all_events/', self.window)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(body(first), expected)
+        # the second request is answered from the feed cache
+        cached = self.client.get('/all_events/', self.window)
+        self.assertFalse(cached.streaming)
+        self.assertEqual(cached.content, expected)
+
+    def test_empty_window(self):
+        self.assertEqual(body(self.client.get('/all_events/', self.window)), json_response_feed([]))
+
+    def test_unchanged_window_is_not_modified(self):
+        make_event()
+        response = self.client.get('/all_events/', self.window)
+        body(response)
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/all_events/', self.window, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # a write changes the version the ETag is built from
+        make_event('Bea')
+        changed = self.client.get('/all_events/', self.window, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_etag_differs_per_window(self):
+        first = self.client.get('/all_events/', self.window)
+        other = self.client.get('/all_events/', {'start': '2024-08-01', 'end': '2024-09-01'})
+        self.assertNotEqual(first['ETag'], other['ETag'])
+
+    def test_invalid_window(self):
+        response = self.client.get('/all_events/', {'start': '2024-08-01', 'end': '2024-07-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['status'], 'error')
+
+    def cache_window(self):
+        body(self.client.get('/all_events/', self.window))
+        body(self.client.get('/all_events/', {'start': '2025-01-01', 'end': '2025-02-01'}))
+        self.assertEqual(FeedCacheEntry.objects.count(), 2)
+
+    def assertOnlyOtherWindowCached(self):
+        self.assertQuerySetEqual(FeedCacheEntry.objects.values_list('window_start', flat=True), [utc(2025, 1, 1)])
+
+    def test_add_invalidates_overlapping_window(self):
+        self.cache_window()
+        self.client.force_login(self.user)
+        response = self.client.post('/add_event/', {'name_person': 'Bea', 'full_day': 'on', 'place': 'ORM',
+                                                    'start_date': '2024-07-10', 'end_date': '2024-07-11'})
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertOnlyOtherWindowCached()
+        self.assertIn(b'"Bea"', body(self.client.get('/all_events/', self.window)))
+
+    def test_remove_invalidates_overlapping_window(self):
+        event = make_event()
+        self.cache_window()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post('/remove_event/', {'id': event.id}).json()['status'], 'success')
+        self.assertOnlyOtherWindowCached()
+        self.assertEqual(body(self.client.get('/all_events/', self.window)), b'[]')
+
+    def test_admin_edit_invalidates_old_and_new_window(self):
+        event = make_event()
+        self.cache_window()
+        admin = User.objects.create_superuser('admin', password='secret')
+        self.client.force_login(admin)
+        response = self.client.post(f'/admin/calendar_app/event/{event.id}/change/', {
+            'name_person': 'Ana', 'place': 'Calp', 'notes': '',
+            'start_0': '2025-01-05', 'start_1': '09:00:00', 'end_0': '2025-01-05', 'end_1': '17:00:00',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(FeedCacheEntry.objects.count(), 0)
+        self.assertEqual(body(self.client.get('/all_events/', self.window)), b'[]')
+
+    def test_calendar_page_embeds_the_first_window(self):
+        today = timezone.localdate()
+        event = make_event('Ana', timezone.make_aware(datetime(today.year, today.month, 1, 9)),
+                           timezone.make_aware(datetime(today.year, today.month, 1, 17)), notes='</script><b>&amp;')
+        storages = {**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+        with self.settings(STORAGES=storages):
+            page = self.client.get('/').content.decode()
+        opening = '<script type="application/json" id="calendar-bootstrap">'
+        embedded = page[page.index(opening) + len(opening):]
+        embedded = embedded[:embedded.index('</script>')]
+        bootstrap = json.loads(embedded)
+        self.assertEqual([row['id'] for row in bootstrap['events']], [event.id])
+        self.assertEqual(bootstrap['events'][0]['notes'], '</script><b>&amp;')
+        # the same rows the feed returns for that window, and a token for the first change sync
+        response = self.client.get('/all_events/', {'start': bootstrap['start'], 'end': bootstrap['end']})
+        self.assertEqual(bootstrap['events'], json.loads(body(response)))
+        self.assertLess(timezone.now() - parse_sync_token(bootstrap['token']), timedelta(minutes=1))
+
+
+class AsyncViewTests(TestCase):
+    window = {'start': '2024-07-01', 'end': '2024-08-01'}
+
+    def setUp(self):
+        feed_cache.clear()
+        make_event('Ana', notes='with "quotes" and ünïcode')
+        make_event('Bea', utc(2024, 7, 3), utc(2024, 7, 5), place='Calp', all_day=True)
+
+    def sync_get(self, view, path, *args, **params):
+        request = RequestFactory().get(path, params)
+        request.user = AnonymousUser()
+        response = view(request, *args)
+        return response, body(response)
+
+    def async_get(self, view, path, *args, headers=None, **params):
+        async def get():
+            request = AsyncRequestFactory().get(path, params, headers=headers)
+            request.user = AnonymousUser()
+            response = await view(request, *args)
+            if not response.streaming:
+                return response, response.content
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+        return async_to_sync(get)()
+
+    def test_feed_matches_the_sync_view(self):
+        expected, expected_body = self.sync_get(views.all_events, '/all_events/', **self.window)
+        self.assertEqual(len(json.loads(expected_body)), 2)
+        feed_cache.clear()
+        response, content = self.async_get(async_views.all_events, '/all_events/', **self.window)
+        self.assertEqual(content, expected_body)
+        self.assertEqual(response['ETag'], expected['ETag'])
+        # the async view stored the window; the cached copy and a revalidation agree too
+        self.assertEqual(self.async_get(async_views.all_events, '/all_events/', **self.window)[1], expected_body)
+        response, _ = self.async_get(async_views.all_events, '/all_events/', headers={'If-None-Match': expected['ETag']},
+                                     **self.window)
+        self.assertEqual(response.status_code, 304)
+
+    def test_details_match_the_sync_view(self):
+        event = Event.objects.get(name_person='Ana')
+        expected, expected_body = self.sync_get(views.event_details, f'/event/{event.id}/', event.id)
+        response, content = self.async_get(async_views.event_details, f'/event/{event.id}/', event.id)
+        self.assertEqual((content, response['ETag']), (expected_body, expected['ETag']))
+        with self.assertRaises(Http404):
+            self.async_get(async_views.event_details, '/event/0/', 0)
+
+
+class BenchmarkTests(TestCase):
+    def test_synthetic_schedules(self):
+        created = generate(3, 1, start_year=2024)
+        self.assertEqual(Event.objects.count(), created)
+        self.assertEqual(set(Event.objects.values_list('name_person', flat=True)),
+                         {'Person 001', 'Person 002', 'Person 003'})
+        self.assertLessEqual(set(Event.objects.values_list('place', flat=True)), set(PLACES))
+        self.assertEqual(list(find_conflicts()), [])
+
+    def test_benchmark_command_runs_on_a_small_fixture(self):
+        # a process of its own, as the command creates and destroys its own test database
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            subprocess.run([sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'benchmark', '--sizes', '2',
+                            '--years', '1', '--requests', '4', '--processes', '2', '--output', output],
+                           check=True, capture_output=True, cwd=settings.BASE_DIR)
+            with open(output) as f:
+                report = json.load(f)
+        result, = report['results']
+        self.assertEqual(result['people'], 2)
+        self.assertEqual(set(result['endpoints']), set(ENDPOINTS))
+        for name, stats in result['endpoints'].items():
+            with self.subTest(endpoint=name):
+                self.assertEqual(stats['sequential']['requests'], 4)
+                self.assertEqual(stats['sequential']['errors'], 0)
+                self.assertEqual(stats['concurrent']['errors'], 0)
+                self.assertLessEqual(stats['sequential']['p50_ms'], stats['sequential']['p99_ms'])
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('editor', password='secret'))
+
+    def upload(self, name, content, **data):
+        return self.client.post('/import_events/', {'file': SimpleUploadedFile(name, content.encode()), **data}).json()
+
+    def test_invalid_rows_are_reported_and_valid_ones_imported(self):
+        result = self.upload('schedule.csv', (
+            'name_person,start,end,place,notes\n'
+            'Ana,2024-07-01,2024-07-02,ORM,\n'
+            'Bea,not a date,,ORM,\n'
+            'Carl,2024-07-01 09:00,2024-07-01 17:00,,missing place\n'
+            'Dan,2024-07-05 10:00,2024-07-05 09:00,Calp,ends before it starts\n'
+            'Eve,2024-07-01 09:00,2024-07-01 17:00,Calp,\n'
+        ))
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['created'], 2)
+        self.assertEqual([error['row'] for error in result['errors']], [3, 4, 5])
+        self.assertQuerySetEqual(Event.objects.order_by('name_person').values_list('name_person', flat=True),
+                                 ['Ana', 'Eve'])
+        # all-day rows have an inclusive end date, stored exclusive as add_event does
+        self.assertEqual(Event.objects.get(name_person='Ana').end, utc(2024, 7, 3))
+
+    def test_dry_run_validates_without_saving(self):
+        result = self.upload('schedule.csv', 'name_person,start,end,place\nAna,2024-07-01,,ORM\nBea,2024-13-01,,ORM\n',
+                             dry_run='on')
+        self.assertEqual((result['created'], [error['row'] for error in result['errors']]), (1, [3]))
+        self.assertFalse(Event.objects.exists())
+
+    def test_ics_events_are_numbered_in_errors(self):
+        result = self.upload('schedule.ics', (
+            'BEGIN:VCALENDAR\r\n'
+            'BEGIN:VEVENT\r\nSUMMARY:Ana - ORM\r\nDTSTART;VALUE=DATE:20240701\r\nDTEND;VALUE=DATE:20240703\r\nEND:VEVENT\r\n'
+            'BEGIN:VEVENT\r\nSUMMARY:Bea\r\nLOCATION:Calp\r\nEND:VEVENT\r\n'
+            'END:VCALENDAR\r\n'
+        ))
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([error['row'] for error in result['errors']], [2])
+        event = Event.objects.get()
+        self.assertEqual((event.name_person, event.place, event.all_day, event.end), ('Ana', 'ORM', True, utc(2024, 7, 3)))
+
+    def test_overlapping_rows_are_rejected(self):
+        existing = make_event('Ana', utc(2024, 7, 1, 9), utc(2024, 7, 1, 17))
+        result = self.upload('schedule.csv', (
+            'name_person,start,end,place\n'
+            'Ana,2024-07-01 12:00,2024-07-01 18:00,ORM\n'
+            'Bea,2024-07-02 09:00,2024-07-02 17:00,Calp\n'
+            'Bea,2024-07-02 16:00,2024-07-02 20:00,ORM\n'
+            'Ana,2024-07-01 17:00,2024-07-01 19:00,Calp\n'
+        ))
+        self.assertEqual(result['created'], 2)
+        self.assertEqual(result['errors'], [
+            {'row': 2, 'message': f'Overlaps event #{existing.id} of the same person'},
+            {'row': 4, 'message': 'Overlaps row 3 of the same person'},
+        ])
+        self.assertQuerySetEqual(Event.objects.order_by('start').values_list('name_person', 'start'),
+                                 [('Ana', utc(2024, 7, 1, 9)), ('Ana', utc(2024, 7, 1, 17)), ('Bea', utc(2024, 7, 2, 9))])
+
+    def test_import_is_audited_once_per_batch(self):
+        self.upload('schedule.csv', 'name_person,start,end,place\nAna,2024-07-01,,ORM\nBea,2024-07-03,,Calp\n')
+        entry = AuditEntry.objects.get()
+        ids = list(Event.objects.order_by('id').values_list('id', flat=True))
+        self.assertEqual((entry.action, entry.actor, entry.event_id), ('imported', 'editor', None))
+        self.assertEqual(entry.details, {'source': 'schedule.csv', 'events': 2, 'first_id': ids[0], 'last_id': ids[1],
+                                         'start': '2024-07-01T00:00:00Z', 'end': '2024-07-04T00:00:00Z'})
+
+    def test_interrupted_import_refreshes_the_committed_batches(self):
+        def rows():
+            yield 2, row_to_form_data({'name_person': 'Ana', 'start': '2024-07-01', 'place': 'ORM'})
+            raise OSError('connection reset')
+
+        with self.assertRaises(OSError):
+            import_events(rows(), batch_size=1)
+        self.assertTrue(Event.objects.filter(name_person='Ana').exists())
+        self.assertTrue(OccupancyDay.objects.filter(day=date(2024, 7, 1), place='ORM').exists())
+
+
+class FakeCollection:
+    """The part of a pymongo collection sync_collection uses: find() with $gt/$gte filters, sorted by _id."""
+
+    def __init__(self, documents, fail_after=None):
+        self.documents = documents
+        self.fail_after = fail_after  # documents returned before the cursor drops
+
+    def find(self, query, sort=None, batch_size=None):
+        def matches(document):
+            return all(document.get(key) is not None and
+                       (document[key] > value['$gt'] if '$gt' in value else document[key] >= value['$gte'])
+                       for key, value in query.items())
+
+        for number, document in enumerate(sorted(filter(matches, self.documents), key=lambda d: d['_id'])):
+            if number == self.fail_after:
+                raise OSError('cursor lost')
+            yield dict(document)
+
+
+class MongoSyncTests(TestCase):
+    def setUp(self):
+        self.changed = timezone.now() - timedelta(days=1)
+        self.documents = [{'_id': f'd{day:02}', 'title': f'Person {day} - ORM', 'start': datetime(2024, 7, day, 9),
+                           'end': datetime(2024, 7, day, 17), 'updated': self.changed} for day in range(1, 6)]
+        self.collection = FakeCollection(self.documents)
+
+    def events(self):
+        return list(Event.objects.order_by('legacy_id').values_list('legacy_id', 'name_person', 'place', 'start'))
+
+    def test_rerun_upserts_without_duplicates(self):
+        self.assertEqual(sync_collection(self.collection, 'mongo:test', batch_size=2).synced, 5)
+        events = self.events()
+        self.assertEqual(events[0], ('d01', 'Person 1', 'ORM', utc(2024, 7, 1, 9)))
+        self.assertEqual(sync_collection(self.collection, 'mongo:test', batch_size=2).synced, 0)
+        result = sync_collection(self.collection, 'mongo:test', batch_size=2, full=True)
+        self.assertEqual((result.synced, result.batches), (5, 3))
+        self.assertEqual(self.events(), events)
+
+    def test_resumes_after_the_last_committed_batch(self):
+        with self.assertRaises(OSError):
+            sync_collection(FakeCollection(self.documents, fail_after=3), 'mongo:test', batch_size=2)
+        self.assertEqual([event[0] for event in self.events()], ['d01', 'd02'])
+        self.assertEqual(SyncCheckpoint.objects.get(name='mongo:test').last_id, 'd02')
+        # the committed batch is already in the derived tables
+        self.assertTrue(OccupancyDay.objects.filter(day=date(2024, 7, 2), place='ORM').exists())
+        result = sync_collection(self.collection, 'mongo:test', batch_size=2)
+        self.assertEqual((result.synced, result.last_id), (3, 'd05'))
+        self.assertEqual(len(self.events()), 5)
+
+    def test_since_field_picks_up_only_changed_documents(self):
+        collection = self.collection
+
+        class MongoClient:
+            def __init__(self, host, port):
+                pass
+
+            def __getitem__(self, name):
+                return {'availability': collection}
+
+            def close(self):
+                pass
+
+        options = {'db': 'calendar', 'collection': 'availability', 'since_field': 'updated', 'stdout': io.StringIO()}
+        with patch.dict(sys.modules, {'pymongo': SimpleNamespace(MongoClient=MongoClient)}):
+            call_command('sync_mongo', **options)
+            self.documents[2].update(place='Calp', updated=timezone.now() + timedelta(minutes=1))
+            call_command('sync_mongo', **options)
+        self.assertIn('Synced 1 events in 1 batches', options['stdout'].getvalue().splitlines()[-1])
+        self.assertEqual(Event.objects.get(legacy_id='d03').place, 'Calp')
+
+    def test_archived_documents_are_not_copied_back(self):
+        ArchivedEvent.objects.create(id=1, name_person='Person 1', start=utc(2024, 7, 1, 9), end=utc(2024, 7, 1, 17),
+                                     place='ORM', updated_at=timezone.now(), legacy_id='d01')
+        self.assertEqual(sync_collection(self.collection, 'mongo:test').synced, 4)
+        self.assertFalse(Event.objects.filter(legacy_id='d01').exists())
+
+    def test_overlapping_documents_are_rejected(self):
+        existing = make_event('Person 2', utc(2024, 7, 2, 12), utc(2024, 7, 2, 20), place='Calp')
+        result = sync_collection(self.collection, 'mongo:test')
+        self.assertEqual((result.synced, result.rejected), (4, 1))
+        self.assertEqual(result.errors, [('d02', f'Overlaps event #{existing.id} of the same person')])
+        # rerunning replaces the copied events rather than clashing with them
+        result = sync_collection(self.collection, 'mongo:test', full=True)
+        self.assertEqual((result.synced, result.rejected), (4, 1))
+
+
+class DeltaSyncTests(TestCase):
+    window = {'start': '2024-07-01', 'end': '2024-08-01'}
+
+    def setUp(self):
+        self.user = User.objects.create_user('editor', password='secret')
+        self.kept = make_event('Ana')
+        self.removed = make_event('Bea')
+        # older than the overlap re-sent before a token
+        Event.all_objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        self.token = self.client.get('/all_events/', self.window)['X-Sync-Token']
+        self.client.force_login(self.user)
+
+    def changes(self, **params):
+        response = self.client.get('/events/changes/', {'since': self.token, **params})
+        return response.status_code, json.loads(body(response)) if response.status_code == 200 else response.json()
+
+    def test_remove_keeps_a_tombstone(self):
+        self.client.post('/remove_event/', {'id': self.removed.id})
+        tombstone = Event.all_objects.get(id=self.removed.id)
+        self.assertIsNotNone(tombstone.deleted_at)
+        self.assertEqual(tombstone.deleted_by, self.user)
+        self.assertFalse(Event.objects.filter(id=self.removed.id).exists())
+        self.assertEqual(self.client.get(f'/event/{self.removed.id}/').status_code, 404)
+        self.assertNotIn(b'"Bea"', body(self.client.get('/all_events/', self.window)))
+
+    def test_changes_since_token(self):
+        self.client.post('/remove_event/', {'id': self.removed.id})
+        self.client.post('/add_event/', {'name_person': 'Carl', 'full_day': 'on', 'place': 'Calp',
+                                         'start_date': '2024-07-10', 'end_date': '2024-07-10'})
+        status, data = self.changes()
+        self.assertEqual(status, 200)
+        self.assertEqual(data['deleted'], [self.removed.id])
+        self.assertEqual([event['name_person'] for event in data['events']], ['Carl'])
+        self.assertNotIn('refetch', data)
+        # the next token starts after these changes
+        self.token = data['token']
+        Event.all_objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.changes()[1]['events'], [])
+
+    def test_changes_limited_to_window(self):
+        make_event('Dan', utc(2024, 9, 1, 9), utc(2024, 9, 1, 17))
+        self.assertEqual(self.changes(**self.window)[1]['events'], [])
+        self.assertEqual(len(self.changes()[1]['events']), 1)
+
+    def test_without_token(self):
+        data = self.client.get('/events/changes/').json()
+        self.assertEqual((data['events'], data['deleted']), ([], []))
+        self.assertTrue(data['token'])
+
+    def test_expired_and_invalid_tokens(self):
+        self.token = sync_token(timezone.now() - timedelta(days=31))
+        self.assertEqual(self.changes()[0], 410)
+        self.token = 'yesterday'
+        self.assertEqual(self.changes()[0], 400)
+
+    def test_event_moved_out_of_the_window_is_reported_as_deleted(self):
+        # as an edit in the admin does
+        self.kept.start, self.kept.end = utc(2024, 9, 2, 9), utc(2024, 9, 2, 17)
+        self.kept.save()
+        data = self.changes(**self.window)[1]
+        self.assertEqual((data['events'], data['deleted']), ([], [self.kept.id]))
+        # the window it moved into gets it as a change
+        data = self.changes(start='2024-09-01', end='2024-10-01')[1]
+        self.assertEqual(([event['id'] for event in data['events']], data['deleted']), ([self.kept.id], []))
+
+    def test_purge_keeps_tombstones_for_the_retention(self):
+        self.client.post('/remove_event/', {'id': self.removed.id})
+        Event.all_objects.filter(id=self.removed.id).update(deleted_at=timezone.now() - timedelta(days=5))
+        with self.settings(TOMBSTONE_RETENTION_DAYS=7):
+            call_command('purge_tombstones', stdout=io.StringIO())
+            self.assertTrue(Event.all_objects.filter(id=self.removed.id).exists())
+        with self.settings(TOMBSTONE_RETENTION_DAYS=3):
+            call_command('purge_tombstones', stdout=io.StringIO())
+            self.assertFalse(Event.all_objects.filter(id=self.removed.id).exists())
+
+    def test_purge_tombstones(self):
+        self.client.post('/remove_event/', {'id': self.removed.id})
+        call_command('purge_tombstones', stdout=io.StringIO())
+        self.assertTrue(Event.all_objects.filter(id=self.removed.id).exists())
+        Event.all_objects.filter(id=self.removed.id).update(deleted_at=timezone.now() - timedelta(days=31))
+        call_command('purge_tombstones', stdout=io.StringIO())
+        self.assertQuerySetEqual(Event.all_objects.values_list('id', flat=True), [self.kept.id])
+
+
+class LiveUpdateTests(TestCase):
+    def test_wsgi_mode_tells_the_browser_not_to_reconnect(self):
+        with self.settings(LIVE_UPDATES=False):
+            self.assertEqual(self.client.get('/events/stream/').status_code, 204)
+
+    async def test_stream_announces_changes(self):
+        with patch.object(live, 'broadcaster', live.ChangeBroadcaster(0.01)), self.settings(LIVE_UPDATES_HEARTBEAT=0.05):
+            stream = live.change_stream()
+            self.assertEqual(await anext(stream), 'retry: 5000\n\n')
+            self.assertEqual(await anext(stream), ': keep-alive\n\n')
+            await sync_to_async(bump_version)()
+            version = await sync_to_async(current_version)()
+            self.assertEqual(await anext(stream), f'id: {version[0]}\nevent: change\ndata: {{"version": {version[0]}}}\n\n')
+            # a reconnecting browser that missed a change is told at once
+            missed = live.change_stream(last_seen=str(version[0] - 1))
+            await anext(missed)
+            self.assertIn(f'id: {version[0]}\n', await anext(missed))
+            await stream.aclose()
+            await missed.aclose()
+            self.assertEqual(live.broadcaster.listeners, 0)
+
+
+class OccupancyTests(TestCase):
+    first, last = date(2024, 7, 1), date(2024, 7, 6)
+
+    def setUp(self):
+        self.all_day = make_event('Ana', utc(2024, 7, 1), utc(2024, 7, 3), all_day=True)
+        self.timed = make_event('Bea', utc(2024, 7, 2, 9), utc(2024, 7, 2, 17))
+        # a timed event ending at midnight does not count on its end day
+        make_event('Carl', utc(2024, 7, 3, 22), utc(2024, 7, 5))
+        make_event('Dan', utc(2024, 7, 4, 10), utc(2024, 7, 4, 11), place='Calp')
+
+    def stored(self):
+        return sorted(OccupancyDay.objects.values_list('day', 'place', 'count'))
+
+    def test_counts_kept_up_to_date_on_write(self):
+        self.assertEqual(occupancy.daily_counts(self.first, self.last),
+                         {'ORM': [1, 2, 1, 1, 0], 'Calp': [0, 0, 0, 1, 0]})
+        self.timed.place = 'Calp'
+        self.timed.save()
+        self.client.force_login(User.objects.create_user('editor', password='secret'))
+        self.client.post('/remove_event/', {'id': self.all_day.id})
+        self.assertEqual(occupancy.daily_counts(self.first, self.last),
+                         {'ORM': [0, 0, 1, 1, 0], 'Calp': [0, 1, 0, 1, 0]})
+
+    def test_rebuild_matches_incremental_counts(self):
+        self.timed.delete()
+        incremental = self.stored()
+        occupancy.rebuild()
+        self.assertEqual(self.stored(), incremental)
+        OccupancyDay.objects.all().delete()
+        occupancy.rebuild(self.first, self.last)
+        self.assertEqual(self.stored(), incremental)
+
+    def test_endpoint(self):
+        response = self.client.get('/occupancy/', {'start': '2024-07-01', 'end': '2024-07-06', 'place': 'Calp'})
+        self.assertEqual(response.json(), {'start': '2024-07-01', 'end': '2024-07-06', 'counts': {'Calp': [0, 0, 0, 1, 0]}})
+        response = self.client.get('/occupancy/', {'start': '2024-01-01', 'end': '2035-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AuditLogTests(TestCase):
+    def setUp(self):
+        moment = utc(2024, 7, 1, 12)
+        # every third entry shares its timestamp with the previous one, so pages split ties
+        AuditEntry.objects.bulk_create(
+            [AuditEntry(timestamp=moment + timedelta(seconds=i - i % 3 // 2), actor='ana' if i % 2 else 'bea',
+                        action='added', event_id=i % 4) for i in range(25)])
+        self.client.force_login(User.objects.create_user('staff', password='secret', is_staff=True))
+
+    def pages(self, **params):
+        ids, cursor = [], None
+        while True:
+            data = self.client.get('/audit/', {**params, **({'cursor': cursor} if cursor else {})}).json()
+            ids += [entry['id'] for entry in data['entries']]
+            cursor = data['next']
+            if cursor is None:
+                return ids
+
+    def test_pages_cover_every_entry_once_newest_first(self):
+        expected = list(AuditEntry.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        self.assertEqual(self.pages(limit=4), expected)
+        self.assertEqual(self.pages(limit=25), expected)
+
+    def test_filters(self):
+        expected = list(AuditEntry.objects.filter(actor='ana', event_id=1).order_by('-timestamp', '-id')
+                        .values_list('id', flat=True))
+        self.assertEqual(self.pages(actor='ana', event=1, limit=2), expected)
+        self.assertEqual(len(self.pages(since='2024-07-01T12:00:10Z', until='2024-07-01T12:00:20Z')),
+                         AuditEntry.objects.filter(timestamp__gte=utc(2024, 7, 1, 12, 0, 10),
+                                                   timestamp__lt=utc(2024, 7, 1, 12, 0, 20)).count())
+
+    def test_invalid_cursor_and_permissions(self):
+        self.assertEqual(self.client.get('/audit/', {'cursor': 'nowhere'}).status_code, 400)
+        self.client.force_login(User.objects.create_user('editor', password='secret'))
+        self.assertEqual(self.client.get('/audit/').status_code, 403)
+
+
+class MetricsTests(TestCase):
+    requests = 'calendar_requests_total{method="GET",status="200",view="all_events"}'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        metrics_settings = self.settings(METRICS={'DIR': self.directory})
+        metrics_settings.enable()
+        self.addCleanup(metrics_settings.disable)
+        self.client.force_login(User.objects.create_user('admin', password='secret', is_staff=True))
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        samples = (line.rsplit(' ', 1) for line in response.content.decode().splitlines() if line and not line.startswith('#'))
+        return {name: float(value) for name, value in samples}
+
+    def worker_file(self, pid, requests):
+        path = os.path.join(self.directory, f'{pid}-1.json')
+        with open(path, 'w') as f:
+            json.dump({'counters': [['calendar_requests_total', [['method', 'GET'], ['status', '200'], ['view', 'all_events']],
+                                     requests]], 'histograms': []}, f)
+        return path
+
+    def test_requests_and_queries_are_counted(self):
+        make_event()
+        before = self.scrape()
+        queries = []
+
+        def count(execute, sql, *args):
+            queries.append(sql)
+            return execute(sql, *args)
+
+        # CaptureQueriesContext would lose the queries, each request resets connection.queries
+        with connection.execute_wrapper(count):
+            for _ in range(2):
+                # a streamed response is measured once its body is read
+                body(self.client.get('/all_events/', {'start': '2024-07-01', 'end': '2024-08-01'}))
+        after = self.scrape()
+        self.assertEqual(after[self.requests] - before.get(self.requests, 0), 2)
+        self.assertEqual(after['calendar_request_queries_count{view="all_events"}']
+                         - before.get('calendar_request_queries_count{view="all_events"}', 0), 2)
+        self.assertEqual(after['calendar_db_queries_total{view="all_events"}']
+                         - before.get('calendar_db_queries_total{view="all_events"}', 0), len(queries))
+
+    def test_worker_files_are_summed_and_stale_ones_deleted(self):
+        before = self.scrape().get(self.requests, 0)
+        self.worker_file(os.getppid(), 5)
+        exited = subprocess.Popen([sys.executable, '-c', ''])
+        exited.wait()
+        dead = self.worker_file(exited.pid, 7)
+        old = self.worker_file(os.getpid() + 1_000_000, 11)
+        os.utime(old, (0, 0))
+        self.assertEqual(self.scrape()[self.requests] - before, 5)
+        self.assertFalse(os.path.exists(dead))
+        self.assertFalse(os.path.exists(old))
+
+
+class LogHandlerTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'calendar.log')
+
+    def handler(self):
+        handler = MultiprocessTimedRotatingFileHandler(self.path, when='midnight', backupCount=5)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        self.addCleanup(handler.close)
+        return handler
+
+    def emit(self, handler, message):
+        handler.handle(logging.makeLogRecord({'msg': message}))
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read().split()
+
+    def test_two_writers_rotate_the_file_once(self):
+        # as two gunicorn workers appending to the same log
+        first, second = self.handler(), self.handler()
+        self.emit(first, 'one')
+        self.emit(second, 'two')
+        first.rolloverAt = second.rolloverAt = time.time() - 1
+        self.emit(first, 'three')
+        # the second writer finds the file already rotated and only reopens it
+        self.emit(second, 'four')
+        rotated = [name for name in os.listdir(os.path.dirname(self.path)) if name.startswith('calendar.log.')
+                   and not name.endswith('.lock')]
+        self.assertEqual(len(rotated), 1)
+        self.assertEqual(self.read(os.path.join(os.path.dirname(self.path), rotated[0])), ['one', 'two'])
+        self.assertEqual(self.read(self.path), ['three', 'four'])
+
+    def test_queued_records_are_written_by_close(self):
+        handler = QueuedRotatingFileHandler(self.path, when='midnight')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        for number in range(100):
+            self.emit(handler, f'record{number}')
+        handler.close()
+        self.assertEqual(self.read(self.path), [f'record{number}' for number in range(100)])
+
+
+def _write_events(args):
+    """Pool worker: add events through atomic_with_retry on its own connection to the database file."""
+    path, writer, count = args
+    connection.settings_dict['NAME'] = path
+    # the forked parent's connection is not shared
+    connection.connection = None
+    locked = 0
+    for i in range(count):
+        start = utc(2024, 7, 1) + timedelta(days=i)
+        try:
+            atomic_with_retry(lambda: make_event(f'Writer {writer}', start, start + timedelta(hours=8)))
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            locked += 1
+    connection.close()
+    return locked
+
+
+@skipUnless(hasattr(os, 'fork'), "needs forked writer processes")
+class ConcurrentWriteTests(TransactionTestCase):
+    writers = 4
+    events_per_writer = 25
+
+    def test_forked_writers_never_see_a_locked_database(self):
+        self.assertEqual(connection.settings_dict['ENGINE'], 'django_cal_app.sqlite3')
+        with tempfile.TemporaryDirectory() as directory:
+            # the test database may be in memory, so the writers share a copy of it in a file
+            path = os.path.join(directory, 'writers.sqlite3')
+            connection.ensure_connection()
+            target = sqlite3.connect(path)
+            connection.connection.backup(target)
+            target.execute('PRAGMA journal_mode = WAL')
+            target.close()
+
+            jobs = [(path, writer, self.events_per_writer) for writer in range(self.writers)]
+            with multiprocessing.get_context('fork').Pool(self.writers) as pool:
+                locked = pool.map(_write_events, jobs)
+
+            self.assertEqual(locked, [0] * self.writers)
+            with closing(sqlite3.connect(path)) as result:
+                added = result.execute('SELECT COUNT(*) FROM calendar_app_event').fetchone()[0]
+            self.assertEqual(added, self.writers * self.events_per_writer)
+
+    def test_transactions_take_the_write_lock_at_begin(self):
+        statements = []
+
+        def capture(execute, sql, *args):
+            statements.append(sql)
+            return execute(sql, *args)
+
+        with connection.execute_wrapper(capture), transaction.atomic():
+            make_event()
+        self.assertEqual(statements[0], 'BEGIN IMMEDIATE')
+
+    def test_retry_while_the_database_is_locked(self):
+        attempts = []
+
+        def write(error):
+            attempts.append(error)
+            if len(attempts) < 3:
+                raise OperationalError(error)
+            return make_event()
+
+        self.assertEqual(atomic_with_retry(lambda: write('database is locked'), delay=0).name_person, 'Ana')
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(Event.objects.count(), 1)
+        # other errors, and locks inside an outer transaction, are not retried
+        attempts.clear()
+        with self.assertRaises(OperationalError):
+            atomic_with_retry(lambda: write('no such table'), delay=0)
+        self.assertEqual(len(attempts), 1)
+        attempts.clear()
+        with self.assertRaises(OperationalError), transaction.atomic():
+            atomic_with_retry(lambda: write('database is locked'), delay=0)
+        self.assertEqual(len(attempts), 1)
+
+
+class OverlapTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('editor', password='secret'))
+        self.existing = make_event('Ana', utc(2024, 7, 1, 9), utc(2024, 7, 1, 17))
+
+    def add(self, name_person='Ana', start_date='2024-07-01', start_time='12:00', end_time='18:00', **data):
+        return self.client.post('/add_event/', {'name_person': name_person, 'place': 'Calp', 'start_date': start_date,
+                                                'start_time': start_time, 'end_date': start_date,
+                                                'end_time': end_time, **data}).json()
+
+    def test_overlapping_entry_is_rejected(self):
+        response = self.add()
+        self.assertEqual(response['status'], 'error')
+        self.assertIn('Ana is already at ORM from 2024-07-01 09:00', response['message'])
+        self.assertEqual(self.add(full_day='on')['status'], 'error')
+        self.assertEqual(Event.objects.count(), 1)
+
+    def test_adjacent_other_person_and_removed_entries_are_accepted(self):
+        self.assertEqual(self.add(start_time='17:00', end_time='19:00')['status'], 'success')
+        self.assertEqual(self.add('Bea')['status'], 'success')
+        self.client.post('/remove_event/', {'id': self.existing.id})
+        self.assertEqual(self.add(start_time='08:00', end_time='10:00')['status'], 'success')
+
+    def test_find_conflicts_matches_pairwise_check(self):
+        rng = random.Random(7)
+        for _ in range(120):
+            start = utc(2024, 7, 1) + timedelta(hours=rng.randrange(0, 24 * 20))
+            make_event(rng.choice(['Ana', 'Bea', 'Carl']), start, start + timedelta(hours=rng.choice([0, 1, 8, 30])))
+        events = list(Event.objects.all())
+        expected = {frozenset((a.id, b.id)) for a in events for b in events
+                    if a.id < b.id and a.name_person == b.name_person and a.start < b.end and b.start < a.end}
+        self.assertTrue(expected)
+        self.assertEqual({frozenset(pair) for pair in find_conflicts()}, expected)
+
+
+def naive_starts(rule, limit):
+    """Every occurrence start of a rule before limit, found by checking each day from the first occurrence."""
+    weekdays = rule.weekdays()
+    first_week = rule.start - timedelta(days=rule.start.weekday())
+    starts = []
+    moment = rule.start
+    while moment < limit and not (rule.until and moment.date() > rule.until) and not (rule.count and len(starts) == rule.count):
+        if rule.freq == 'DAILY':
+            matches = (moment - rule.start).days % rule.interval == 0
+        else:
+            matches = moment.weekday() in weekdays and (moment - first_week).days // 7 % rule.interval == 0
+        if matches:
+            starts.append(moment)
+        moment += timedelta(days=1)
+    return starts
+
+
+class RecurrenceTests(TestCase):
+    limit = utc(2025, 1, 1)
+
+    def setUp(self):
+        def rule(start, hours, **fields):
+            return RecurrenceRule.objects.create(name_person='Ana', place='Remote', start=start,
+                                                 end=start + timedelta(hours=hours), **fields)
+        self.rules = [
+            rule(utc(2024, 7, 2, 9), 8, freq='DAILY', interval=3, count=10),
+            # starts on a Wednesday, so the Monday of its first week is not an occurrence
+            rule(utc(2024, 7, 3, 20), 26, byweekday='MO,WE,FR', interval=2, until=date(2024, 9, 15)),
+            rule(utc(2024, 7, 6, 8), 4, byweekday='TU,SA', count=7),
+            rule(utc(2024, 7, 5), 24, all_day=True),
+        ]
+
+    def windows(self):
+        """Windows of several lengths sliding over the rules, most starting in the middle of a series."""
+        start = utc(2024, 6, 25, 7, 30)
+        while start < utc(2024, 10, 1):
+            for days in (1, 5, 7, 31):
+                yield start, start + timedelta(days=days)
+            start += timedelta(days=2, hours=5)
+
+    def test_window_expansion_matches_full_expansion(self):
+        for rule in self.rules:
+            duration = rule.end - rule.start
+            everything = naive_starts(rule, self.limit)
+            for window_start, window_end in self.windows():
+                with self.subTest(rule=rule.rrule, window=window_start):
+                    self.assertEqual(list(rule.occurrence_starts(window_start, window_end)),
+                                     [start for start in everything if start < window_end and start + duration > window_start])
+
+    def test_count_and_until_bound_the_series(self):
+        daily, weekly, twice_weekly, _ = self.rules
+        self.assertEqual(len(list(daily.occurrence_starts(utc(2024, 1, 1), self.limit))), 10)
+        self.assertEqual(list(twice_weekly.occurrence_starts(utc(2024, 1, 1), self.limit)),
+                         naive_starts(twice_weekly, self.limit))
+        self.assertEqual(len(naive_starts(twice_weekly, self.limit)), 7)
+        self.assertLessEqual(max(weekly.occurrence_starts(utc(2024, 1, 1), self.limit)).date(), date(2024, 9, 15))
+
+    def test_overrides_cancel_and_move_occurrences(self):
+        rule = self.rules[1]
+        duration = rule.end - rule.start
+        cancelled, moved = naive_starts(rule, self.limit)[2:4]
+        # from Friday evening to Sunday morning, ending a day later
+        moved_to = moved + timedelta(days=1, hours=14)
+        recurrence.cancel(rule.pk, cancelled)
+        RecurrenceOverride.objects.create(rule=rule, original_start=moved, start=moved_to, place='ORM')
+        with self.assertRaises(RecurrenceRule.DoesNotExist):
+            recurrence.cancel(rule.pk, cancelled + timedelta(hours=1))
+
+        for window_start, window_end in [*self.windows(), (moved_to, moved_to + timedelta(hours=1))]:
+            with self.subTest(window=window_start):
+                expected = [(recurrence.occurrence_id(rule.pk, start), start, start + duration, 'Remote')
+                            for start in naive_starts(rule, self.limit)
+                            if start not in (cancelled, moved) and start < window_end and start + duration > window_start]
+                if moved_to < window_end and moved_to + duration > window_start:
+                    expected.append((recurrence.occurrence_id(rule.pk, moved), moved_to, moved_to + duration, 'ORM'))
+                    expected.sort(key=lambda row: row[1])
+                rows = recurrence.occurrences(window_start, window_end)
+                self.assertEqual([(row[0], row[2], row[3], row[5]) for row in rows if row[0].startswith(f'r{rule.pk}-')],
+                                 expected)
+
+
+class AvailabilityTests(TestCase):
+    first, last = date(2024, 12, 28), date(2025, 1, 6)
+
+    def setUp(self):
+        # bitmaps are cached per global version, which rolls back between tests
+        availability._cache.clear()
+        self.ana = make_event('Ana', utc(2024, 12, 30), utc(2025, 1, 2), all_day=True)
+        self.ana_again = make_event('Ana', utc(2024, 12, 31, 9), utc(2024, 12, 31, 12))
+        make_event('Bea', utc(2025, 1, 1, 22), utc(2025, 1, 3, 2), place='Calp')
+        make_event('Carl', utc(2024, 12, 31, 9), utc(2024, 12, 31, 17))
+        RecurrenceRule.objects.create(name_person='Dan', place='Remote', start=utc(2024, 12, 27),
+                                      end=utc(2024, 12, 28), all_day=True, freq='WEEKLY')
+
+    def naive(self):
+        """{(name_person, place): bits} from the events and rule occurrences, day by day."""
+        rows = [(event.name_person, event.place, event.start, event.end, event.all_day) for event in Event.objects.all()]
+        rows += [(row[1], row[5], row[2], row[3], row[4])
+                 for row in recurrence.occurrences(utc(2024, 12, 28), utc(2025, 1, 6))]
+        maps = {}
+        for name_person, place, start, end, all_day in rows:
+            first, last = occupancy.event_days(start, end, all_day)
+            for offset in range((self.last - self.first).days):
+                if first <= self.first + timedelta(days=offset) < last:
+                    maps[(name_person, place)] = maps.get((name_person, place), 0) | 1 << offset
+        return maps
+
+    def test_bitmaps_follow_writes_across_years(self):
+        self.assertEqual(availability.bitmaps(self.first, self.last), self.naive())
+        self.assertEqual(set(AvailabilityYear.objects.filter(name_person='Ana').values_list('year', flat=True)),
+                         {2024, 2025})
+        # the other entry of Ana still covers the 31st
+        self.ana.delete()
+        self.assertEqual(availability.bitmaps(self.first, self.last)[('Ana', 'ORM')], 1 << 3)
+        self.ana_again.place = 'Calp'
+        self.ana_again.save()
+        self.assertEqual(availability.bitmaps(self.first, self.last), self.naive())
+
+    def test_rebuild_matches_incremental_bitmaps(self):
+        incremental = sorted(AvailabilityYear.objects.values_list('name_person', 'place', 'year', 'days'))
+        AvailabilityYear.objects.all().delete()
+        availability.rebuild()
+        self.assertEqual(sorted(AvailabilityYear.objects.values_list('name_person', 'place', 'year', 'days')), incremental)
+
+    def query(self, **params):
+        return self.client.get('/availability/', {'start': '2024-12-31', 'end': '2025-01-03', **params}).json()
+
+    def test_free_people(self):
+        self.assertEqual(self.query()['free'], ['Dan'])
+        self.assertEqual(self.query(end='2025-01-01')['free'], ['Bea', 'Dan'])
+        self.assertEqual(self.query(place='Calp')['free'], ['Ana', 'Carl', 'Dan'])
+
+    def test_matching_days(self):
+        self.assertEqual(self.query(query='days', min='2')['days'], ['2024-12-31', '2025-01-01'])
+        self.assertEqual(self.query(query='days', min='all', person=['Ana', 'Bea'])['days'], ['2025-01-01'])
+        self.assertEqual(self.query(query='days', place='Calp')['days'], ['2025-01-01', '2025-01-02'])
+        self.assertEqual(self.query(query='days', min='x')['status'], 'error')
+
+
+class ReportTests(TestCase):
+    def setUp(self):
+        availability._cache.clear()
+        self.ana = make_event('Ana', utc(2024, 7, 30), utc(2024, 8, 3), all_day=True)
+        make_event('Bea', utc(2024, 7, 31, 9), utc(2024, 7, 31, 17), place='Calp')
+        self.client.force_login(User.objects.create_user('admin', password='secret', is_staff=True))
+
+    def report(self, **params):
+        response = self.client.get('/reports/person-days/', {'start': '2024-07-01', 'end': '2024-09-01', **params})
+        return body(response).decode().splitlines()
+
+    def test_days_are_split_across_months(self):
+        self.assertEqual(self.report(), ['month,name_person,place,days', '2024-07,Ana,ORM,2', '2024-07,Bea,Calp,1',
+                                         '2024-08,Ana,ORM,2'])
+        self.assertEqual(self.report(by='place'), ['month,place,people,days', '2024-07,Calp,1,1', '2024-07,ORM,1,2',
+                                                   '2024-08,ORM,1,2'])
+
+    def test_cached_months_are_dropped_on_edit(self):
+        self.report()
+        self.assertQuerySetEqual(PersonDaysMonth.objects.order_by('month').values_list('month', flat=True),
+                                 [date(2024, 7, 1), date(2024, 8, 1)])
+        bea = Event.objects.get(name_person='Bea')
+        bea.start, bea.end = utc(2024, 7, 10, 9), utc(2024, 7, 10, 17)
+        bea.save()
+        self.assertQuerySetEqual(PersonDaysMonth.objects.values_list('month', flat=True), [date(2024, 8, 1)])
+        self.ana.end = utc(2024, 8, 5)
+        self.ana.save()
+        self.assertFalse(PersonDaysMonth.objects.exists())
+        self.assertEqual(self.report()[-1], '2024-08,Ana,ORM,4')
+
+    def test_only_staff_can_download(self):
+        self.client.force_login(User.objects.create_user('editor', password='secret'))
+        self.assertEqual(self.client.get('/reports/person-days/', {'start': '2024-07-01', 'end': '2024-09-01'}).status_code,
+                         403)
+
+
+class AdminTests(TestCase):
+    url = '/admin/calendar_app/event/'
+
+    def setUp(self):
+        availability._cache.clear()
+        make_event('Ana', utc(2024, 7, 1, 9), utc(2024, 7, 1, 17))
+        make_event('Ana', utc(2024, 7, 2, 9), utc(2024, 7, 2, 17), place='Calp')
+        make_event('Bea', utc(2024, 8, 1, 9), utc(2024, 8, 1, 17), place='Calp')
+        self.client.force_login(User.objects.create_superuser('admin', password='secret'))
+        storages = {**settings.STORAGES, 'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}}
+        static_settings = self.settings(STORAGES=storages)
+        static_settings.enable()
+        self.addCleanup(static_settings.disable)
+
+    def changelist(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_changelist_pages_with_a_capped_count(self):
+        changelist = self.changelist()
+        self.assertIsInstance(changelist.paginator, LimitedCountPaginator)
+        self.assertEqual((changelist.result_count, changelist.paginator.capped), (3, False))
+        with patch.object(LimitedCountPaginator, 'limit', 2):
+            changelist = self.changelist()
+        self.assertEqual((changelist.paginator.count, changelist.paginator.capped), (2, True))
+
+    def test_place_and_person_filters(self):
+        filters = {spec.parameter_name: spec.lookup_choices for spec in self.changelist().filter_specs}
+        self.assertEqual(filters, {'place': [('Calp', 'Calp'), ('ORM', 'ORM')],
+                                   'name_person': [('Ana', 'Ana'), ('Bea', 'Bea')]})
+        self.assertEqual([event.name_person for event in self.changelist(place='Calp').result_list], ['Bea', 'Ana'])
+        self.assertEqual([event.place for event in self.changelist(name_person='Ana', place='Calp').result_list], ['Calp'])
+
+    def test_date_hierarchy_drilldown(self):
+        # the month links of 2024 come from DrilldownQuerySet.datetimes
+        page = self.client.get(self.url, {'start__year': 2024}).content.decode()
+        self.assertIn('start__month=7', page)
+        self.assertIn('start__month=8', page)
+        self.assertNotIn('start__month=9', page)
+        changelist = self.changelist(start__year=2024, start__month=7)
+        self.assertEqual([event.start.day for event in changelist.result_list], [2, 1])
+
+
+class ArchiveTests(TestCase):
+    window = {'start': '2020-03-01', 'end': '2020-04-01'}
+
+    def setUp(self):
+        # both caches are keyed by the archive version, which rolls back between tests
+        archive._cache.clear()
+        archive._horizons.clear()
+        self.old = make_event('Ana', utc(2020, 3, 2, 9), utc(2020, 3, 2, 17), notes='archived')
+        make_event('Bea', utc(2020, 3, 30), utc(2020, 4, 2), all_day=True, place='Calp')
+        tomorrow = timezone.now() + timedelta(days=1)
+        self.recent = make_event('Carl', tomorrow, tomorrow + timedelta(hours=2))
+
+    def archive(self):
+        call_command('archive_events', days=365, stdout=io.StringIO())
+        feed_cache.clear()
+
+    def test_windows_fall_through_to_the_archive(self):
+        before = body(self.client.get('/all_events/', self.window))
+        counts = occupancy.daily_counts(date(2020, 3, 1), date(2020, 4, 5))
+        self.archive()
+
+        self.assertQuerySetEqual(Event.all_objects.values_list('id', flat=True), [self.recent.id])
+        self.assertEqual(ArchivedEvent.objects.count(), 2)
+        self.assertEqual(body(self.client.get('/all_events/', self.window)), before)
+        self.assertEqual(occupancy.daily_counts(date(2020, 3, 1), date(2020, 4, 5)), counts)
+        self.assertEqual(self.client.get(f'/event/{self.old.id}/').json()['notes'], 'archived')
+
+    def test_recent_windows_skip_the_archive(self):
+        self.archive()
+        self.assertEqual(archive.horizon()[1], utc(2020, 4, 2))
+        # only the archive version is read
+        with self.assertNumQueries(1):
+            self.assertEqual(archive.window_rows(utc(2020, 4, 2), utc(2020, 5, 1), FEED_FIELDS), [])
+        self.assertFalse(archive.reaching(utc(2020, 4, 2), utc(2020, 5, 1)).exists())
+        self.assertEqual(len(archive.window_rows(utc(2020, 4, 1), utc(2020, 5, 1), FEED_FIELDS)), 1)
+
+    def test_archiving_is_audited_once(self):
+        self.archive()
+        self.archive()
+        self.assertQuerySetEqual(AuditEntry.objects.values_list('action', 'details__events'), [('archived', 2)])
+
+
+class BulkTests(TestCase):
+    def setUp(self):
+        availability._cache.clear()
+        self.client.force_login(User.objects.create_user('staff', password='secret', is_staff=True))
+        self.campaign = [make_event('Ana', utc(2024, 7, day, 9), utc(2024, 7, day, 17)) for day in (1, 2, 3)]
+        self.other = make_event('Ana', utc(2024, 8, 1, 9), utc(2024, 8, 1, 17), place='Calp')
+        self.bea = make_event('Bea', utc(2024, 7, 2, 12), utc(2024, 7, 2, 14))
+        self.window = {'start': '2024-07-01', 'end': '2024-07-04'}
+        body(self.client.get('/all_events/', self.window))
+
+    def bulk(self, action, **data):
+        return self.client.post('/events/bulk/', {'action': action, **data})
+
+    def ids(self, events):
+        return [event.id for event in events]
+
+    def test_dry_run_changes_nothing(self):
+        response = self.bulk('remove', person='Ana', place='ORM', dry_run='on').json()
+        self.assertEqual((response['matched'], response['ids'], response['dry_run']), (3, self.ids(self.campaign), True))
+        self.assertEqual(Event.objects.count(), 5)
+        self.assertFalse(AuditEntry.objects.exists())
+        self.assertEqual(FeedCacheEntry.objects.count(), 1)
+
+    def test_remove_keeps_tombstones_and_refreshes_derived_data(self):
+        response = self.bulk('remove', person='Ana', **self.window).json()
+        self.assertEqual(response['ids'], self.ids(self.campaign))
+        self.assertEqual(Event.all_objects.filter(deleted_at__isnull=False).count(), 3)
+        self.assertQuerySetEqual(Event.objects.order_by('id').values_list('id', flat=True), [self.other.id, self.bea.id])
+        self.assertEqual(FeedCacheEntry.objects.count(), 0)
+        self.assertEqual(occupancy.daily_counts(date(2024, 7, 1), date(2024, 7, 4)), {'ORM': [0, 1, 0]})
+        self.assertNotIn(('Ana', 'ORM'), availability.bitmaps(date(2024, 7, 1), date(2024, 7, 4)))
+        entry = AuditEntry.objects.get()
+        self.assertEqual((entry.action, entry.details['count']), ('bulk_deleted', 3))
+
+    def test_reassign(self):
+        response = self.bulk('reassign', ids=','.join(map(str, self.ids(self.campaign[:2]))), to_person='Carl',
+                             to_place='Remote').json()
+        self.assertEqual(response['matched'], 2)
+        self.assertQuerySetEqual(Event.objects.filter(name_person='Carl', place='Remote').order_by('id')
+                                 .values_list('id', flat=True), self.ids(self.campaign[:2]))
+        self.assertEqual(occupancy.daily_counts(date(2024, 7, 1), date(2024, 7, 4), 'Remote'), {'Remote': [1, 1, 0]})
+        self.assertEqual(AuditEntry.objects.get().details['to'], {'name_person': 'Carl', 'place': 'Remote'})
+
+    def test_reassign_onto_overlapping_entries_is_refused(self):
+        response = self.bulk('reassign', person='Ana', place='ORM', to_person='Bea')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['conflicts'], [[self.campaign[1].id, self.bea.id]])
+        self.assertEqual(Event.objects.filter(name_person='Bea').count(), 1)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.bulk('remove').status_code, 400)
+        self.assertEqual(self.bulk('reassign', person='Ana').status_code, 400)
+        self.assertEqual(self.bulk('archive', person='Ana').status_code, 400)
+        self.client.force_login(User.objects.create_user('editor', password='secret'))
+        self.assertEqual(self.bulk('remove', person='Ana').status_code, 403)
+        self.assertEqual(Event.objects.count(), 5)
@@ -0,0 +1,20 @@
+import random
+import time
+
+from django.db import OperationalError, connection, transaction
+
+
+def atomic_with_retry(func, attempts=4, delay=0.05):
+    """Run func() in transaction.atomic(), retrying with backoff while SQLite reports the database as locked.
+
+    A failed attempt is rolled back, so func must build everything it writes from scratch.
+    """
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                return func()
+        except OperationalError as e:
+            # inside an outer transaction only the outermost block can retry
+            if 'locked' not in str(e) or attempt == attempts - 1 or connection.in_atomic_block:
+                raise
+        time.sleep(delay * 2 ** attempt * (1 + random.random()))
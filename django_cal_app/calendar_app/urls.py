@@ -1,14 +1,28 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 from django.contrib.auth import views as auth_views
 
+# In ASGI mode the read endpoints are served by their async versions
+read_views = async_views if settings.SERVER_MODE == 'asgi' else views
+
 urlpatterns = [
-    path('', views.calendar_view, name='calendar'),
+    path('', read_views.calendar_view, name='calendar'),
     path('login/', auth_views.LoginView.as_view(template_name='login.html'), name='login'),
     path('logout/', views.logout_user, name='logout'),
-    path('all_events/', views.all_events, name='all_events'),
+    path('all_events/', read_views.all_events, name='all_events'),
     path('add_event/', views.add_event, name='add_event'),
-    path('event/<int:event_id>/', views.event_details, name='event_details'),
+    path('events/bulk/', views.bulk_events, name='bulk_events'),
+    path('events/changes/', views.event_changes, name='event_changes'),
+    path('events/stream/', views.event_stream, name='event_stream'),
+    path('event/<int:event_id>/', read_views.event_details, name='event_details'),
     #path('update_event/', views.update_event, name='update_event'),
+    path('occupancy/', views.occupancy, name='occupancy'),
+    path('occupancy/heatmap/', views.occupancy_heatmap, name='occupancy_heatmap'),
+    path('availability/', views.availability, name='availability'),
+    path('reports/person-days/', views.person_days_report, name='person_days_report'),
     path('remove_event/', views.remove_event, name='remove_event'),
+    path('import_events/', views.import_events, name='import_events'),
+    path('audit/', views.audit_log, name='audit_log'),
+    path('metrics', views.metrics, name='metrics'),
 ]
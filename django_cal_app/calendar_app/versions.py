@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ArchivedEvent, CalendarVersion, Event
+
+GLOBAL_KEY = 'global'
+# advanced along with the global version when recurrence rules or their overrides change
+RECURRENCE_KEY = 'recurrence'
+# advanced by every archive_events run
+ARCHIVE_KEY = 'archive'
+
+
+def bump_version(key=GLOBAL_KEY):
+    """Advance the global change version; called once per change (or per batch of changes)."""
+    with transaction.atomic():
+        updated = CalendarVersion.objects.filter(key=key).update(
+            version=F('version') + 1, updated_at=timezone.now())
+        if not updated:
+            CalendarVersion.objects.get_or_create(key=key, defaults={'version': 1})
+
+
+def current_version(request=None):
+    """Return (version, updated_at), memoized on the request so ETag and Last-Modified share one query."""
+    if request is not None and hasattr(request, '_calendar_version'):
+        return request._calendar_version
+    row = CalendarVersion.objects.filter(key=GLOBAL_KEY).values_list('version', 'updated_at').first()
+    result = row or (0, None)
+    if request is not None:
+        request._calendar_version = result
+    return result
+
+
+def visibility(request):
+    return 'auth' if request.user.is_authenticated else 'anon'
+
+
+def event_etag(request, event_id):
+    updated_at = event_last_modified(request, event_id)
+    if updated_at is None:
+        return None
+    return f"event-{event_id}-{updated_at.timestamp()}"
+
+
+def event_last_modified(request, event_id):
+    if not hasattr(request, '_event_updated_at'):
+        request._event_updated_at = (Event.objects.filter(id=event_id).values_list('updated_at', flat=True).first()
+                                     or ArchivedEvent.objects.filter(id=event_id).values_list('updated_at', flat=True).first())
+    return request._event_updated_at
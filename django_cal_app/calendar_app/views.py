@@ -1,12 +1,36 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+import hmac
+import io
+import json
 import logging
-from .models import Event
+import tempfile
+from .models import ArchivedEvent, Event, RecurrenceRule
+from .forms import EventForm
+from .transactions import atomic_with_retry
+from .audit import entry_data, log_event, record, search as search_audit
+from .bulk import reassign_events, remove_events
+from .availability import free_people, matching_days
+from .importer import import_events as import_rows, read_csv, read_ics
+from .feed import SyncTokenExpired, all_extra, color_map, changed_events, event_detail, feed_bootstrap, iter_feed, parse_bound, parse_sync_token, parse_window, rules_changed, sync_token, window_events, window_extra
+from .feed_cache import cache_key, cached_entry, feed_etag, feed_last_modified, store_after
+from .live import change_stream
+from .metrics import option as metrics_option, render as render_metrics
+from .occupancy import daily_counts
+from .reports import csv_lines, person_days, write_xlsx
+from .recurrence import cancel as cancel_occurrence, parse_occurrence_id
+from .versions import current_version, event_etag, event_last_modified
+from django.conf import settings
 from django.contrib import messages
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+import calendar
 from django.contrib.auth import logout
+from django.utils import timezone
+from django.utils.safestring import mark_safe
 
 # Get an instance of a logger
 logger = logging.getLogger('calendar_app')
@@ -19,9 +43,10 @@ def logout_user(request):
 
 
 def calendar_view(request):
-    all_events = Event.objects.all()
     context = {
-        "events": all_events,
+        # the first month's events, so the calendar draws without a second request
+        "bootstrap": mark_safe(feed_bootstrap()),
+        "live_updates": settings.LIVE_UPDATES,
     }
     return render(request, 'calendar.html', context)
 
@@ -57,81 +82,215 @@ def add_event(request):
                     # Handle case where end_date or end_time is not provided
                     end = datetime.combine(datetime.strptime(start_date, '%Y-%m-%d').date(), datetime.strptime(start_time, '%H:%M').time())
 
-            # Create an Event object
-            event = Event(
-                name_person=name_person,
-                start=start,
-                end=end,
-                all_day=full_day,
-                place=place,
-                notes=notes
-            )
-
-            # Save the event to the database
-            event.save()
-            data = {}
-            event_info = f'Event ID: {event.id}, Name: {event.name_person}, Start: {event.start}, End: {event.end}, All day: {event.all_day}, Place: {event.place}, Notes: {event.notes}'
-            messages.success(request, "Event added successfully!")
-            logger.info(f'Event added by {request.user}: {event_info}')
-            return JsonResponse(data)
+            data = {'name_person': name_person, 'start': start, 'end': end, 'all_day': full_day,
+                    'place': place, 'notes': notes}
+
+            def create():
+                # validated in the write transaction, so two requests cannot both pass the overlap check
+                form = EventForm(data, check_overlap=True)
+                if form.is_valid():
+                    event = form.save()
+                    log_event('added', request.user, event)
+                return form
+
+            form = atomic_with_retry(create)
+            if form.errors:
+                return JsonResponse({'status': 'error', 'message': f"The event was not added: {form.error_message()}"})
+            # the calendar applies the change without reloading, so the message travels in the response
+            return JsonResponse({'status': 'success', 'message': "Event added successfully!"})
         except Exception as e:
-            messages.error(request, f"There was an error adding the event: {e}")
-            logger.error(f'Error adding event: {e}')
-            return JsonResponse({'status': 'error'})
+            logger.error('Error adding event: %s', e)
+            return JsonResponse({'status': 'error', 'message': f"There was an error adding the event: {e}"})
     return JsonResponse({'status': 'fail'})
 
 
+# Clients revalidate on every fetch and get a 304 while nothing has changed
+@cache_control(no_cache=True)
+@condition(etag_func=feed_etag, last_modified_func=feed_last_modified)
 def all_events(request):
-    events = Event.objects.all()
-    events_list = []
-
-    # color map for places
-    color_map = {
-        'Calp': '#002642',
-        'ORM': '#840032',
-        'Remote': '#e59500',
-        'Mirca': '#008000'
-    }
+    entry = cached_entry(request)
+    if entry is not None:
+        response = HttpResponse(entry.body, content_type='application/json')
+        response['X-Sync-Token'] = sync_token(entry.created_at)
+        return response
+    # read before the query so a write racing with it keeps the body out of the cache
+    current_version(request)
+    issued = timezone.now()
 
-    for event in events:
-        place_color = color_map.get(event.place, '#000000')  # Default to black if place not found
-        events_list.append({
-            'id': event.id,
-            'title': f"{event.name_person} - {event.place}",
-            'name_person': event.name_person,
-            'start': event.start.isoformat(),
-            'end': event.end.isoformat(),
-            'allDay': event.all_day,
-            'place': event.place,
-            'notes': event.notes,
-            'color': place_color,
-        })
-    return JsonResponse(events_list, safe=False)
+    # FullCalendar sends the visible range as start/end; the whole history is only returned on explicit request
+    if request.GET.get('all') == '1':
+        events = Event.objects.all()
+        extra = all_extra()
+    else:
+        try:
+            start, end = parse_window(request.GET)
+        except ValueError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        events = window_events(start, end)
+        # recurring entries are expanded for this window only, and the archive is read only if it reaches that far back
+        extra = window_extra(start, end)
 
+    chunks = iter_feed(events, extra=extra)
+    if cache_key(request) is not None:
+        chunks = store_after(request, chunks)
+    response = StreamingHttpResponse(chunks, content_type='application/json')
+    # starting point for /events/changes/
+    response['X-Sync-Token'] = sync_token(issued)
+    return response
 
-def event_details(request, event_id):
-    event = get_object_or_404(Event, id=event_id)
-
-    if event.all_day:
-        event_data = {
-            'title': event.name_person,
-            'start': event.start.strftime("%Y-%m-%d"),
-            'end': event.end.strftime("%Y-%m-%d"),
-            'place': event.place,
-            'notes': event.notes,
-            'all_day': event.all_day,
-        }
+
+def event_changes(request):
+    issued = timezone.now()
+    since = request.GET.get('since')
+    if not since:
+        return JsonResponse({'status': 'success', 'token': sync_token(issued), 'events': [], 'deleted': []})
+    try:
+        since = parse_sync_token(since)
+        start = end = None
+        if request.GET.get('start') or request.GET.get('end'):
+            start, end = parse_window(request.GET)
+    except SyncTokenExpired:
+        # tombstones older than the retention may be gone; the client must do a full fetch
+        return JsonResponse({'status': 'expired', 'message': 'Sync token expired'}, status=410)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
+    events, deleted = changed_events(since, start, end)
+    # rule occurrences are not tracked one by one, so a rule change asks the client for a full fetch
+    refetch = '"refetch": true, ' if rules_changed(since) else ''
+    head = f'{{"status": "success", "token": "{sync_token(issued)}", {refetch}"deleted": {json.dumps(deleted)}, "events": '
+
+    def chunks():
+        yield head.encode()
+        yield from iter_feed(events)
+        yield b'}'
+    return StreamingHttpResponse(chunks(), content_type='application/json')
+
+
+def occupancy(request):
+    try:
+        start, end = parse_window(request.GET)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    first, last = start.date(), end.date()
+    if (last - first).days > 3660:
+        return JsonResponse({'status': 'error', 'message': 'Range is limited to 10 years'}, status=400)
+    counts = daily_counts(first, last, request.GET.get('place'))
+    return JsonResponse({
+        'start': first.isoformat(),
+        'end': last.isoformat(),
+        'counts': counts,  # one value per day from start, per place
+    })
+
+
+def availability(request):
+    """Free/busy search over the day bitmaps.
+
+    ?query=free lists the people without an entry on any day of the range, and ?query=days the
+    days on which at least ?min= of the people (or all of them, with min=all) have one.
+    Both can be limited to ?person= and ?place= (repeatable).
+    """
+    try:
+        start, end = parse_window(request.GET)
+        minimum = request.GET.get('min', '1')
+        minimum = None if minimum == 'all' else int(minimum)
+        limit = int(request.GET['limit']) if request.GET.get('limit') else None
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    first, last = start.date(), end.date()
+    if (last - first).days > 3660:
+        return JsonResponse({'status': 'error', 'message': 'Range is limited to 10 years'}, status=400)
+    names = request.GET.getlist('person') or None
+    places = set(request.GET.getlist('place')) or None
+    result = {'start': first.isoformat(), 'end': last.isoformat()}
+    if request.GET.get('query', 'free') == 'free':
+        result['free'] = free_people(first, last, names, places)
     else:
-        event_data = {
-            'title': event.name_person,
-            'start': event.start.strftime("%Y-%m-%d %H:%M"),
-            'end': event.end.strftime("%Y-%m-%d %H:%M"),
-            'place': event.place,
-            'notes': event.notes,
-            'all_day': event.all_day,
-        }
+        result['days'] = [day.isoformat() for day in matching_days(first, last, names, places, minimum, limit)]
+    return JsonResponse(result)
+
+
+@login_required
+def person_days_report(request):
+    """Person-days per month for ?start=&end=, per person and place (?by=person) or per place (?by=place),
+    streamed as CSV, or as XLSX with ?format=xlsx."""
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': 'Only staff can download reports'}, status=403)
+    try:
+        start, end = parse_window(request.GET)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    first, last = start.date(), end.date()
+    if (last - first).days > 3660:
+        return JsonResponse({'status': 'error', 'message': 'Range is limited to 10 years'}, status=400)
+    by = 'place' if request.GET.get('by') == 'place' else 'person'
+    rows = person_days(first, last, by)
+    filename = f"person-days-{by}-{first}-{last}"
+    if request.GET.get('format') == 'xlsx':
+        # the workbook is spooled to a temporary file, so the rows are never all in memory
+        file = tempfile.TemporaryFile()
+        try:
+            write_xlsx(rows, file)
+        except ImportError:
+            file.close()
+            return JsonResponse({'status': 'error', 'message': 'XLSX reports need openpyxl: pip install openpyxl'}, status=400)
+        file.seek(0)
+        return FileResponse(file, as_attachment=True, filename=f"{filename}.xlsx")
+    response = StreamingHttpResponse(csv_lines(rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def occupancy_heatmap(request):
+    try:
+        year = int(request.GET.get('year', date.today().year))
+        first = date(year, 1, 1)
+    except ValueError:
+        year = date.today().year
+        first = date(year, 1, 1)
+    counts = daily_counts(first, date(year + 1, 1, 1), request.GET.get('place'))
+    places = []
+    for place in sorted(counts):
+        daily = counts[place]
+        peak = max(daily) or 1
+        color = color_map.get(place, '#000000')
+        rgb = ', '.join(str(int(color[i:i + 2], 16)) for i in (1, 3, 5))
+        months = []
+        for month in range(1, 13):
+            month_start = (date(year, month, 1) - first).days
+            cells = []
+            for day in range(1, 32):
+                if day > calendar.monthrange(year, month)[1]:
+                    cells.append(None)
+                    continue
+                count = daily[month_start + day - 1]
+                cells.append({'day': day, 'count': count, 'opacity': round(count / peak, 2),
+                              'background': f"rgba({rgb}, {round(count / peak, 2)})"})
+            months.append({'name': calendar.month_abbr[month], 'cells': cells})
+        places.append({'name': place, 'peak': max(daily), 'months': months})
+    context = {
+        'year': year,
+        'places': places,
+        'days': range(1, 32),
+    }
+    return render(request, 'occupancy.html', context)
+
+
+async def event_stream(request):
+    # an open stream only costs a coroutine under ASGI; under WSGI it would hold a worker
+    if not settings.LIVE_UPDATES:
+        return HttpResponse(status=204)  # tells EventSource not to reconnect
+    response = StreamingHttpResponse(change_stream(request.headers.get('Last-Event-ID')), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
-    return JsonResponse(event_data)
+
+@cache_control(no_cache=True)
+@condition(etag_func=event_etag, last_modified_func=event_last_modified)
+def event_details(request, event_id):
+    event = Event.objects.filter(id=event_id).first() or get_object_or_404(ArchivedEvent, id=event_id)
+    return JsonResponse(event_detail(event))
 
 
 # @csrf_exempt
@@ -185,18 +344,141 @@ def remove_event(request):
     if request.method == 'POST':
         try:
             event_id = request.POST.get('id')
-            # Log the event ID for debugging
-            print(f"Attempting to delete event with ID: {event_id}")
-            event = get_object_or_404(Event, id=event_id)
-            event_info = f'Event ID: {event.id}, Name: {event.name_person}, Start: {event.start}, End: {event.end}, All day: {event.all_day}, Place: {event.place}, Notes: {event.notes}'
-            event.delete()
-            messages.success(request, "Event deleted successfully!")
-            logger.info(f'Event deleted by {request.user}: {event_info}')
-            #data = {}
-            #return JsonResponse(data)
-            return JsonResponse({'status': 'success'})
+            if event_id and event_id.startswith('r'):
+                return remove_occurrence(request, event_id)
+
+            def delete():
+                event = get_object_or_404(Event, id=event_id)
+                # keep a tombstone so clients syncing through /events/changes/ learn about the deletion
+                event.deleted_at = timezone.now()
+                event.deleted_by = request.user
+                event.save()
+                log_event('deleted', request.user, event)
+
+            atomic_with_retry(delete)
+            # the calendar applies the change without reloading, so the message travels in the response
+            return JsonResponse({'status': 'success', 'message': "Event deleted successfully!"})
         except Exception as e:
-            messages.error(request, f"There was an error deleting the event: {e}")
-            logger.error(f'Error deleting event with ID {event_id}: {e}')
+            logger.error('Error deleting event with ID %s: %s', event_id, e)
+            return JsonResponse({'status': 'error', 'message': f"There was an error deleting the event: {e}"})
+    return JsonResponse({'status': 'fail', 'message': 'Invalid request method'})
+
+
+def remove_occurrence(request, occurrence_id):
+    """Cancel one occurrence of a recurrence rule; the rule and its other occurrences stay."""
+    try:
+        rule_id, original_start = parse_occurrence_id(occurrence_id)
+
+        def cancel():
+            rule = cancel_occurrence(rule_id, original_start)
+            record('cancelled', request.user, details={'rule': rule.pk, 'name_person': rule.name_person,
+                                                        'place': rule.place, 'start': original_start})
+
+        atomic_with_retry(cancel)
+    except (ValueError, RecurrenceRule.DoesNotExist) as e:
+        logger.error('Error cancelling occurrence %s: %s', occurrence_id, e)
+        return JsonResponse({'status': 'error', 'message': f"There was an error deleting the event: {e}"})
+    logger.info('Occurrence %s cancelled by %s', occurrence_id, request.user)
+    return JsonResponse({'status': 'success', 'message': "Event deleted successfully!"})
+
+
+@csrf_exempt
+@login_required
+def bulk_events(request):
+    """Remove (?action=remove) or reassign (?action=reassign&to_person=&to_place=) every event matching
+    ids=1,2,3, person=, place= (repeatable) and start=&end= in one transaction; dry_run=on only counts them."""
+    if request.method != 'POST':
+        return JsonResponse({'status': 'fail', 'message': 'Invalid request method'})
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': 'Only staff can change events in bulk'}, status=403)
+    action = request.POST.get('action')
+    dry_run = request.POST.get('dry_run') == 'on'
+    try:
+        criteria = {
+            'ids': sorted({int(value) for value in request.POST.get('ids', '').split(',') if value.strip()}),
+            'people': request.POST.getlist('person'),
+            'places': request.POST.getlist('place'),
+            'start': parse_bound(request.POST.get('start')),
+            'end': parse_bound(request.POST.get('end')),
+        }
+        if action == 'remove':
+            result = remove_events(criteria, user=request.user, dry_run=dry_run)
+        elif action == 'reassign':
+            result = reassign_events(criteria, to_person=request.POST.get('to_person'),
+                                     to_place=request.POST.get('to_place'), user=request.user, dry_run=dry_run)
+        else:
+            raise ValueError("action must be remove or reassign")
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    except Exception as e:
+        logger.error('Error changing events in bulk: %s', e)
+        return JsonResponse({'status': 'error', 'message': f"There was an error changing the events: {e}"})
+    if result.conflicts:
+        earlier, later = result.conflicts[0]
+        return JsonResponse({
+            'status': 'error',
+            'message': f"The events were not reassigned: {len(result.conflicts)} would overlap, e.g. #{earlier} and #{later}",
+            'conflicts': result.conflicts[:100],
+        }, status=409)
+    verb = {'remove': 'deleted', 'reassign': 'reassigned'}[action]
+    return JsonResponse({
+        'status': 'success',
+        'message': f"{result.matched} events would be {verb}" if dry_run else f"{result.matched} events {verb}!",
+        'matched': result.matched,
+        'ids': result.ids,
+        'dry_run': dry_run,
+    })
+
+
+@csrf_exempt
+@login_required
+def import_events(request):
+    if request.method == 'POST':
+        upload = request.FILES.get('file')
+        if upload is None:
+            return JsonResponse({'status': 'error', 'message': 'No file uploaded'}, status=400)
+        try:
+            lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            is_ics = upload.name.lower().endswith('.ics') or request.POST.get('format') == 'ics'
+            rows = read_ics(lines) if is_ics else read_csv(lines)
+            result = import_rows(rows, user=request.user, dry_run=request.POST.get('dry_run') == 'on',
+                                 source=upload.name)
+        except Exception as e:
+            logger.error('Error importing events: %s', e)
             return JsonResponse({'status': 'error', 'message': str(e)})
+        return JsonResponse({
+            'status': 'success',
+            'message': f"{result.created} events imported!",
+            'created': result.created,
+            'errors': [{'row': number, 'message': message} for number, message in result.errors],
+        })
     return JsonResponse({'status': 'fail', 'message': 'Invalid request method'})
+
+
+@login_required
+def audit_log(request):
+    if not request.user.is_staff:
+        return JsonResponse({'status': 'error', 'message': 'Only staff can read the audit trail'}, status=403)
+    try:
+        event_id = int(request.GET['event']) if request.GET.get('event') else None
+        since = parse_bound(request.GET.get('since'))
+        until = parse_bound(request.GET.get('until'))
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 500)
+        entries, cursor = search_audit(actor=request.GET.get('actor'), event_id=event_id,
+                                       action=request.GET.get('action'), since=since, until=until,
+                                       cursor=request.GET.get('cursor'), limit=limit)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({
+        'status': 'success',
+        'entries': [entry_data(entry) for entry in entries],
+        'next': cursor,  # pass as ?cursor= for the following page
+    })
+
+
+def metrics(request):
+    token = metrics_option('TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    if not (request.user.is_staff or token and hmac.compare_digest(authorization, f'Bearer {token}')):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -13,7 +13,6 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
-from logging.handlers import TimedRotatingFileHandler
 from datetime import time
 
 
@@ -54,7 +53,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'calendar_app.middleware.MetricsMiddleware',  # first, so it times the whole stack
     'django.middleware.security.SecurityMiddleware',
+    # serves collected static files, precompressed and with immutable caching for hashed names
+    'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -89,8 +91,15 @@ WSGI_APPLICATION = 'django_cal_app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 with WAL, tuned pragmas, a busy timeout and BEGIN IMMEDIATE transactions
+        'ENGINE': 'django_cal_app.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'timeout': 20,
+        },
+        # keep connections between requests; the async views of ASGI mode get a new one per request anyway
+        'CONN_MAX_AGE': 0 if os.environ.get('DJANGO_SERVER_MODE') == 'asgi' else 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -132,6 +141,16 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# collectstatic adds a content hash to every file name and writes .gz/.br copies next to them
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -141,6 +160,29 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# 'asgi' serves the app with uvicorn workers (see entrypoint.sh), which enables the live
+# updates stream at /events/stream/
+SERVER_MODE = os.environ.get('DJANGO_SERVER_MODE', 'wsgi')
+LIVE_UPDATES = SERVER_MODE == 'asgi'
+LIVE_UPDATES_POLL_INTERVAL = 1.0  # seconds between change checks, per worker
+LIVE_UPDATES_HEARTBEAT = 15  # seconds between keep-alive comments
+
+# Request metrics served at /metrics to staff users, or with "Authorization: Bearer <TOKEN>"
+METRICS = {
+    'TOKEN': os.environ.get('DJANGO_METRICS_TOKEN'),
+    # opt-in: log the SQL of requests slower than this many seconds
+    'SLOW_REQUEST_SECONDS': float(os.environ['DJANGO_SLOW_REQUEST_SECONDS']) if os.environ.get('DJANGO_SLOW_REQUEST_SECONDS') else None,
+}
+
+# Deleted events are kept this long so /events/changes/ can report them; older sync tokens expire
+TOMBSTONE_RETENTION_DAYS = 30
+
+# archive_events moves events that ended longer ago than this out of the live table
+ARCHIVE_AFTER_DAYS = 730
+
+# Longest event accepted; also bounds how far back the per-person overlap check looks
+MAX_EVENT_DAYS = 366
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
 LOGIN_URL = '/login'
@@ -160,9 +202,10 @@ LOGGING = {
     'handlers': {
         'calendar_file': {
             'level': 'INFO',  # Log info, errors, and warnings for the calendar app
-            'class': 'logging.handlers.TimedRotatingFileHandler',
+            # written by a background thread; rotation is coordinated between the gunicorn workers
+            'class': 'calendar_app.log_handlers.QueuedRotatingFileHandler',
             'filename': os.path.join(LOGS_DIR, 'calendar.log'),
-            'formatter': 'verbose',
+            'formatter': os.environ.get('DJANGO_LOG_FORMAT', 'verbose'),  # 'json' for structured records
             'when': 'D',  # Rotate logs daily
             'interval': 1,  # Interval of 1 day
             'backupCount': 20,  # Keep logs for 20 days
@@ -180,6 +223,9 @@ LOGGING = {
         'verbose': {
             'format': '%(asctime)s - %(levelname)s - %(message)s'
         },
+        'json': {
+            '()': 'calendar_app.log_handlers.JsonFormatter',
+        },
     },
     'root': {
         'handlers': ['calendar_file'],  # Ensure the root logger writes to the same file
@@ -0,0 +1,35 @@
+"""SQLite backend for several gunicorn workers writing to one database file.
+
+Use it as DATABASES ENGINE 'django_cal_app.sqlite3'. OPTIONS takes the usual sqlite3.connect
+arguments plus 'pragmas', which are merged into PRAGMAS.
+"""
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',  # readers no longer block the writer, nor the writer the readers
+    'synchronous': 'NORMAL',  # safe with WAL; only the last commits may be lost on power failure
+    'cache_size': -20000,  # KiB of page cache per connection
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **params.pop('pragmas', {})}
+        # seconds a connection waits for the write lock before "database is locked"
+        params.setdefault('timeout', 20)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        # Take the write lock when the transaction starts. A deferred transaction that reads and
+        # then writes fails at once, without waiting for the timeout, if another worker wrote meanwhile.
+        self.cursor().execute('BEGIN IMMEDIATE')
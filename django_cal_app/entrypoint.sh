@@ -1,19 +1,26 @@
 #!/bin/bash
+# stop at the first failing step instead of serving pages that cannot find their assets
+set -e
 
-# Collect static files
-#echo "Collect static files"
-#python manage.py collectstatic --noinput
+# Collect static files (the vendored assets come from the image build, see docker-compose.yml)
+echo "Collect static files"
+python manage.py collectstatic --noinput
 
 # Apply database migrations
 echo "Apply database migrations"
 python manage.py migrate
 
-# create superuser from env variables, if it doesn't exists
+# create superuser from DJANGO_SUPERUSER_USERNAME/_EMAIL/_PASSWORD, if it doesn't exist
 echo "Checking and creating superuser if not exists"
-python manage.py create_superuser
+python manage.py createsuperuser --noinput || true
 
 # Start server
 echo "Starting server"
 #python manage.py runserver 0.0.0.0:8000 # dev server
-# Start the Gunicorn server
-exec gunicorn django_cal_app.wsgi:application --bind 0.0.0.0:8000 --workers 3
\ No newline at end of file
+if [ "${DJANGO_SERVER_MODE}" = "asgi" ]; then
+    # uvicorn workers keep idle live-update streams open without blocking a worker
+    exec gunicorn django_cal_app.asgi:application --bind 0.0.0.0:8000 --workers 3 -k uvicorn.workers.UvicornWorker
+else
+    # Start the Gunicorn server
+    exec gunicorn django_cal_app.wsgi:application --bind 0.0.0.0:8000 --workers 3
+fi